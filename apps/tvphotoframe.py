@@ -3,47 +3,152 @@
 import appdaemon.plugins.hass.hassapi as hass
 import os
 import random
+import sys
 import time
+import zlib
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+# Общие модули фоторамки лежат в /config/scripts
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+import photo_bursts
+import photo_catalog
+import photo_history
+import photo_index
+import photo_metrics
+import photo_paths
+import photo_playlists
+import photo_render
+import photo_transcode
+import photo_watch
+from photo_metrics import span
+from photo_scan import SUPPORTED_EXTENSIONS, scan_photo_tree
+
+# Сколько секунд до дедлайна готовить следующее фото
+PREFETCH_LEAD = 2
+# Максимальный объем предварительного чтения файла (байт)
+PREFETCH_MAX_BYTES = 32 * 1024 * 1024
+PREFETCH_CHUNK = 1024 * 1024
+# История показов переживает перезапуск приложения
+HISTORY_FILE = "/config/tvphotoframe_debug/app_show_history.bin"
+# Как часто читать события файловой системы (секунды)
+WATCH_TICK_SECONDS = 2
+# Проверка времени повтора неудачного сканирования (секунды)
+RETRY_CHECK_SECONDS = 60
+# Сколько ждать результата запущенного повтора, прежде чем запустить снова
+RETRY_GRACE_SECONDS = 600
+# Подготовленные слайды, общие для TV с одинаковым разрешением
+MEDIA_CACHE_SIZE = 64
+# Выбор плейлиста и бюджет чтения заголовков при инкрементальном обновлении индекса
+PLAYLIST_ENTITY = "input_select.tvphotoframe_playlist"
+WATCH_INDEX_BUDGET = 2.0
+DEFAULT_TV_ENTITY = "media_player.lg_webos_tv_ur80006lj_2"
+DEFAULT_INTERVAL_ENTITY = "input_number.tvphotoframe_interval"
+
+class Display:
+    """Один TV: свой курсор, интервал, активность и таймеры"""
+    
+    def __init__(self, entity, name=None, size=None, interval=None, interval_entity=None):
+        self.entity = entity
+        self.name = name or entity.split(".", 1)[-1]
+        self.size = tuple(size or photo_render.RENDER_SIZE)
+        # Фиксированный интервал или input_number с интервалом
+        self.interval = interval
+        self.interval_entity = interval_entity or DEFAULT_INTERVAL_ENTITY
+        
+        self.active = False
+        self.order = []
+        self.index = 0
+        self.timer = None
+        self.prefetch_timer = None
+        self.next_deadline = None
+        self.prefetched_photo = None
+        self.prefetched_media = None
+        self.last_activity_time = datetime.now()
+    
+    @classmethod
+    def from_args(cls, config):
+        """Display из элемента списка displays (строка с entity или словарь)"""
+        if isinstance(config, str):
+            return cls(config)
+        size = config.get("resolution")
+        if isinstance(size, str):
+            size = tuple(int(v) for v in size.lower().split("x"))
+        return cls(config["tv_entity"], config.get("name"), size,
+                   config.get("interval"), config.get("interval_entity"))
+
 class TvPhotoFrameManager(hass.Hass):
     
     def initialize(self):
         """Инициализация приложения фоторамки"""
         
         # Основные параметры
-        self.tv_entity = self.args.get("tv_entity", "media_player.lg_webos_tv_ur80006lj_2")
+        # displays: список TV; без него - один tv_entity, как раньше
+        displays = self.args.get("displays") or [self.args.get("tv_entity", DEFAULT_TV_ENTITY)]
+        self.displays = OrderedDict()
+        for config in displays:
+            display = Display.from_args(config)
+            self.displays[display.name] = display
         self.photo_folder = self.args.get("photo_folder", "/media/nas/photos/")
-        self.supported_formats = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
+        self.supported_formats = SUPPORTED_EXTENSIONS
         
         # Состояние приложения
-        self.tvphotoframe_active = False
         self.photo_list = []
-        self.current_photo_index = 0
-        self.tvphotoframe_timer = None
-        self.last_activity_time = datetime.now()
+        self.photo_ids = {}
+        # Фото выбранного плейлиста (None - показываем все)
+        self.playlist = None
+        self.playlist_photos = None
+        self.history = None
+        self.watcher = None
+        self.watch_batcher = None
+        self.watch_root = None
+        self.watch_timer = None
+        self.catalog_mtime = None
+        self.catalog_retry = None
+        self.retry_fired_at = None
+        # Рендереры по разрешению и подготовленные слайды по (фото, разрешение)
+        self.renderers = {}
+        self.media_cache = OrderedDict()
         
         # Синхронизируем путь в UI с конфигурацией (если UI пустой)
         self.sync_folder_path()
         
         # Загрузка списка фотографий
         self.load_photo_list()
+        self.load_playlist(self.get_state(PLAYLIST_ENTITY))
+        
+        # Инкрементальное обновление каталога по событиям ФС
+        self.setup_catalog_watch()
         
-        # Отслеживание изменений состояния TV
-        self.listen_state(self.tv_state_changed, self.tv_entity)
-        self.listen_state(self.tv_attributes_changed, self.tv_entity, attribute="all")
+        # Отслеживание изменений состояния каждого TV
+        for display in self.displays.values():
+            self.listen_state(self.tv_state_changed, display.entity, display=display.name)
+            self.listen_state(self.tv_attributes_changed, display.entity, attribute="all", display=display.name)
         
         # Отслеживание изменений настроек
         self.listen_state(self.tvphotoframe_toggle_changed, "input_boolean.tvphotoframe_active")
         self.listen_state(self.folder_path_changed, "input_text.tvphotoframe_folder")
+        self.listen_state(self.playlist_changed, PLAYLIST_ENTITY)
         
         # Таймер проверки неактивности
         self.run_every(self.check_tv_inactivity, "now", 60)  # проверка каждую минуту
         
+        # Повтор неудачного сканирования с бэкоффом (время повтора пишет load_photos.py)
+        if self.args.get("retry_failed_scans", True):
+            self.run_every(self.check_catalog_retry, "now", RETRY_CHECK_SECONDS)
+        
         # Регистрация сервиса для голосового управления
         self.register_service("tvphotoframe/toggle", self.toggle_tvphotoframe_service)
         
-        self.log("TvPhotoFrameManager инициализирован")
+        self.log(f"TvPhotoFrameManager инициализирован, TV: {', '.join(self.displays)}")
+    
+    @property
+    def tvphotoframe_active(self):
+        """Фоторамка активна, если идет показ хотя бы на одном TV"""
+        return any(display.active for display in self.displays.values())
     
     def sync_folder_path(self):
         """Синхронизация пути в UI с конфигурацией"""
@@ -69,41 +174,256 @@ class TvPhotoFrameManager(hass.Hass):
             self.log(f"Используем путь из UI: {folder_path}")
             
         try:
+            prefix = folder_path if folder_path.endswith('/') else f"{folder_path}/"
             if os.path.exists(folder_path):
-                self.photo_list = []
-                for root, dirs, files in os.walk(folder_path):
-                    for file in files:
-                        if any(file.lower().endswith(ext) for ext in self.supported_formats):
-                            full_path = os.path.join(root, file)
-                            self.photo_list.append(full_path)
-                
-                random.shuffle(self.photo_list)
-                self.log(f"Загружено {len(self.photo_list)} фотографий из {folder_path}")
+                self.photo_list = scan_photo_tree(folder_path, prefix=prefix)
             else:
                 self.log(f"Папка {folder_path} не найдена", level="WARNING")
                 self.photo_list = []
+            
+            if not self.photo_list:
+                # NAS недоступен: показываем последний успешный каталог
+                self.photo_list = self.last_good_photos(folder_path, prefix)
+            
+            self.photo_list = self.without_burst_duplicates(self.photo_list, folder_path, prefix)
+            if self.photo_list:
+                self.open_history()
+                random.shuffle(self.photo_list)
+                self.log(f"Загружено {len(self.photo_list)} фотографий из {folder_path}")
         except Exception as e:
             self.log(f"Ошибка загрузки фотографий: {e}", level="ERROR")
             self.photo_list = []
     
+    def load_playlist(self, name):
+        """Фото плейлиста, материализованного сканированием (фильтры не пересчитываются)"""
+        self.playlist = None
+        self.playlist_photos = None
+        if not name or name in (photo_playlists.ALL_PHOTOS, "unknown", "unavailable"):
+            return
+        
+        try:
+            paths = photo_playlists.paths(name)
+        except Exception as e:
+            self.log(f"Плейлист {name} недоступен: {e}", level="WARNING")
+            return
+        folder_path = self.get_state("input_text.tvphotoframe_folder") or self.photo_folder
+        prefix = folder_path if folder_path.endswith('/') else f"{folder_path}/"
+        # Индекс хранит NFC-пути, список приложения - имена как на диске
+        known = {photo_paths.normalize(p[len(prefix):]): p for p in self.photo_list if p.startswith(prefix)}
+        photos = [known[rel] for rel in paths or () if rel in known]
+        if not photos:
+            self.log(f"Плейлист {name} пуст или еще не построен, показываем все фото", level="WARNING")
+            return
+        
+        self.playlist = name
+        self.playlist_photos = photos
+        self.log(f"Плейлист {name}: {len(photos)} фото")
+    
+    def show_list(self):
+        """Фото для показа: выбранный плейлист или все"""
+        return self.playlist_photos or self.photo_list
+    
+    def last_good_photos(self, folder_path, prefix):
+        """Фото из последнего успешного каталога той же папки"""
+        try:
+            catalog = photo_catalog.read_catalog()
+        except ValueError:
+            catalog = None
+        if not catalog or (catalog.get("scan_folder") or "").rstrip('/') != folder_path.rstrip('/'):
+            return []
+        photos = [prefix + photo_paths.share_path(catalog, path) for path in catalog.get("files", [])]
+        if photos:
+            self.log(f"Используем последний успешный каталог от {catalog.get('last_updated')} "
+                     f"({len(photos)} фото)", level="WARNING")
+        return photos
+    
+    def without_burst_duplicates(self, photos, folder_path, prefix):
+        """Убираем повторные кадры серий, отмеченные последним сканированием (photo_bursts)"""
+        try:
+            catalog = photo_catalog.read_catalog()
+        except ValueError:
+            catalog = None
+        if not catalog or (catalog.get("scan_folder") or "").rstrip('/') != folder_path.rstrip('/'):
+            return photos
+        hidden = photo_bursts.catalog_hidden(catalog)
+        if not hidden:
+            return photos
+        kept = [p for p in photos if photo_paths.normalize(p[len(prefix):]) not in hidden]
+        if len(kept) < len(photos):
+            self.log(f"Скрыто {len(photos) - len(kept)} повторных кадров серий")
+        return kept
+    
+    def check_catalog_retry(self, kwargs):
+        """Запуск повторного сканирования, когда подошло время повтора"""
+        try:
+            mtime = os.stat(photo_catalog.PHOTOS_FILE).st_mtime_ns
+        except OSError:
+            return
+        
+        # Каталог перечитываем только после его изменения
+        if mtime != self.catalog_mtime:
+            self.catalog_mtime = mtime
+            self.retry_fired_at = None
+            try:
+                catalog = photo_catalog.read_catalog()
+            except ValueError:
+                catalog = None
+            self.catalog_retry = catalog if catalog and catalog.get("stale") else None
+        
+        if not photo_catalog.retry_due(self.catalog_retry):
+            return
+        if self.retry_fired_at and time.time() - self.retry_fired_at < RETRY_GRACE_SECONDS:
+            return  # повтор уже запущен, ждем обновления каталога
+        
+        self.retry_fired_at = time.time()
+        self.log(f"Повтор сканирования #{self.catalog_retry.get('retry_count')}: "
+                 f"{self.catalog_retry.get('last_error')}")
+        self.fire_event("tvphotoframe_scan_photos")
+    
+    def open_history(self):
+        """Открытие истории показов для текущего списка фото"""
+        if self.history:
+            self.history.close()
+            self.history = None
+        
+        # Стабильные id: позиция в отсортированном списке
+        ordered = sorted(self.photo_list)
+        self.photo_ids = {path: i for i, path in enumerate(ordered)}
+        generation = zlib.crc32("\n".join(ordered).encode("utf-8"))
+        try:
+            self.history = photo_history.ShowHistory.open(ordered, generation, path=HISTORY_FILE)
+        except Exception as e:
+            self.log(f"История показов недоступна: {e}", level="WARNING")
+    
+    def recent_window(self):
+        """Сколько последних показов не повторять"""
+        if not self.history:
+            return 0
+        return min(len(self.photo_list) // 2, self.history.capacity - 1)
+    
+    def setup_catalog_watch(self):
+        """Запуск наблюдения за локальной папкой каталога (inotify или опрос для CIFS)"""
+        self.stop_catalog_watch()
+        if not self.args.get("watch_catalog", True):
+            return
+        
+        catalog = photo_catalog.read_catalog()
+        root = (catalog or {}).get("scan_folder")
+        if not root or not os.path.isdir(root):
+            self.log(f"Наблюдение за каталогом отключено: папка {root} не локальная")
+            return
+        
+        try:
+            self.watcher = photo_watch.create_watcher(root)
+        except Exception as e:
+            self.log(f"Не удалось запустить наблюдение за {root}: {e}", level="WARNING")
+            return
+        
+        self.watch_root = root
+        self.watch_batcher = photo_watch.ChangeBatcher()
+        self.watch_timer = self.run_every(self.watch_catalog_tick, "now", WATCH_TICK_SECONDS)
+        self.log(f"Наблюдение за каталогом: {root} ({type(self.watcher).__name__})")
+    
+    def stop_catalog_watch(self):
+        """Остановка наблюдения за каталогом"""
+        if self.watch_timer:
+            self.cancel_timer(self.watch_timer)
+            self.watch_timer = None
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+    
+    def watch_catalog_tick(self, kwargs):
+        """Применение накопленных изменений ФС к каталогу"""
+        self.watch_batcher.add(self.watcher.poll())
+        if not self.watch_batcher.ready():
+            return
+        
+        added, removed, removed_dirs, resync = self.watch_batcher.take()
+        if resync:
+            self.log("События ФС потеряны, запускаем полное сканирование", level="WARNING")
+            self.fire_event("tvphotoframe_scan_photos")
+            return
+        
+        catalog = photo_watch.apply_changes(added, removed, removed_dirs)
+        if catalog is None:
+            return
+        
+        self.log(f"Каталог обновлен: +{len(added)} -{len(removed)} файлов, -{len(removed_dirs)} папок")
+        self.call_service("input_number/set_value",
+                         entity_id="input_number.tvphotoframe_total_photos",
+                         value=len(catalog["files"]))
+        
+        # Индекс и плейлисты - только по изменившимся фото
+        self.refresh_playlists(catalog)
+        
+        # Тот же список показывает и само приложение
+        folder_path = self.get_state("input_text.tvphotoframe_folder") or self.photo_folder
+        if folder_path.rstrip('/') == self.watch_root.rstrip('/'):
+            self.apply_photo_changes(added, removed, removed_dirs)
+    
+    def refresh_playlists(self, catalog):
+        """Инкрементальное обновление индекса и плейлистов, новые варианты для input_select"""
+        try:
+            summary = photo_index.update(catalog, self.watch_root, time_budget=WATCH_INDEX_BUDGET)
+            counts = photo_playlists.refresh(summary)
+        except Exception as e:
+            self.log(f"Не удалось обновить плейлисты: {e}", level="WARNING")
+            return
+        options = photo_playlists.options(counts)
+        if options != self.get_state(PLAYLIST_ENTITY, attribute="options"):
+            self.call_service("input_select/set_options", entity_id=PLAYLIST_ENTITY, options=options)
+    
+    def apply_photo_changes(self, added, removed, removed_dirs):
+        """Инкрементальное обновление списка фото приложения и очереди каждого TV"""
+        prefix = f"{self.watch_root.rstrip('/')}/"
+        drop = {prefix + rel for rel in removed}
+        dir_prefixes = tuple(f"{prefix}{rel}/" for rel in removed_dirs)
+        
+        def keep(p):
+            return p not in drop and not (dir_prefixes and p.startswith(dir_prefixes))
+        
+        self.photo_list = [p for p in self.photo_list if keep(p)]
+        known = set(self.photo_list)
+        new_paths = [prefix + rel for rel in added if prefix + rel not in known]
+        self.photo_list.extend(new_paths)
+        if self.playlist:
+            # Плейлист уже обновлен refresh_playlists, перечитываем его
+            self.load_playlist(self.playlist)
+            allowed = set(self.show_list())
+            new_paths = [p for p in new_paths if p in allowed]
+        for display in self.displays.values():
+            if not display.order:
+                continue
+            display.order = [p for p in display.order if keep(p)]
+            for path in new_paths:
+                # Новые фото вставляем в случайное место еще не показанной части
+                position = random.randint(min(display.index, len(display.order)), len(display.order))
+                display.order.insert(position, path)
+            if display.index >= len(display.order):
+                display.index = 0
+        self.open_history()
+    
     def tv_state_changed(self, entity, attribute, old, new, kwargs):
         """Обработка изменения состояния TV"""
-        self.log(f"TV состояние: {old} -> {new}")
+        display = self.displays[kwargs["display"]]
+        self.log(f"TV {display.name} состояние: {old} -> {new}")
         
         if new in ['playing', 'on']:
-            self.last_activity_time = datetime.now()
-            if self.tvphotoframe_active:
-                self.stop_tvphotoframe("TV активен")
+            display.last_activity_time = datetime.now()
+            if display.active:
+                self.stop_display(display, "TV активен")
         elif new == 'off':
-            if self.tvphotoframe_active:
-                self.stop_tvphotoframe("TV выключен")
+            if display.active:
+                self.stop_display(display, "TV выключен")
     
     def tv_attributes_changed(self, entity, attribute, old, new, kwargs):
         """Обработка изменения атрибутов TV (обнаружение нажатий пульта)"""
-        if new != old and self.tvphotoframe_active:
+        display = self.displays[kwargs["display"]]
+        if new != old and display.active:
             # Любое изменение атрибутов считаем активностью пользователя
-            self.last_activity_time = datetime.now()
-            self.stop_tvphotoframe("Обнаружена активность пульта")
+            display.last_activity_time = datetime.now()
+            self.stop_display(display, "Обнаружена активность пульта")
     
     def tvphotoframe_toggle_changed(self, entity, attribute, old, new, kwargs):
         """Обработка переключения фоторамки через интерфейс"""
@@ -117,121 +437,316 @@ class TvPhotoFrameManager(hass.Hass):
         if new != old:
             self.log(f"Изменен путь к папке: {old} -> {new}")
             self.load_photo_list()
+            self.load_playlist(self.get_state(PLAYLIST_ENTITY))
+            # Каталог пересканируется автоматизацией, наблюдение перезапускаем позже
+            self.run_in(lambda kwargs: self.setup_catalog_watch(), 120)
+    
+    def playlist_changed(self, entity, attribute, old, new, kwargs):
+        """Переключение плейлиста: новая очередь на каждом активном TV"""
+        if new == old:
+            return
+        self.log(f"Плейлист: {old} -> {new}")
+        self.load_playlist(new)
+        for display in self.displays.values():
+            if not display.active:
+                continue
+            display.order = list(self.show_list())
+            random.shuffle(display.order)
+            display.index = 0
+            display.prefetched_photo = None
+            display.prefetched_media = None
     
     def check_tv_inactivity(self, kwargs):
-        """Проверка неактивности TV"""
-        if self.tvphotoframe_active:
+        """Проверка неактивности каждого TV"""
+        if self.get_state("input_boolean.tvphotoframe_enabled") != "on":
             return
-            
-        tv_state = self.get_state(self.tv_entity)
-        tvphotoframe_enabled = self.get_state("input_boolean.tvphotoframe_enabled")
         timeout_minutes = float(self.get_state("input_number.tv_inactive_timeout"))
         
-        if (tv_state == "on" and 
-            tvphotoframe_enabled == "on" and 
-            not self.tvphotoframe_active):
-            
-            inactive_time = datetime.now() - self.last_activity_time
+        for display in self.displays.values():
+            if display.active or self.get_state(display.entity) != "on":
+                continue
+            inactive_time = datetime.now() - display.last_activity_time
             if inactive_time.total_seconds() > (timeout_minutes * 60):
-                self.start_tvphotoframe("Неактивность TV")
+                self.start_display(display, "Неактивность TV")
     
     def start_tvphotoframe(self, reason=""):
-        """Запуск фоторамки"""
-        if self.tvphotoframe_active:
+        """Запуск фоторамки на всех включенных TV"""
+        for display in self.displays.values():
+            if not display.active:
+                self.start_display(display, reason)
+    
+    def stop_tvphotoframe(self, reason=""):
+        """Остановка фоторамки на всех TV"""
+        for display in self.displays.values():
+            if display.active:
+                self.stop_display(display, reason)
+    
+    def start_display(self, display, reason=""):
+        """Запуск показа на одном TV"""
+        if display.active:
             return
             
         if not self.photo_list:
             self.log("Нет фотографий для показа", level="WARNING")
             return
             
-        tv_state = self.get_state(self.tv_entity)
+        tv_state = self.get_state(display.entity)
         if tv_state != "on":
-            self.log("TV не включен, фоторамка не запущена", level="WARNING")
+            self.log(f"TV {display.name} не включен, фоторамка не запущена", level="WARNING")
             return
         
-        self.tvphotoframe_active = True
-        self.current_photo_index = 0
-        random.shuffle(self.photo_list)  # Перемешиваем при каждом запуске
+        was_active = self.tvphotoframe_active
+        display.active = True
+        display.order = list(self.show_list())
+        random.shuffle(display.order)  # Перемешиваем при каждом запуске
+        display.index = 0
+        display.prefetched_photo = None
+        display.prefetched_media = None
+        display.next_deadline = datetime.now()
         
         # Устанавливаем состояние в HA
-        self.set_state("input_boolean.tvphotoframe_active", state="on")
+        if not was_active:
+            self.set_state("input_boolean.tvphotoframe_active", state="on")
         
         # Показываем первое фото
-        self.show_next_photo()
+        self.show_next_photo(display)
         
-        self.log(f"Фоторамка запущена. Причина: {reason}")
+        self.log(f"Фоторамка запущена на {display.name}. Причина: {reason}")
         
         # Отправляем уведомление
         self.call_service("notify/persistent_notification", 
-                         message=f"Фоторамка запущена ({len(self.photo_list)} фото)",
+                         message=f"Фоторамка запущена на {display.name} ({len(display.order)} фото)",
                          title="TV Фоторамка")
     
-    def stop_tvphotoframe(self, reason=""):
-        """Остановка фоторамки"""
-        if not self.tvphotoframe_active:
+    def stop_display(self, display, reason=""):
+        """Остановка показа на одном TV"""
+        if not display.active:
             return
             
-        self.tvphotoframe_active = False
+        display.active = False
         
-        # Отменяем таймер
-        if self.tvphotoframe_timer:
-            self.cancel_timer(self.tvphotoframe_timer)
-            self.tvphotoframe_timer = None
+        # Отменяем таймеры
+        if display.timer:
+            self.cancel_timer(display.timer)
+            display.timer = None
+        if display.prefetch_timer:
+            self.cancel_timer(display.prefetch_timer)
+            display.prefetch_timer = None
+        display.next_deadline = None
+        display.prefetched_photo = None
+        display.prefetched_media = None
+        display.order = []
         
-        # Устанавливаем состояние в HA
-        self.set_state("input_boolean.tvphotoframe_active", state="off")
+        # Устанавливаем состояние в HA, когда остановлен последний TV
+        if not self.tvphotoframe_active:
+            self.set_state("input_boolean.tvphotoframe_active", state="off")
+            self.close_renderers()
         
         # Останавливаем воспроизведение на TV
-        self.call_service("media_player/media_stop", entity_id=self.tv_entity)
+        self.call_service("media_player/media_stop", entity_id=display.entity)
         
-        self.log(f"Фоторамка остановлена. Причина: {reason}")
+        self.log(f"Фоторамка остановлена на {display.name}. Причина: {reason}")
         
         # Отправляем уведомление
         self.call_service("notify/persistent_notification", 
-                         message=f"Фоторамка остановлена. Причина: {reason}",
+                         message=f"Фоторамка остановлена на {display.name}. Причина: {reason}",
                          title="TV Фоторамка")
     
-    def show_next_photo(self):
-        """Показ следующей фотографии"""
-        if not self.tvphotoframe_active or not self.photo_list:
+    def resolve_next_photo(self, display):
+        """Выбор следующей фотографии и сдвиг курсора TV"""
+        window = self.recent_window()
+        
+        # Пропускаем недавно показанные (в том числе до перезапуска и на других TV)
+        for _ in range(len(display.order)):
+            photo_path = self.advance_cursor(display)
+            photo_id = self.photo_ids.get(photo_path, -1)
+            if not window or photo_id < 0 or not self.history.shown_within_slides(photo_id, window):
+                break
+        
+        return photo_path
+    
+    def advance_cursor(self, display):
+        """Текущее фото по курсору TV, курсор сдвигается дальше"""
+        photo_path = display.order[display.index]
+        
+        # Переходим к следующему фото
+        display.index = (display.index + 1) % len(display.order)
+        
+        # Если прошли все фото, перемешиваем снова
+        if display.index == 0:
+            random.shuffle(display.order)
+            self.log(f"Список фотографий {display.name} перемешан")
+        
+        return photo_path
+    
+    def prepare_media(self, photo_path, size):
+        """Что отправить на TV: (путь, MIME-тип, media_content_id) оригинала или слайда из кэша
+        
+        Слайды делаются для PNG/GIF/BMP и больших JPEG. media_content_id -
+        URL-кодированный путь оригинала или /local/-адрес слайда, считается
+        один раз. Результат общий для всех TV с тем же разрешением.
+        """
+        key = (photo_path, size)
+        media = self.media_cache.get(key)
+        if media is not None:
+            self.media_cache.move_to_end(key)
+            return media
+        
+        try:
+            renderer = self.renderers.get(size)
+            if renderer is None:
+                renderer = self.renderers[size] = photo_render.SlideRenderer(size)
+            media_path, media_type, transcoded = photo_transcode.prepare(photo_path, renderer)
+        except Exception as e:
+            self.log(f"Не удалось подготовить слайд {photo_path}: {e}", level="WARNING")
+            return photo_path, photo_transcode.mime_type(photo_path), photo_paths.media_url(photo_path)
+        if transcoded:
+            self.log(f"Слайд из кэша: {os.path.basename(media_path)} ({os.path.basename(photo_path)})")
+        
+        media_id = photo_paths.media_url(photo_transcode.public_path(media_path))
+        self.media_cache[key] = media = (media_path, media_type, media_id)
+        while len(self.media_cache) > MEDIA_CACHE_SIZE:
+            self.media_cache.popitem(last=False)
+        return media
+    
+    def close_renderers(self):
+        """Освобождение холстов рендереров"""
+        for renderer in self.renderers.values():
+            renderer.close()
+        self.renderers = {}
+    
+    def prefetch_photo(self, photo_path):
+        """Предварительное чтение файла, чтобы TV получил его из кэша"""
+        try:
+            remaining = PREFETCH_MAX_BYTES
+            with open(photo_path, 'rb') as f:
+                while remaining > 0 and f.read(min(PREFETCH_CHUNK, remaining)):
+                    remaining -= PREFETCH_CHUNK
+        except OSError as e:
+            self.log(f"Не удалось подготовить фото {photo_path}: {e}", level="WARNING")
+    
+    def prefetch_next_photo_callback(self, kwargs):
+        """Callback подготовки фото перед дедлайном"""
+        display = self.displays[kwargs["display"]]
+        display.prefetch_timer = None
+        if not display.active or not display.order:
+            return
+        if display.prefetched_photo is None:
+            with span("select"):
+                display.prefetched_photo = self.resolve_next_photo(display)
+            cached = (display.prefetched_photo, display.size) in self.media_cache
+            with span("transcode"):
+                display.prefetched_media = self.prepare_media(display.prefetched_photo, display.size)
+            # Другой TV с тем же разрешением уже прочитал этот файл
+            if not cached:
+                with span("prefetch"):
+                    self.prefetch_photo(display.prefetched_media[0])
+    
+    def display_interval(self, display):
+        """Интервал показа TV: фиксированный или из input_number"""
+        if display.interval:
+            return float(display.interval)
+        return float(self.get_state(display.interval_entity))
+    
+    def schedule_next_tick(self, display, interval):
+        """Планирование следующего показа TV по абсолютному дедлайну"""
+        now = datetime.now()
+        step = timedelta(seconds=interval)
+        deadline = (display.next_deadline or now) + step
+        
+        # Если отстали (TV или HA медленно отвечали) - пропускаем
+        # просроченные слоты, но остаемся на той же сетке
+        if deadline <= now:
+            missed = int((now - deadline) / step) + 1
+            deadline += step * missed
+            self.log(f"Пропущено слотов показа на {display.name}: {missed}", level="WARNING")
+        
+        display.next_deadline = deadline
+        display.timer = self.run_at(self.show_next_photo_callback, deadline, display=display.name)
+        
+        # Следующее фото выбираем и читаем заранее
+        prefetch_at = deadline - timedelta(seconds=min(PREFETCH_LEAD, interval / 2))
+        if prefetch_at <= now:
+            self.prefetch_next_photo_callback({"display": display.name})
+        else:
+            display.prefetch_timer = self.run_at(self.prefetch_next_photo_callback, prefetch_at,
+                                                 display=display.name)
+    
+    def show_next_photo(self, display):
+        """Показ следующей фотографии на TV"""
+        if not display.active or not display.order:
             return
             
-        # Получаем текущее фото
-        photo_path = self.photo_list[self.current_photo_index]
+        # Берем заранее подготовленное фото, если оно есть
+        if display.prefetched_photo is None:
+            with span("select"):
+                display.prefetched_photo = self.resolve_next_photo(display)
+        photo_path = display.prefetched_photo
+        media = display.prefetched_media
+        display.prefetched_photo = None
+        display.prefetched_media = None
+        if media is None:
+            with span("transcode"):
+                media = self.prepare_media(photo_path, display.size)
+        media_path, media_type, media_id = media
         
         try:
             # Отправляем фото на TV
-            self.call_service("media_player/play_media",
-                            entity_id=self.tv_entity,
-                            media_content_type="image/jpeg",
-                            media_content_id=photo_path)
-            
-            self.log(f"Показ фото {self.current_photo_index + 1}/{len(self.photo_list)}: {os.path.basename(photo_path)}")
+            with span("play_media"):
+                self.call_service("media_player/play_media",
+                                entity_id=display.entity,
+                                media_content_type=media_type,
+                                media_content_id=media_id)
             
-            # Переходим к следующему фото
-            self.current_photo_index = (self.current_photo_index + 1) % len(self.photo_list)
+            self.log(f"Показ фото на {display.name} {display.index}/{len(display.order)}: "
+                     f"{os.path.basename(photo_path)}")
             
-            # Если прошли все фото, перемешиваем снова
-            if self.current_photo_index == 0:
-                random.shuffle(self.photo_list)
-                self.log("Список фотографий перемешан")
+            if self.history:
+                self.history.record(self.photo_ids.get(photo_path, -1))
             
             # Планируем показ следующего фото
-            interval = int(float(self.get_state("input_number.tvphotoframe_interval")))
-            self.tvphotoframe_timer = self.run_in(self.show_next_photo_callback, interval)
+            interval = int(self.display_interval(display))
+            self.schedule_next_tick(display, max(interval, 1))
+            self.publish_metrics()
             
         except Exception as e:
-            self.log(f"Ошибка показа фото {photo_path}: {e}", level="ERROR")
+            self.log(f"Ошибка показа фото {photo_path} на {display.name}: {e}", level="ERROR")
             # Пробуем следующее фото через 2 секунды
-            self.tvphotoframe_timer = self.run_in(self.show_next_photo_callback, 2)
+            display.next_deadline = datetime.now() + timedelta(seconds=2)
+            display.timer = self.run_at(self.show_next_photo_callback, display.next_deadline,
+                                        display=display.name)
+    
+    def publish_metrics(self):
+        """Экспорт таймингов показа в HA и в Prometheus-файл"""
+        payload = photo_metrics.ha_sensor_payload("app")
+        self.set_state("sensor.tvphotoframe_app_timing",
+                       state=payload["state"],
+                       attributes=payload["attributes"])
+        photo_metrics.write_prometheus("app")
+        photo_metrics.reset()
     
     def show_next_photo_callback(self, kwargs):
         """Callback для таймера показа следующего фото"""
-        self.tvphotoframe_timer = None
-        self.show_next_photo()
+        display = self.displays[kwargs["display"]]
+        display.timer = None
+        self.show_next_photo(display)
     
     def toggle_tvphotoframe_service(self, kwargs):
-        """Сервис для переключения фоторамки (для голосового управления)"""
+        """Сервис для переключения фоторамки (для голосового управления)
+        
+        display: имя TV; без него переключаются все TV.
+        """
+        name = kwargs.get("display")
+        if name:
+            display = self.displays.get(name)
+            if display is None:
+                return {"status": "error", "message": f"unknown display {name}"}
+            if display.active:
+                self.stop_display(display, "Голосовая команда")
+            else:
+                self.start_display(display, "Голосовая команда")
+            return {"status": "toggled", "display": name, "active": display.active}
+        
         if self.tvphotoframe_active:
             self.stop_tvphotoframe("Голосовая команда")
         else:
@@ -243,4 +758,9 @@ class TvPhotoFrameManager(hass.Hass):
         """Завершение работы приложения"""
         if self.tvphotoframe_active:
             self.stop_tvphotoframe("Завершение приложения")
+        self.close_renderers()
+        if self.history:
+            self.history.close()
+            self.history = None
+        self.stop_catalog_watch()
         self.log("TvPhotoFrameManager завершен")
\ No newline at end of file
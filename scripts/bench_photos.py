@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+# scripts/bench_photos.py
+# Reproducible benchmarks for the scan and photo selection paths
+#
+# Usage: python3 scripts/bench_photos.py [--sizes 1000,10000,100000] [--output bench_output.txt]
+#        python3 scripts/bench_photos.py --sizes 1000 --scan-entries 1000000
+#        python3 scripts/bench_photos.py --sizes 1000 --thumbnails --render
+#        python3 scripts/bench_photos.py --importtime   (exit 1 if cold start regresses)
+#        python3 scripts/bench_photos.py --load 1,2,5 --load-duration 60   (report: bench_load.txt)
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+SAMPLE_IMAGE_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), "image")
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_REPEATS = 3
+SELECT_ROUNDS = 20
+SENSOR_ROUNDS = 50
+IMPORT_BUDGET_MS = 60  # Cold import budget for the per-tick entry point
+IMPORT_ROUNDS = 5
+OUTPUT_FILE = "bench_output.txt"
+LOAD_OUTPUT_FILE = "bench_load.txt"  # --load report, kept apart from the regression table
+LOAD_DURATION = 30  # Seconds of ticks per interval in --load mode
+LOAD_PHOTOS = 10000
+PLAY_LATENCY_MS = 150  # Simulated media_player.play_media round trip
+PHOTO_NAMES = ["IMG_{:05d}.JPG", "DSC{:05d}.jpg", "IMG_20180609_{:06d}.jpg", "Изображение {:03d}.png"]
+OTHER_NAMES = ["Thumbs.db", "notes_{:05d}.txt", "clip_{:05d}.mp4"]
+
+def legacy_walk(scan_path):
+    """Reference implementation: os.walk + any(endswith) + relpath per file"""
+    from photo_scan import SUPPORTED_EXTENSIONS
+
+    photos = []
+    for root, dirs, files in os.walk(scan_path):
+        for file in files:
+            if any(file.lower().endswith(ext.lower()) for ext in SUPPORTED_EXTENSIONS):
+                rel_path = os.path.relpath(os.path.join(root, file), scan_path)
+                photos.append(rel_path.replace('\\', '/'))
+    return photos
+
+def build_photo_tree(root, count, fanout=10, files_per_dir=100, seed=42):
+    """Create nested synthetic photo tree with count files (about 5% non-photo)"""
+    rng = random.Random(seed)
+    dirs = [root]
+    created = 0
+    while created < count:
+        # Breadth-first growth: each directory gets up to fanout children
+        parent = dirs[len(dirs) // fanout] if len(dirs) > 1 else root
+        folder = os.path.join(parent, f"folder_{len(dirs):05d}")
+        os.makedirs(folder, exist_ok=True)
+        dirs.append(folder)
+        for _ in range(min(files_per_dir, count - created)):
+            if rng.random() < 0.05:
+                name = rng.choice(OTHER_NAMES).format(created)
+            else:
+                name = rng.choice(PHOTO_NAMES).format(created)
+            with open(os.path.join(folder, name), 'wb'):
+                pass
+            created += 1
+    return root
+
+def fake_smbclient_output(count, seed=42):
+    """Generate smbclient 'ls' stdout for count entries"""
+    rng = random.Random(seed)
+    lines = [
+        "  .                                   D        0  Sat Jun 21 13:12:31 2025",
+        "  ..                                  D        0  Sat Jun 21 13:12:31 2025",
+    ]
+    for i in range(count):
+        if rng.random() < 0.05:
+            lines.append(f"  subfolder_{i:05d}                     D        0  Sat Jun 21 13:12:31 2025")
+        else:
+            name = rng.choice(PHOTO_NAMES[:3]).format(i)
+            lines.append(f"  {name:<36}A {rng.randint(100000, 9000000):>8}  Sat Jun 21 13:12:31 2025")
+    lines.append("")
+    lines.append("\t\t1907660800 blocks of size 1024. 301289472 blocks available")
+    return "\n".join(lines) + "\n"
+
+def write_fake_smbclient(workdir, count):
+    """Write an executable that mimics smbclient --version / -c 'ls'"""
+    listing = os.path.join(workdir, f"smb_ls_{count}.txt")
+    with open(listing, 'w', encoding='utf-8') as f:
+        f.write(fake_smbclient_output(count))
+
+    script = os.path.join(workdir, "smbclient")
+    with open(script, 'w', encoding='utf-8') as f:
+        f.write(f"""#!{sys.executable}
+import sys
+if "--version" in sys.argv:
+    print("Version 4.19.0-fake")
+elif "subfolder_" in sys.argv[-1]:
+    # Generated subfolders hold a few photos each
+    for i in range(20):
+        print(f"  IMG_{{i:04d}}.jpg                        A  2345678  Sat Jun 21 13:12:31 2025")
+else:
+    with open({listing!r}, encoding="utf-8") as f:
+        sys.stdout.write(f.read())
+""")
+    os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+    return script
+
+class StubHAHandler(BaseHTTPRequestHandler):
+    """Minimal HA REST API: accepts state/service posts, serves input_text state"""
+
+    folder = "/media/photo/0001photoframe"
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/api/states/"):
+            self._reply(200, {"entity_id": self.path.rsplit('/', 1)[-1], "state": self.folder})
+        else:
+            self._reply(404, {"message": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        self.server.requests_seen += 1
+        if self.path == "/api/services/media_player/play_media":
+            time.sleep(getattr(self.server, "play_latency", 0))
+        if self.path.startswith("/api/states/"):
+            self._reply(200, json.loads(body or b"{}"))
+        else:
+            self._reply(200, [])
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_ha():
+    """Start stub HA server on a free local port, return (server, url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHAHandler)
+    server.requests_seen = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def timed(func, repeats=DEFAULT_REPEATS):
+    """Run func repeats times with output silenced, return (best seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run_benchmarks(sizes, repeats, workdir):
+    """Run all benchmarks and return result rows"""
+    import load_photos
+    import get_next_photo
+    import photo_bursts
+    import photo_history
+    import photo_index
+    import photo_playlists
+    import photo_probe
+    import photo_select
+    import photo_shards
+
+    rows = []
+    server, ha_url = start_stub_ha()
+    load_photos.HA_URL = ha_url
+    get_next_photo.HA_URL = ha_url
+    photos_file = os.path.join(workdir, "tvphotoframe_photos.json")
+    load_photos.PHOTOS_FILE = photos_file
+    load_photos.DEBUG_DIR = os.path.join(workdir, "debug")
+    get_next_photo.PHOTOS_FILE = photos_file
+    photo_select.SELECTION_STATE = os.path.join(workdir, "selection_state.bin")
+    photo_select.SELECTION_CONFIG = os.path.join(workdir, "tvphotoframe_selection.json")
+    photo_history.HISTORY_FILE = os.path.join(workdir, "show_history.bin")
+    photo_shards.CHECKPOINT_FILE = os.path.join(workdir, "scan_checkpoint.json")
+    photo_probe.PROBE_CACHE_FILE = os.path.join(workdir, "probe_cache.json")
+    photo_shards.SCAN_TIME_BUDGET = 0  # measure whole scans, not resumed slices
+
+    try:
+        for size in sizes:
+            tree = build_photo_tree(os.path.join(workdir, f"tree_{size}"), size)
+
+            seconds, photos = timed(lambda: load_photos.get_photo_list(tree), repeats)
+            rows.append(("get_photo_list (local)", size, seconds, len(photos) / seconds if seconds else 0))
+
+            load_photos.SMBCLIENT_CMD = write_fake_smbclient(workdir, size)
+            seconds, smb_photos = timed(
+                lambda: load_photos.get_photo_list_via_smbclient("nas", "photo", "0001photoframe"), repeats)
+            rows.append(("get_photo_list_via_smbclient", size, seconds, len(smb_photos) / seconds if seconds else 0))
+
+            seconds, _ = timed(lambda: load_photos.save_photos_to_file(photos, tree), repeats)
+            rows.append(("save_photos_to_file", size, seconds, len(photos) / seconds if seconds else 0))
+
+            def load_and_select():
+                for _ in range(SELECT_ROUNDS):
+                    loaded, folder, generation, _, catalog = get_next_photo.load_photos_from_file()
+                    history = get_next_photo.open_show_history(loaded, generation)
+                    get_next_photo.select_random_photo(loaded, folder, generation, history, catalog=catalog)
+                    history.close()
+            seconds, _ = timed(load_and_select, repeats)
+            rows.append(("load_photos_from_file + select_random_photo", size,
+                         seconds / SELECT_ROUNDS, SELECT_ROUNDS / seconds if seconds else 0))
+
+            index_file = os.path.join(workdir, f"photo_index_{size}.sqlite")
+            catalog = {"files": photos, "generation": size}
+            seconds, _ = timed(lambda: photo_index.sync(catalog, index_file), 1)
+            rows.append(("photo_index.sync (new index)", size, seconds, size / seconds if seconds else 0))
+            photo_index.probe_headers(tree, index_file, time_budget=0)
+            conn = photo_index.connect(index_file)
+            folder = photos[0].rpartition('/')[0].split('/')[0]
+            queries = [
+                ("folder prefix", {"folder": folder}),
+                ("date range", {"date_from": "2018-06-01", "date_to": "2018-06-30"}),
+                ("name glob", {"name": "img_2018*"}),
+            ]
+            for name, filters in queries:
+                def run_query():
+                    for _ in range(SELECT_ROUNDS):
+                        photo_index.query(limit=100, conn=conn, **filters)
+                seconds, _ = timed(run_query, repeats)
+                rows.append((f"photo_index.query {name} (limit 100)", size,
+                             seconds / SELECT_ROUNDS, SELECT_ROUNDS / seconds if seconds else 0))
+            # IMG_20180609_* names carry capture times seconds apart: bursts by time only
+            seconds, bursts = timed(lambda: photo_bursts.update(conn, time_budget=0), 1)
+            rows.append((f"photo_bursts.update ({bursts['hidden']} hidden)", size,
+                         seconds, size / seconds if seconds else 0))
+            conn.close()
+
+            playlists_dir = os.path.join(workdir, f"playlists_{size}")
+            playlists_config = os.path.join(workdir, "playlists.json")
+            with open(playlists_config, 'w') as f:
+                json.dump({"folder": {"folder": folder}, "june": {"from": "2018-06-01", "to": "2018-06-30"}}, f)
+            seconds, _ = timed(lambda: photo_playlists.refresh(None, index_file, playlists_config, playlists_dir), 1)
+            rows.append(("photo_playlists.refresh (materialize 2)", size, seconds, 2 / seconds if seconds else 0))
+            def next_from_playlist():
+                for _ in range(SELECT_ROUNDS):
+                    photo_playlists.next_entry("folder", playlists_dir, index_file)
+            seconds, _ = timed(next_from_playlist, repeats)
+            rows.append(("photo_playlists.next_entry", size,
+                         seconds / SELECT_ROUNDS, SELECT_ROUNDS / seconds if seconds else 0))
+
+            shutil.rmtree(tree, ignore_errors=True)
+
+        def post_sensor():
+            for _ in range(SENSOR_ROUNDS):
+                get_next_photo.update_ha_sensor("/media/photo/IMG_00001.JPG", "IMG_00001.JPG", 1000, "token")
+        seconds, _ = timed(post_sensor, repeats)
+        rows.append(("update_ha_sensor (stub HA)", SENSOR_ROUNDS, seconds / SENSOR_ROUNDS,
+                     SENSOR_ROUNDS / seconds if seconds else 0))
+    finally:
+        server.shutdown()
+
+    return rows
+
+def run_scan_benchmark(entries, repeats, workdir):
+    """Compare legacy os.walk loop with scan_photo_tree in files/second"""
+    from photo_scan import scan_photo_tree
+
+    tree = build_photo_tree(os.path.join(workdir, f"scan_{entries}"), entries, files_per_dir=500)
+    rows = []
+    for name, func in [("scan: legacy os.walk + any()", legacy_walk),
+                       ("scan: scan_photo_tree (scandir)", scan_photo_tree)]:
+        seconds, photos = timed(lambda: func(tree), repeats)
+        rows.append((name, entries, seconds, entries / seconds if seconds else 0))
+    shutil.rmtree(tree, ignore_errors=True)
+    return rows
+
+def run_thumbnail_benchmark(repeats, workdir):
+    """Naive full decode + resize vs make_thumbnail (draft mode) on the sample originals"""
+    import make_thumbnails
+    from PIL import Image
+
+    samples = sorted(glob.glob(os.path.join(SAMPLE_IMAGE_DIR, "*", "original")))
+    if not samples:
+        return []
+    size = make_thumbnails.THUMB_SIZE
+    out = os.path.join(workdir, "thumb")
+
+    def naive():
+        for src in samples:
+            with Image.open(src) as im:
+                im = im.convert("RGB")  # full-size decode
+                scale = min(size / im.width, size / im.height, 1.0)
+                im = im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))),
+                               Image.Resampling.LANCZOS)
+                im.save(out, "JPEG", quality=make_thumbnails.THUMB_QUALITY)
+
+    def draft():
+        for src in samples:
+            make_thumbnails.make_thumbnail(src, out, size)
+
+    # Same originals repeated, thumbnails always rebuilt
+    batch = [f"{i:03d}/{os.path.basename(os.path.dirname(src))}"
+             for i in range(4) for src in samples]
+    root = os.path.join(workdir, "thumb_src")
+    for rel in batch:
+        os.makedirs(os.path.join(root, os.path.dirname(rel)), exist_ok=True)
+        shutil.copyfile(os.path.join(SAMPLE_IMAGE_DIR, os.path.basename(rel), "original"), os.path.join(root, rel))
+
+    def pool():
+        shutil.rmtree(os.path.join(workdir, "thumbs"), ignore_errors=True)
+        make_thumbnails.generate(batch, root, size, sheets=False,
+                                 thumbs_dir=os.path.join(workdir, "thumbs"))
+
+    rows = []
+    for name, func, n in [("thumbs: naive decode + resize", naive, len(samples)),
+                          ("thumbs: draft + reduce", draft, len(samples)),
+                          (f"thumbs: draft + reduce, {os.cpu_count()} processes", pool, len(batch))]:
+        seconds, _ = timed(func, repeats)
+        rows.append((name, n, seconds, n / seconds if seconds else 0))
+    return rows
+
+RENDER_NAIVE = """
+import sys, time
+from PIL import Image
+import photo_render
+start = time.perf_counter()
+for src in sys.argv[1:]:
+    with Image.open(src) as im:
+        im = im.convert("RGB")
+        im.thumbnail((1920, 1080), Image.Resampling.LANCZOS)
+        im.save(src + ".naive.jpg", "JPEG", quality=88)
+print(time.perf_counter() - start, photo_render.peak_rss_mb())
+"""
+
+RENDER_BOUNDED = """
+import sys, time
+import photo_render
+start = time.perf_counter()
+renderer = photo_render.SlideRenderer()
+for src in sys.argv[1:]:
+    renderer.render(src, src + ".slide.jpg")
+print(time.perf_counter() - start, photo_render.peak_rss_mb())
+"""
+
+def run_render_benchmark(workdir):
+    """Peak RSS of a naive render vs photo_render on the samples plus a 12000x4000 panorama"""
+    import subprocess
+    from PIL import Image
+
+    panorama = os.path.join(workdir, "panorama.jpg")
+    Image.linear_gradient("L").resize((12000, 4000)).convert("RGB").save(panorama, "JPEG", quality=85)
+    sources = []
+    for i, src in enumerate(sorted(glob.glob(os.path.join(SAMPLE_IMAGE_DIR, "*", "original")))):
+        sources.append(os.path.join(workdir, f"render_{i}"))
+        shutil.copyfile(src, sources[-1])
+    sources.append(panorama)
+
+    rows = []
+    for name, code in [("render: naive full decode", RENDER_NAIVE),
+                       ("render: photo_render (draft, 64 MB ceiling)", RENDER_BOUNDED)]:
+        result = subprocess.run([sys.executable, "-c", code] + sources, cwd=SCRIPTS_DIR,
+                                capture_output=True, text=True, timeout=300)
+        if result.returncode != 0:
+            print(f"⚠️ {name} failed: {result.stderr.strip()[-300:]}")
+            continue
+        seconds, rss_mb = (float(v) for v in result.stdout.split())
+        rows.append((f"{name}, peak RSS {rss_mb:.0f} MB", len(sources), seconds, len(sources) / seconds))
+    return rows
+
+def check_slide_url(workdir):
+    """A transcoded slide must reach the TV as a /local/ URL, not as a /config/www path"""
+    from PIL import Image
+    import photo_paths
+    import photo_transcode
+
+    source = os.path.join(workdir, "slide_check.png")
+    Image.linear_gradient("L").convert("RGB").save(source, "PNG")
+    render_dir = os.path.join(workdir, "www", "render")
+    media_path, media_type, transcoded = photo_transcode.prepare(source, render_dir=render_dir)
+    media_id = photo_paths.media_url(photo_transcode.public_path(media_path, render_dir))
+    if transcoded and media_id.startswith(photo_transcode.RENDER_URL + "/"):
+        print(f"✅ Transcoded slide is published as {media_id}")
+        return True
+    print(f"❌ Transcoded slide is published as {media_id}")
+    return False
+
+# One shell_command tick: the real get_next_photo.py in a fresh interpreter,
+# with its /config files redirected to the load test directory
+TICK_BOOTSTRAP = """
+import os, runpy, sys
+workdir = sys.argv[1]
+sys.argv = [os.path.join(os.getcwd(), "get_next_photo.py")]
+import photo_catalog, photo_ha, photo_history, photo_logging, photo_metrics, photo_select, photo_transcode
+photo_catalog.PHOTOS_FILE = os.path.join(workdir, "tvphotoframe_photos.json")
+photo_ha.SECRETS_PATHS = [os.path.join(workdir, "secrets.yaml")]
+photo_ha.TOKEN_CACHE_FILE = os.path.join(workdir, "token_cache.json")
+photo_history.HISTORY_FILE = os.path.join(workdir, "show_history.bin")
+photo_logging.LOG_DIR = workdir
+photo_metrics.METRICS_DIR = workdir
+photo_select.SELECTION_CONFIG = os.path.join(workdir, "tvphotoframe_selection.json")
+photo_select.SELECTION_STATE = os.path.join(workdir, "selection_state.bin")
+photo_transcode.RENDER_DIR = os.path.join(workdir, "render")
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def run_load_test(intervals, duration, photos, play_latency_ms, workdir):
+    """Drive get_next_photo.py + play_media on the YAML loop's deadline grid
+
+    Every tick spawns the script the way shell_command does (fresh
+    interpreter, catalog read, selection, sensor post) and then calls
+    play_media on the stub HA. Ticks run one after another like the
+    automation; a tick that overruns the next deadline skips the missed
+    slots, which are counted.
+    """
+    import subprocess
+    import photo_catalog
+    import photo_ha
+
+    server, ha_url = start_stub_ha()
+    server.play_latency = play_latency_ms / 1000
+    rng = random.Random(42)
+    names = [f"folder_{i // 100:04d}/{rng.choice(PHOTO_NAMES).format(i)}" for i in range(photos)]
+    photo_catalog.save_catalog(photo_catalog.build_catalog(names, "/media/photo/0001photoframe"),
+                               os.path.join(workdir, "tvphotoframe_photos.json"))
+    with open(os.path.join(workdir, "secrets.yaml"), 'w', encoding='utf-8') as f:
+        f.write("tvphotoframe_token: load-test\n")
+    env = dict(os.environ, TVPHOTOFRAME_HA_URL=ha_url, TVPHOTOFRAME_LOG_LEVEL="WARNING")
+
+    rows = []
+    try:
+        for interval in intervals:
+            latencies, lags, missed, failed = [], [], 0, 0
+            requests_before = server.requests_seen
+            deadline = time.monotonic()
+            end = deadline + duration
+            while deadline < end:
+                now = time.monotonic()
+                if now < deadline:
+                    time.sleep(deadline - now)
+                started = time.monotonic()
+                lags.append(started - deadline)
+                result = subprocess.run([sys.executable, "-c", TICK_BOOTSTRAP, workdir], cwd=SCRIPTS_DIR,
+                                        env=env, capture_output=True, timeout=60)
+                status = photo_ha.post(ha_url, "/api/services/media_player/play_media", "load-test",
+                                       {"entity_id": "media_player.load_test",
+                                        "media_content_id": "/media/photo/IMG_00001.JPG"}, timeout=10)
+                finished = time.monotonic()
+                latencies.append(finished - started)
+                if result.returncode != 0 or status != 200:
+                    failed += 1
+
+                # Next slot on the same grid, skipping the ones already missed
+                deadline += interval
+                if finished > deadline:
+                    skipped = int((finished - deadline) / interval) + 1
+                    missed += skipped
+                    deadline += skipped * interval
+            rows.append({
+                "interval": interval,
+                "ticks": len(latencies),
+                "p50": _percentile(latencies, 0.50),
+                "p95": _percentile(latencies, 0.95),
+                "p99": _percentile(latencies, 0.99),
+                "max_lag": max(lags) if lags else 0.0,
+                "missed": missed,
+                "failed": failed,
+                "requests": server.requests_seen - requests_before,
+            })
+    finally:
+        server.shutdown()
+    return rows
+
+def format_load_report(rows, duration, photos, play_latency_ms):
+    """Format load test rows as plain text"""
+    lines = [
+        "TV Photo Frame next-photo load test (shell_command path)",
+        f"date: {datetime.now().isoformat(timespec='seconds')}",
+        f"python: {platform.python_version()} ({platform.machine()})",
+        f"catalog: {photos} photos  duration: {duration} s per interval  play_media: {play_latency_ms} ms",
+        "",
+        f"{'interval s':>10}{'ticks':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'max lag ms':>12}{'missed':>8}{'failed':>8}{'HA req':>8}",
+    ]
+    for row in rows:
+        lines.append(f"{row['interval']:>10g}{row['ticks']:>8}{row['p50'] * 1000:>10.0f}"
+                     f"{row['p95'] * 1000:>10.0f}{row['p99'] * 1000:>10.0f}{row['max_lag'] * 1000:>12.0f}"
+                     f"{row['missed']:>8}{row['failed']:>8}{row['requests']:>8}")
+    return "\n".join(lines) + "\n"
+
+def measure_import_time(module="get_next_photo", rounds=IMPORT_ROUNDS):
+    """Best cumulative -X importtime of module in a fresh interpreter, in ms"""
+    import subprocess
+
+    best = None
+    for _ in range(rounds):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=SCRIPTS_DIR, capture_output=True, text=True, timeout=60)
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            parts = [p.strip() for p in line.split('|')]
+            if len(parts) == 3 and parts[2] == module:
+                cumulative_ms = int(parts[1]) / 1000
+                best = cumulative_ms if best is None else min(best, cumulative_ms)
+    return best
+
+def format_report(rows, sizes, repeats):
+    """Format benchmark rows as plain text"""
+    lines = [
+        "TV Photo Frame benchmarks",
+        f"date: {datetime.now().isoformat(timespec='seconds')}",
+        f"python: {platform.python_version()} ({platform.machine()})",
+        f"sizes: {','.join(str(s) for s in sizes)}  repeats: {repeats} (best of)",
+        "",
+        f"{'benchmark':<46}{'n':>8}{'seconds':>12}{'per second':>14}",
+    ]
+    for name, n, seconds, rate in rows:
+        lines.append(f"{name:<46}{n:>8}{seconds:>12.4f}{rate:>14.0f}")
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="TV Photo Frame benchmarks")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma separated tree sizes (files)")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--output", default=None,
+                        help=f"report file (default {OUTPUT_FILE}, {LOAD_OUTPUT_FILE} with --load)")
+    parser.add_argument("--scan-entries", type=int, default=0,
+                        help="also compare scan cores on a tree with this many entries (e.g. 1000000)")
+    parser.add_argument("--thumbnails", action="store_true",
+                        help="also compare thumbnail decode paths on the sample images (needs Pillow)")
+    parser.add_argument("--render", action="store_true",
+                        help="also compare peak memory of slide rendering and check slide URLs (needs Pillow)")
+    parser.add_argument("--importtime", action="store_true",
+                        help=f"only check get_next_photo import time against {IMPORT_BUDGET_MS} ms budget")
+    parser.add_argument("--load", default=None,
+                        help="only run the next-photo load test at these intervals in seconds (e.g. 1,2,5)")
+    parser.add_argument("--load-duration", type=float, default=LOAD_DURATION)
+    parser.add_argument("--load-photos", type=int, default=LOAD_PHOTOS)
+    parser.add_argument("--play-latency-ms", type=float, default=PLAY_LATENCY_MS)
+    args = parser.parse_args()
+
+    if args.load:
+        intervals = [float(s) for s in args.load.split(',') if s]
+        workdir = tempfile.mkdtemp(prefix="tvphotoframe_load_")
+        try:
+            rows = run_load_test(intervals, args.load_duration, args.load_photos, args.play_latency_ms, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        report = format_load_report(rows, args.load_duration, args.load_photos, args.play_latency_ms)
+        output = args.output or LOAD_OUTPUT_FILE
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(report)
+        print(f"💾 Results saved to {output}")
+        if any(row["failed"] for row in rows):
+            print("❌ Some ticks failed")
+            sys.exit(1)
+        return
+
+    if args.importtime:
+        import_ms = measure_import_time()
+        if import_ms is None:
+            print("❌ Could not measure import time")
+            sys.exit(1)
+        print(f"⏱️ get_next_photo cold import: {import_ms:.1f} ms (budget {IMPORT_BUDGET_MS} ms)")
+        if import_ms > IMPORT_BUDGET_MS:
+            print("❌ Import time budget exceeded")
+            sys.exit(1)
+        print("✅ Within budget")
+        return
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    workdir = tempfile.mkdtemp(prefix="tvphotoframe_bench_")
+    try:
+        rows = run_benchmarks(sizes, args.repeats, workdir)
+        if args.scan_entries:
+            rows.extend(run_scan_benchmark(args.scan_entries, args.repeats, workdir))
+        if args.thumbnails:
+            rows.extend(run_thumbnail_benchmark(args.repeats, workdir))
+        if args.render:
+            rows.extend(run_render_benchmark(workdir))
+            slide_url_ok = check_slide_url(workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    import_ms = measure_import_time()
+    if import_ms is not None:
+        rows.append(("import get_next_photo (-X importtime)", 1, import_ms / 1000, 0))
+
+    report = format_report(rows, sizes, args.repeats)
+    output = args.output or OUTPUT_FILE
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(report)
+    print(f"💾 Results saved to {output}")
+    if args.render and not slide_url_ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
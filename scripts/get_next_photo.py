@@ -2,35 +2,30 @@
 # scripts/get_next_photo.py
 # Script to select random photo from file and update HA sensor
 
+# Runs every few seconds: keep top-level imports to the cheap ones.
+# requests/yaml are not used here, see photo_ha.py
 import os
-import requests
-import json
+import sys
 import random
-import yaml
 from datetime import datetime
 
+import photo_catalog
+import photo_ha
+import photo_history
+import photo_logging
+import photo_metrics
+import photo_paths
+import photo_select
+import photo_transcode
+from photo_metrics import span
+
 # Configuration
-HA_URL = "http://192.168.1.10:8123"
-PHOTOS_FILE = "/config/tvphotoframe_photos.json"
+HA_URL = os.environ.get("TVPHOTOFRAME_HA_URL", "http://192.168.1.10:8123")
+PHOTOS_FILE = photo_catalog.PHOTOS_FILE
 
 def setup_logging():
-    """Setup logging to debug directory"""
-    import logging
-    
-    # Create debug directory
-    debug_dir = "/config/tvphotoframe_debug"
-    os.makedirs(debug_dir, exist_ok=True)
-    
-    # Setup logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(f'{debug_dir}/get_next_photo.log'),
-            logging.StreamHandler()
-        ]
-    )
-    return logging.getLogger(__name__)
+    """Setup rotated background logging to debug directory"""
+    return photo_logging.setup_logging("get_next_photo")
 
 def log_and_print(message, level="INFO"):
     """Print and log message"""
@@ -47,19 +42,10 @@ def log_and_print(message, level="INFO"):
         pass  # If logger not available, just print
 
 def load_ha_token():
-    """Load token from secrets.yaml"""
+    """Load token from cache, re-reading secrets.yaml only when it changed"""
     try:
-        with open("/config/secrets.yaml", 'r', encoding='utf-8') as file:
-            secrets = yaml.safe_load(file)
-        
-        token_keys = ['tvphotoframe_token', 'appdaemon_token', 'ha_token', 'home_assistant_token', 'api_token']
-        
-        for key in token_keys:
-            if key in secrets:
-                return secrets[key]
-        
-        return None
-        
+        token, key = photo_ha.load_token()
+        return token
     except Exception as e:
         log_and_print(f"❌ Error reading secrets.yaml: {e}", "ERROR")
         return None
@@ -67,14 +53,14 @@ def load_ha_token():
 def load_photos_from_file():
     """Load photos list from JSON file"""
     try:
-        if not os.path.exists(PHOTOS_FILE):
+        # Safe while a scan is writing: the catalog is replaced atomically
+        data = photo_catalog.read_catalog(PHOTOS_FILE)
+        
+        if data is None:
             log_and_print(f"❌ Photos file not found: {PHOTOS_FILE}", "ERROR")
             log_and_print("💡 Run photo scan first!")
             return None
         
-        with open(PHOTOS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
         photos = data.get('files', [])
         folder = data.get('scan_folder', '/media/photo/0001photoframe')
         
@@ -83,23 +69,106 @@ def load_photos_from_file():
             return None
         
         log_and_print(f"📂 Loaded {len(photos)} photos from file")
-        return photos, folder
+        status = photo_catalog.staleness(data)
+        if status["catalog_stale"]:
+            log_and_print(f"⚠️ Last scan failed ({data.get('last_error')}), using catalog from {data.get('last_updated')}", "WARNING")
+        return photos, folder, photo_catalog.catalog_generation(data), status, data
         
     except Exception as e:
         log_and_print(f"❌ Error reading photos file: {e}", "ERROR")
         return None
 
-def select_random_photo(photos, folder):
+def open_show_history(photos, generation):
+    """Open persisted show history for this catalog (None if unavailable)"""
+    try:
+        return photo_history.ShowHistory.open(photos, generation)
+    except Exception as e:
+        log_and_print(f"⚠️ Show history unavailable: {e}", "WARNING")
+        return None
+
+def playlist_arg(argv=None):
+    """--playlist NAME from the command line, None for all photos"""
+    argv = sys.argv[1:] if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg.startswith("--playlist="):
+            name = arg.split("=", 1)[1]
+        elif arg == "--playlist" and i + 1 < len(argv):
+            name = argv[i + 1]
+        else:
+            continue
+        name = name.strip()
+        if name and name not in ("All photos", "unknown", "unavailable"):
+            return name
+    return None
+
+def play_media_arg(argv=None):
+    """--play-media-ms MS: how long the YAML loop's play_media of the previous slide took, None if not given"""
+    argv = sys.argv[1:] if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg.startswith("--play-media-ms="):
+            value = arg.split("=", 1)[1]
+        elif arg == "--play-media-ms" and i + 1 < len(argv):
+            value = argv[i + 1]
+        else:
+            continue
+        try:
+            ms = float(value)
+        except ValueError:
+            return None
+        return ms if ms > 0 else None
+    return None
+
+def pick_playlist_index(photos, playlist, history=None):
+    """Next photo of a materialized playlist (photo_playlists), None to fall back"""
+    try:
+        import photo_playlists
+
+        entry = photo_playlists.next_entry(playlist)
+        index = None
+        if entry is not None:
+            path, position = entry
+            if position is not None and 0 <= position < len(photos) and photos[position] == path:
+                index = position
+            elif path in photos:
+                # Catalog changed after the last index sync: rare, search once
+                index = photos.index(path)
+    except Exception as e:
+        log_and_print(f"⚠️ Playlist '{playlist}' failed: {e}", "WARNING")
+        return None
+    if index is None:
+        log_and_print(f"⚠️ Playlist '{playlist}' is not available, using all photos", "WARNING")
+        return None
+    if history is not None:
+        history.record(index)
+    return index
+
+def pick_photo_index(photos, generation, history=None, playlist=None, catalog=None):
+    """Weighted draw (quotas, favorites, recency, burst duplicates skipped), uniform if weights are unavailable"""
+    if playlist:
+        index = pick_playlist_index(photos, playlist, history)
+        if index is not None:
+            return index
+    if generation is not None:
+        try:
+            catalog = catalog or {}
+            return photo_select.select_weighted_index(photos, generation, history,
+                                                      hidden=catalog.get('burst_hidden'),
+                                                      hidden_sig=catalog.get('burst_signature', 0))
+        except Exception as e:
+            log_and_print(f"⚠️ Weighted selection failed, using uniform: {e}", "WARNING")
+    index = random.randrange(len(photos))
+    if history is not None:
+        history.record(index)
+    return index
+
+def select_random_photo(photos, folder, generation=None, history=None, playlist=None, catalog=None):
     """Select random photo and create full path"""
     try:
         # Select random photo
-        random_photo = random.choice(photos)
+        random_photo = photos[pick_photo_index(photos, generation, history, playlist, catalog)]
         
-        # Create full path
-        if '/' in random_photo:
-            full_path = f"{folder}/{random_photo}"
-        else:
-            full_path = f"{folder}/{random_photo}"
+        # Full path with the name as it is on the share (catalog keys are NFC)
+        full_path = photo_paths.join(folder, photo_paths.share_path(catalog or {}, random_photo))
         
         log_and_print(f"🎲 Selected random photo: {random_photo}")
         log_and_print(f"📍 Full path: {full_path}")
@@ -110,13 +179,19 @@ def select_random_photo(photos, folder):
         log_and_print(f"❌ Error selecting photo: {e}", "ERROR")
         return None, None
 
-def update_ha_sensor(photo_path, photo_file, total_photos, token):
+def prepare_media(photo_path):
+    """Path to send to the TV and its MIME type (non-JPEGs and large JPEGs are transcoded)"""
+    try:
+        media_path, media_type, transcoded = photo_transcode.prepare(photo_path)
+    except Exception as e:
+        log_and_print(f"⚠️ Media preparation failed, sending original: {e}", "WARNING")
+        return photo_path, photo_transcode.mime_type(photo_path)
+    if transcoded:
+        log_and_print(f"🖼️ Slide: {media_path}")
+    return media_path, media_type
+
+def update_ha_sensor(photo_path, photo_file, total_photos, token, stats=None):
     """Update random photo path sensor in HA"""
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
     try:
         # Update sensor with new photo path
         data = {
@@ -125,22 +200,18 @@ def update_ha_sensor(photo_path, photo_file, total_photos, token):
                 "photo_file": photo_file,
                 "total_photos": total_photos,
                 "last_updated": datetime.now().isoformat(),
-                "status": "ready"
+                "status": "ready",
+                **(stats or {})
             }
         }
         
-        response = requests.post(
-            f"{HA_URL}/api/states/sensor.random_photo_path",
-            headers=headers,
-            json=data,
-            timeout=10
-        )
+        status = photo_ha.post(HA_URL, "/api/states/sensor.random_photo_path", token, data, timeout=10)
         
-        if response.status_code in [200, 201]:
+        if status in [200, 201]:
             log_and_print(f"✅ Updated HA sensor: {photo_file}")
             return True
         else:
-            log_and_print(f"❌ HA sensor update error: {response.status_code}", "ERROR")
+            log_and_print(f"❌ HA sensor update error: {status}", "ERROR")
             return False
             
     except Exception as e:
@@ -152,23 +223,13 @@ def update_ha_notification(message, title="TV Photo Frame", token=None):
     if not token:
         return
         
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
     data = {
         "message": message,
         "title": title
     }
     
     try:
-        requests.post(
-            f"{HA_URL}/api/services/notify/persistent_notification",
-            headers=headers,
-            json=data,
-            timeout=5
-        )
+        photo_ha.post(HA_URL, "/api/services/notify/persistent_notification", token, data, timeout=5)
     except:
         pass
 
@@ -183,7 +244,8 @@ if __name__ == "__main__":
     
     # Load token
     log_and_print("🔑 Loading token...")
-    ha_token = load_ha_token()
+    with span("token"):
+        ha_token = load_ha_token()
     
     if not ha_token:
         log_and_print("❌ Could not get token from secrets.yaml!", "ERROR")
@@ -191,30 +253,57 @@ if __name__ == "__main__":
     
     # Load photos from file
     log_and_print("📂 Loading photos from file...")
-    result = load_photos_from_file()
+    with span("load"):
+        result = load_photos_from_file()
     
     if not result:
         update_ha_notification("❌ No photos file found. Run scan first!", token=ha_token)
         exit(1)
     
-    photos, folder = result
+    photos, folder, generation, catalog_status, catalog = result
+    playlist = playlist_arg()
     
     # Select random photo
     log_and_print("🎲 Selecting random photo...")
-    photo_path, photo_file = select_random_photo(photos, folder)
+    with span("select"):
+        history = open_show_history(photos, generation)
+        photo_path, photo_file = select_random_photo(photos, folder, generation, history, playlist, catalog)
+        stats = dict(catalog_status, **(history.stats() if history else {}))
+        stats["playlist"] = playlist or "All photos"
+        if history:
+            history.close()
     
     if not photo_path:
         update_ha_notification("❌ Error selecting random photo", token=ha_token)
         exit(1)
     
+    # Sensor state is what the TV gets: the original or the /local URL of
+    # its transcoded slide
+    with span("transcode"):
+        media_path, media_type = prepare_media(photo_path)
+    media_path = photo_transcode.public_path(media_path)
+    stats.update(source_path=photo_path, media_content_type=media_type,
+                 media_content_id=photo_paths.media_url(media_path))
+    
     # Update HA sensor
     log_and_print("📡 Updating Home Assistant...")
-    if update_ha_sensor(photo_path, photo_file, len(photos), ha_token):
+    with span("ha_post"):
+        sensor_updated = update_ha_sensor(media_path, photo_file, len(photos), ha_token, stats)
+    
+    if sensor_updated:
         log_and_print("🎉 SUCCESS: Random photo selected!")
     else:
         log_and_print("❌ Failed to update HA sensor", "ERROR")
         exit(1)
     
+    # Export tick timings after the photo is already published; the YAML
+    # loop times its play_media call and hands it to the prefetch tick
+    play_media_ms = play_media_arg()
+    if play_media_ms is not None:
+        photo_metrics.record("play_media", play_media_ms / 1000)
+    photo_metrics.write_prometheus("slide")
+    photo_metrics.publish_to_ha("slide", HA_URL, ha_token, timeout=2)
+    
     log_and_print("=" * 50)
     log_and_print("✅ Done!")
     log_and_print("=" * 50)
\ No newline at end of file
@@ -2,50 +2,58 @@
 # scripts/load_photos.py
 # Script to load photo list from NAS folder with SMB support
 
+# requests, yaml and subprocess are imported where they are used,
+# so modules that only need helpers from here start fast
 import os
-import requests
-import json
+import re
 import random
-import yaml
-import subprocess
-import tempfile
 import time
-from pathlib import Path
-
-import os
-import requests
-import json
-import random
-import yaml
-import subprocess
-from pathlib import Path
 from datetime import datetime
 
+import photo_bursts
+import photo_catalog
+import photo_ha
+import photo_index
+import photo_logging
+import photo_metrics
+import photo_playlists
+import photo_probe
+import photo_progress
+import photo_shards
+from photo_metrics import span
+from photo_mount import ensure_mount, mounted_path, parse_network_path
+from photo_scan import is_photo_name, list_photo_dir
+
 # Configuration
 HA_URL = "http://192.168.1.10:8123"
-SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.JPG', '.JPEG', '.PNG']
 MAX_PHOTOS = 99999  # Limit to avoid database issues
 DEBUG_DIR = "/config/tvphotoframe_debug"
-MOUNT_BASE = "/tmp/smb_mounts"  # Base folder for SMB mounts
+PHOTOS_FILE = photo_catalog.PHOTOS_FILE
+SMBCLIENT_CMD = "/usr/bin/smbclient"
+SMB_SHARD_WORKERS = 8  # Parallel smbclient listings (each one waits mostly on the network)
+SMB_SINGLE_CALL_MAX = 5000  # Previous photo count up to which the share is listed in one call
+
+# shell_command stops the scan after 60 s, counted from process start: the
+# access probe and mount attempts come out of the listing's time, and the
+# listing stops early enough for the EXIF and burst phases and the rest
+STARTED = time.monotonic()
+SHELL_COMMAND_LIMIT = 60
+FINISH_RESERVE = 5.0      # Catalog save, HA updates and playlists
+MOUNT_BUDGET = 20.0       # All CIFS mount options together, the smbclient fallback still needs time
+PROCESS_DEADLINE = None   # STARTED + SHELL_COMMAND_LIMIT when run as the scan script
+
+# One smbclient 'ls' entry: "  name with spaces.jpg   A  12345  Sat Jun 21 13:12:31 2025";
+# the name is whatever precedes the attributes, size and date
+SMB_LS_ENTRY = re.compile(
+    r'^  (?P<name>.+?)\s+(?P<attrs>[A-Z]*)\s+(?P<size>\d+)\s+'
+    r'(?P<date>[A-Z][a-z]{2} [A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d \d{4})\s*$')
+
+# smbclient output fetched by test_network_access, reused by the listing phase
+_smb_results = {}
 
 def setup_logging():
-    """Setup logging to debug directory"""
-    import logging
-    
-    # Create debug directory
-    debug_dir = "/config/tvphotoframe_debug"
-    os.makedirs(debug_dir, exist_ok=True)
-    
-    # Setup logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(f'{debug_dir}/scan_photos.log'),
-            logging.StreamHandler()  # Also output to console
-        ]
-    )
-    return logging.getLogger(__name__)
+    """Setup rotated background logging to debug directory"""
+    return photo_logging.setup_logging("scan_photos")
 
 def log_and_print(message, level="INFO"):
     """Print and log message"""
@@ -62,50 +70,33 @@ def log_and_print(message, level="INFO"):
         pass  # If logger not available, just print
 
 def load_ha_token():
-    """Load token from secrets.yaml"""
+    """Load token from secrets.yaml (cached until the file changes)"""
+    secrets_path = photo_ha.find_secrets_file()
+    if not secrets_path:
+        log_and_print("❌ secrets.yaml file not found", "ERROR")
+        log_and_print("💡 Expected locations:")
+        for path in photo_ha.SECRETS_PATHS:
+            log_and_print(f"   - {path}")
+        return None
+    
+    log_and_print(f"📄 Found secrets.yaml: {secrets_path}")
+    
     try:
-        # Search for secrets.yaml in different locations
-        possible_paths = [
-            "/config/secrets.yaml",
-            "./secrets.yaml",
-            "../secrets.yaml"
-        ]
-        
-        secrets_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                secrets_path = path
-                log_and_print(f"📄 Found secrets.yaml: {path}")
-                break
+        token, key = photo_ha.load_token(secrets_path)
         
-        if not secrets_path:
-            log_and_print("❌ secrets.yaml file not found", "ERROR")
-            log_and_print("💡 Expected locations:")
-            for path in possible_paths:
-                log_and_print(f"   - {path}")
-            return None
-        
-        # Read secrets.yaml
-        with open(secrets_path, 'r', encoding='utf-8') as file:
-            secrets = yaml.safe_load(file)
-        
-        # Search for token
-        token_keys = ['tvphotoframe_token', 'appdaemon_token', 'ha_token', 'home_assistant_token', 'api_token']
-        
-        for key in token_keys:
-            if key in secrets:
-                log_and_print(f"✅ Token found in secrets.yaml: {key}")
-                return secrets[key]
+        if token:
+            log_and_print(f"✅ Token found in secrets.yaml: {key}")
+            return token
         
         log_and_print("❌ Token not found in secrets.yaml", "ERROR")
         log_and_print("💡 Add one of these lines to secrets.yaml:")
-        for key in token_keys:
+        for key in photo_ha.TOKEN_KEYS:
             log_and_print(f"   {key}: your_token_here")
         log_and_print("💡 Recommended: tvphotoframe_token: your_token")
         
         return None
         
-    except yaml.YAMLError as e:
+    except ValueError as e:
         log_and_print(f"❌ Error parsing secrets.yaml: {e}", "ERROR")
         return None
     except Exception as e:
@@ -114,6 +105,8 @@ def load_ha_token():
 
 def load_smb_credentials():
     """Load SMB credentials from secrets.yaml (optional for guest access)"""
+    import yaml
+    
     try:
         with open("/config/secrets.yaml", 'r', encoding='utf-8') as file:
             secrets = yaml.safe_load(file)
@@ -133,165 +126,10 @@ def load_smb_credentials():
         print(f"⚠️ Error loading SMB credentials, trying guest access: {e}")
         return None, None
 
-def parse_network_path(path):
-    """Parse Windows network path to get server and share"""
-    # Convert \\server\share\folder to //server/share and /folder
-    if path.startswith('\\\\'):
-        # Windows UNC path
-        path_clean = path.replace('\\\\', '').replace('\\', '/')
-        parts = path_clean.split('/')
-        if len(parts) >= 2:
-            server = parts[0]
-            share = parts[1]
-            subfolder = '/'.join(parts[2:]) if len(parts) > 2 else ''
-            return server, share, subfolder
-    elif path.startswith('//'):
-        # Unix SMB path
-        path_clean = path[2:]  # Remove //
-        parts = path_clean.split('/')
-        if len(parts) >= 2:
-            server = parts[0]
-            share = parts[1]
-            subfolder = '/'.join(parts[2:]) if len(parts) > 2 else ''
-            return server, share, subfolder
-    
-    return None, None, None
-
-def mount_smb_share(server, share, username=None, password=None):
-    """Mount SMB share to local directory with SMB 1.0 support and read-only fix"""
-    try:
-        # Create mount base directory
-        os.makedirs(MOUNT_BASE, exist_ok=True)
-        
-        # Create unique mount point
-        mount_point = os.path.join(MOUNT_BASE, f"{server}_{share}")
-        os.makedirs(mount_point, exist_ok=True)
-        
-        # Check if already mounted
-        if os.path.ismount(mount_point):
-            print(f"✅ SMB share already mounted: {mount_point}")
-            return mount_point
-        
-        # Build mount command
-        smb_path = f"//{server}/{share}"
-        
-        # SMB 1.0 specific options with read-only fixes
-        mount_options = [
-            # Read-only mount (since we only need to read photos)
-            "guest,vers=1.0,ro,uid=root,gid=root,iocharset=utf8,noperm",
-            # Read-only with different security
-            "guest,vers=1.0,ro,sec=ntlm,uid=root,gid=root,iocharset=utf8",
-            # Read-only basic
-            "guest,vers=1.0,ro,uid=root,gid=root",
-            # Legacy read-only
-            "guest,ro,sec=ntlm,uid=root,gid=root,iocharset=utf8",
-            # Read-only without version
-            "guest,ro,uid=root,gid=root,iocharset=utf8",
-            # Try read-write anyway
-            "guest,vers=1.0,uid=root,gid=root,iocharset=utf8,file_mode=0444,dir_mode=0555",
-            # Basic guest without permissions
-            "guest,vers=1.0,uid=root,gid=root",
-            # Minimal options
-            "guest,uid=root,gid=root"
-        ]
-        
-        # If credentials provided, add authenticated SMB 1.0 options first
-        if username and password:
-            auth_options = [
-                f"username={username},password={password},vers=1.0,ro,uid=root,gid=root,iocharset=utf8",
-                f"username={username},password={password},vers=1.0,ro,sec=ntlm,uid=root,gid=root",
-                f"username={username},password={password},ro,sec=ntlm,uid=root,gid=root,iocharset=utf8",
-                f"username={username},password={password},vers=1.0,uid=root,gid=root,file_mode=0444"
-            ]
-            mount_options = auth_options + mount_options
-        
-        print(f"🔧 Mounting SMB 1.0 share (read-only): {smb_path} -> {mount_point}")
-        
-        # Try each mount option
-        for i, options in enumerate(mount_options):
-            if username and i < 4:
-                access_type = "authenticated SMB 1.0"
-            elif "ro" in options:
-                access_type = "read-only guest SMB 1.0"
-            else:
-                access_type = "guest SMB 1.0"
-                
-            print(f"🔄 Trying {access_type} (option {i+1})...")
-            
-            mount_cmd = ["mount", "-t", "cifs", smb_path, mount_point, "-o", options]
-            
-            try:
-                result = subprocess.run(mount_cmd, capture_output=True, text=True, timeout=45)
-                
-                if result.returncode == 0:
-                    print(f"✅ Successfully mounted with {access_type}: {mount_point}")
-                    
-                    # Test access to mounted folder
-                    try:
-                        test_files = os.listdir(mount_point)[:3]
-                        print(f"   📁 Mount test - found items: {test_files}")
-                        return mount_point
-                    except Exception as e:
-                        print(f"   ⚠️ Mount successful but cannot list contents: {e}")
-                        # Try to continue anyway, maybe permissions will work
-                        return mount_point
-                        
-                else:
-                    error_msg = result.stderr.strip()
-                    if "cannot mount" in error_msg and "read-only" in error_msg:
-                        print(f"   ❌ Read-only mount issue")
-                    elif "Permission denied" in error_msg:
-                        print(f"   ❌ Permission denied")
-                    elif "No such file or directory" in error_msg:
-                        print(f"   ❌ Share not found")
-                    elif "Connection refused" in error_msg:
-                        print(f"   ❌ Connection refused")
-                    elif "Invalid argument" in error_msg:
-                        print(f"   ❌ Invalid mount options")
-                    else:
-                        print(f"   ❌ Failed: {error_msg}")
-                    continue
-                    
-            except subprocess.TimeoutExpired:
-                print(f"   ❌ Timeout (45s) - server may be slow")
-                continue
-            except Exception as e:
-                print(f"   ❌ Error: {e}")
-                continue
-        
-        print(f"❌ All SMB 1.0 mount attempts failed for {smb_path}")
-        print("💡 Advanced SMB 1.0 troubleshooting:")
-        print("   - Try manual test: smbclient -L //192.168.1.11 -N")
-        print("   - Check dmesg for kernel errors: dmesg | tail")
-        print("   - Verify share name exactly matches on server")
-        print("   - Check if server requires specific SMB dialect")
-        return None
-        
-    except Exception as e:
-        print(f"❌ Mount error: {e}")
-        return None
-            
-    except subprocess.TimeoutExpired:
-        print("❌ Mount command timed out")
-        return None
-    except Exception as e:
-        print(f"❌ Mount error: {e}")
-        return None
-
-def unmount_smb_share(mount_point):
-    """Unmount SMB share"""
-    try:
-        if os.path.ismount(mount_point):
-            result = subprocess.run(["umount", mount_point], capture_output=True, text=True, timeout=10)
-            if result.returncode == 0:
-                print(f"🔓 Unmounted: {mount_point}")
-            else:
-                print(f"⚠️ Unmount warning: {result.stderr}")
-    except Exception as e:
-        print(f"⚠️ Unmount error: {e}")
-
 def get_ha_entity_state(entity_id, token):
     """Get entity value from Home Assistant"""
+    import requests
+    
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
@@ -358,6 +196,8 @@ def get_photo_list_via_python_smb(server, share, subfolder="", username=None, pa
 
 def get_photo_list_via_curl_smb(server, share, subfolder="", username=None, password=None):
     """Alternative: try to access SMB via HTTP (if server has web interface)"""
+    import subprocess
+    
     photos = []
     
     try:
@@ -398,30 +238,13 @@ def get_photo_list_via_curl_smb(server, share, subfolder="", username=None, pass
         print(f"❌ Alternative access error: {e}")
         return []
 
-def get_photo_list_fallback_static():
-    """Fallback: static photo list for testing"""
-    print("🔄 Using fallback static photo list for testing")
-    
-    # Sample photo list - replace with your actual photos
-    static_photos = [
-        "IMG_001.jpg", "IMG_002.jpg", "IMG_003.png",
-        "DSCN001.jpg", "DSCN002.jpg", "photo1.jpeg",
-        "vacation/beach1.jpg", "vacation/beach2.jpg",
-        "family/birthday1.jpg", "family/birthday2.png",
-        "nature/sunset.jpg", "nature/landscape.png"
-    ]
-    
-    # Shuffle for variety
-    random.shuffle(static_photos)
-    
-    print(f"📷 Using {len(static_photos)} sample photos")
-    print("💡 Replace static_photos list in script with your actual filenames")
-    
-    return static_photos
-
 def get_photo_list(folder_path):
-    """Get list of photos from folder (with multiple fallback methods)"""
-    photos = []
+    """Get list of photos from folder (with multiple fallback methods)
+
+    Returns None if the folder could not be listed, so the caller keeps the
+    last good catalog instead of saving an empty or made-up list.
+    """
+    photos = None
     
     try:
         print(f"🔍 Analyzing path: {folder_path}")
@@ -437,9 +260,9 @@ def get_photo_list(folder_path):
             
             # Try multiple methods in order of preference
             methods = [
+                ("CIFS mount", lambda: get_photo_list_via_mount(server, share, subfolder, username, password)),
                 ("smbclient", lambda: get_photo_list_via_smbclient(server, share, subfolder, username, password)),
-                ("python SMB", lambda: get_photo_list_via_python_smb(server, share, subfolder, username, password)),
-                ("static fallback", lambda: get_photo_list_fallback_static())
+                ("python SMB", lambda: get_photo_list_via_python_smb(server, share, subfolder, username, password))
             ]
             
             for method_name, method_func in methods:
@@ -451,14 +274,15 @@ def get_photo_list(folder_path):
                         break
                     else:
                         print(f"⚠️ {method_name} returned no photos, trying next method...")
+                except photo_shards.ScanIncomplete:
+                    raise  # resumable, don't replace it with a fresh scan
                 except Exception as e:
                     print(f"❌ {method_name} failed: {e}")
                     continue
             
             if not photos:
                 print("❌ All network methods failed!")
-                print("💡 Quick fix: Use static photo list")
-                photos = get_photo_list_fallback_static()
+                photos = None
             
         else:
             # Local path - use original method
@@ -467,153 +291,193 @@ def get_photo_list(folder_path):
             
             if os.path.exists(scan_path):
                 print(f"✅ Path accessible: {scan_path}")
-                
-                # Recursive search in all subfolders
-                for root, dirs, files in os.walk(scan_path):
-                    for file in files:
-                        if any(file.lower().endswith(ext.lower()) for ext in SUPPORTED_EXTENSIONS):
-                            # Get relative path from main folder
-                            rel_path = os.path.relpath(os.path.join(root, file), scan_path)
-                            photos.append(rel_path.replace('\\', '/'))  # Normalize slashes
-                            
-                print(f"📷 Found {len(photos)} photos")
-                
-                # Limit count and shuffle
-                if len(photos) > MAX_PHOTOS:
-                    photos = random.sample(photos, MAX_PHOTOS)
-                    print(f"🎲 Selected random {MAX_PHOTOS} photos from total collection")
-                else:
-                    random.shuffle(photos)
+                photos = scan_local_folder(scan_path)
             else:
                 print(f"❌ Path not accessible: {scan_path}")
     
+    except photo_shards.ScanIncomplete:
+        raise
     except Exception as e:
         print(f"❌ Error scanning photos: {e}")
-        print("🔄 Using fallback static list...")
-        photos = get_photo_list_fallback_static()
+        photos = None
     
     return photos
 
-def get_photo_list_via_smbclient(server, share, subfolder="", username=None, password=None):
-    """Get list of photos using smbclient (working version)"""
-    
-    # Use confirmed working path
-    smbclient_cmd = "/usr/bin/smbclient"
-    
-    print(f"🔍 Using confirmed smbclient: {smbclient_cmd}")
-    
-    # Verify it works
-    try:
-        result = subprocess.run([smbclient_cmd, "--version"], 
-                              capture_output=True, text=True, timeout=5)
-        if result.returncode == 0:
-            print(f"✅ smbclient version: {result.stdout.strip().split()[0]}")
-        else:
-            print(f"❌ smbclient test failed: {result.stderr}")
-            raise Exception("smbclient not working")
-    except Exception as e:
-        print(f"❌ smbclient error: {e}")
-        raise Exception("smbclient not available")
-    
-    # Now use the working smbclient
-    photos = []
-    smb_path = f"//{server}/{share}"
-    
-    print(f"📡 Connecting to: {smb_path}")
+def phase_budget(budget, reserve=FINISH_RESERVE):
+    """budget seconds, cut so that reserve seconds are left before the shell_command limit"""
+    if PROCESS_DEADLINE is None:
+        return budget
+    # Never 0: for probe_headers that means "settle everything without reading"
+    return max(0.01, min(budget, PROCESS_DEADLINE - reserve - time.monotonic()))
+
+def mount_deadline():
+    """time.monotonic() value after which photo_mount stops trying mount options"""
+    return time.monotonic() + phase_budget(MOUNT_BUDGET)
+
+def listing_deadline():
+    """time.monotonic() value at which the listing must pause (None: photo_shards default budget)"""
+    if PROCESS_DEADLINE is None:
+        return None
+    deadline = PROCESS_DEADLINE - photo_index.EXIF_TIME_BUDGET - photo_bursts.HASH_TIME_BUDGET - FINISH_RESERVE
+    if photo_shards.SCAN_TIME_BUDGET:
+        deadline = min(deadline, STARTED + photo_shards.SCAN_TIME_BUDGET)
+    return deadline
+
+def scan_local_folder(scan_path):
+    """Recursive local scan (relative paths), shuffled and limited to MAX_PHOTOS"""
+    # One shard per directory, see photo_shards
+    with_bytes = photo_progress.active()
+    photos = photo_shards.scan_sharded(
+        scan_path, lambda rel: list_photo_dir(f"{scan_path}/{rel}" if rel else scan_path, with_bytes),
+        deadline=listing_deadline())
+    
+    print(f"📷 Found {len(photos)} photos")
+    
+    # Limit count and shuffle
+    if len(photos) > MAX_PHOTOS:
+        photos = random.sample(photos, MAX_PHOTOS)
+        print(f"🎲 Selected random {MAX_PHOTOS} photos from total collection")
+    else:
+        random.shuffle(photos)
+    return photos
+
+def get_photo_list_via_mount(server, share, subfolder="", username=None, password=None):
+    """Get list of photos by walking the persistent CIFS mount of the share"""
+    mount_point = ensure_mount(server, share, username, password, mount_deadline())
+    if not mount_point:
+        return []
     
-    # Build base command
-    cmd_base = [
-        smbclient_cmd, smb_path,
+    scan_path = os.path.join(mount_point, subfolder) if subfolder else mount_point
+    if not os.path.isdir(scan_path):
+        print(f"❌ Subfolder not found on mounted share: {scan_path}")
+        return []
+    return scan_local_folder(scan_path)
+
+def parse_smbclient_listing(output, base=""):
+    """Parse smbclient 'ls' output, returns (photo paths, subdirectory names, photo bytes)
+
+    With 'recurse ON' every subdirectory listing starts with a header line
+    like '\\photos\\2019\\summer'; photos below it are returned as
+    '2019/summer/IMG.jpg' relative to base (the directory that was listed).
+    Subdirectory names are only collected for base itself.
+    """
+    photos, subdirs = [], []
+    nbytes = 0
+    base_header = "\\" + base.strip("/").replace("/", "\\") if base else ""
+    prefix = ""
+    for raw in output.split('\n'):
+        if raw.startswith('\\'):
+            header = raw.strip()
+            if base_header and header.lower().startswith(base_header.lower()):
+                header = header[len(base_header):]
+            rel = header.strip('\\').replace('\\', '/')
+            prefix = f"{rel}/" if rel else ""
+            continue
+        
+        # Parse smbclient output: "filename   type   size   date" (names may contain spaces)
+        entry = SMB_LS_ENTRY.match(raw.rstrip('\r'))
+        if not entry:
+            continue
+        
+        filename = entry.group('name')
+        if filename in ('.', '..') or filename.startswith('.'):
+            continue
+        
+        # A = archive/file, D = directory
+        if 'D' in entry.group('attrs'):
+            if not prefix:
+                subdirs.append(filename)
+        elif is_photo_name(filename):
+            photos.append(prefix + filename)
+            nbytes += int(entry.group('size'))
+    return photos, subdirs, nbytes
+
+def smbclient_command(server, share, username=None, password=None):
+    """Base smbclient command line for a share"""
+    cmd = [
+        SMBCLIENT_CMD, f"//{server}/{share}",
         "--option=client min protocol=NT1",
         "--option=client max protocol=NT1"
     ]
-    
-    # Add authentication
     if username and password:
-        cmd_base.extend(["-U", f"{username}%{password}"])
-        print(f"🔐 Using credentials: {username}")
-    else:
-        cmd_base.append("-N")
-        print("🔓 Using guest access")
-    
-    # Function to run smbclient commands
-    def run_smb_command(command):
-        full_cmd = cmd_base + ["-c", command]
-        print(f"🔧 Running: smbclient ... -c '{command}'")
-        
-        try:
-            result = subprocess.run(full_cmd, capture_output=True, text=True, timeout=30)
-            if result.returncode == 0:
-                return result.stdout
-            else:
-                print(f"❌ Command failed: {result.stderr.strip()}")
-                return None
-        except subprocess.TimeoutExpired:
-            print("❌ Command timeout (30s)")
-            return None
-        except Exception as e:
-            print(f"❌ Command error: {e}")
-            return None
-    
-    # Test basic connection first
-    print("🧪 Testing basic connection...")
-    test_output = run_smb_command("ls")
-    if not test_output:
-        print("❌ Basic connection test failed!")
-        return []
-    
-    print("✅ Basic connection works!")
-    
-    # Navigate to subfolder if specified
-    if subfolder:
-        print(f"📁 Navigating to subfolder: {subfolder}")
-        ls_command = f'cd "{subfolder}"; ls'
+        cmd.extend(["-U", f"{username}%{password}"])
     else:
-        print("📁 Scanning root directory")
-        ls_command = "ls"
-    
-    # Get file listing
-    print(f"🔍 Getting directory listing...")
-    output = run_smb_command(ls_command)
-    if not output:
-        print("❌ Directory listing failed!")
-        return []
+        cmd.append("-N")
+    return cmd
+
+def run_smbclient(server, share, command, username=None, password=None, timeout=30):
+    """Run one smbclient -c command, returns stdout or None
+
+    Output fetched by the access probe is handed to the listing phase once
+    instead of logging in and listing the same folder a second time.
+    """
+    import subprocess
     
-    print("📋 Parsing directory listing...")
-    print("Raw output preview:")
-    print(output[:500] + "..." if len(output) > 500 else output)
+    key = (server, share, command)
+    if key in _smb_results:
+        print(f"♻️ Reusing probe listing for '{command}'")
+        return _smb_results.pop(key)
     
-    lines = output.strip().split('\n')
+    print(f"🔧 Running: smbclient ... -c '{command}'")
+    try:
+        # Names that are not valid UTF-8 survive as surrogate escapes (see photo_paths)
+        result = subprocess.run(smbclient_command(server, share, username, password) + ["-c", command],
+                                capture_output=True, text=True, errors="surrogateescape", timeout=timeout)
+        if result.returncode == 0:
+            return result.stdout
+        print(f"❌ Command failed: {result.stderr.strip() or result.stdout.strip()[-200:]}")
+        return None
+    except subprocess.TimeoutExpired:
+        print(f"❌ Command timeout ({timeout}s)")
+        return None
+    except Exception as e:
+        print(f"❌ Command error: {e}")
+        return None
+
+def smb_list_command(directory, recursive=False):
+    """smbclient -c command listing directory ("" = share root)"""
+    cd = f'cd "{directory}"; ' if directory else ""
+    return f"{cd}recurse ON; ls" if recursive else f"{cd}ls"
+
+def list_whole_share():
+    """Shares that were small on the last scan are listed in one recursive call"""
+    try:
+        return (photo_catalog.read_catalog(PHOTOS_FILE) or {}).get("total_count", 0) <= SMB_SINGLE_CALL_MAX
+    except ValueError:
+        return False
+
+def get_photo_list_via_smbclient(server, share, subfolder="", username=None, password=None):
+    """Get list of photos using smbclient (working version)"""
+    smb_path = f"//{server}/{share}"
+    print(f"📡 Listing {smb_path} as {username or 'guest'}")
     
-    for line in lines:
-        line = line.strip()
-        if not line or 'blocks of size' in line:
-            continue
-            
-        # Skip directories starting with '.'
-        if line.startswith('  .'):
-            continue
-            
-        # Parse smbclient output: "  filename   type   size   date"
-        parts = line.split()
-        if len(parts) < 2:
-            continue
-            
-        filename = parts[0]
-        filetype = parts[1]
-        
-        # Only process files (A = archive/file)
-        if filetype == 'A':
-            # Check if it's an image file
-            if any(filename.lower().endswith(ext.lower()) for ext in SUPPORTED_EXTENSIONS):
-                if subfolder:
-                    photo_path = f"{subfolder}/{filename}"
-                else:
-                    photo_path = filename
-                photos.append(photo_path)
-                print(f"   📷 Found: {photo_path}")
-        elif filetype in ['D', 'DA']:
-            print(f"   📁 Directory: {filename}")
+    def run_smb_command(command):
+        return run_smbclient(server, share, command, username, password)
+    
+    # One shard per top-level directory, listed recursively in a single
+    # smbclient call. A shard that fails or times out is split into its
+    # subdirectories, and the checkpoint lets the next run continue where
+    # this one stopped. Small shares are listed in one call (see
+    # list_whole_share), spawning smbclient per folder costs more there.
+    whole_tree = list_whole_share()
+    
+    def list_shard(rel):
+        directory = "/".join(part for part in (subfolder, rel) if part)
+        if rel or whole_tree:
+            output = run_smb_command(smb_list_command(directory, recursive=True))
+            if output is not None:
+                photos, _, nbytes = parse_smbclient_listing(output, directory)
+                return photos, [], nbytes
+        output = run_smb_command(smb_list_command(directory))
+        if output is None:
+            if not rel:
+                photo_probe.invalidate(server)  # cached "share OK" is wrong now
+            raise Exception(f"listing failed: {directory or '/'}")
+        return parse_smbclient_listing(output)
+
+    print(f"🔍 Listing {smb_path}/{subfolder} by folder...")
+    photos = photo_shards.scan_sharded(f"{smb_path}/{subfolder}".rstrip('/'), list_shard, workers=SMB_SHARD_WORKERS,
+                                       deadline=listing_deadline())
     
     print(f"📷 Total photos found: {len(photos)}")
     
@@ -627,7 +491,7 @@ def get_photo_list_via_smbclient(server, share, subfolder="", username=None, pas
     return photos
 
 def test_network_access(folder_path):
-    """Enhanced network access testing with smbclient"""
+    """Check folder access: cached TCP probe of the SMB ports, then the share mount or a cached login check"""
     print("🔧 Testing network folder access...")
     
     # Parse network path
@@ -639,61 +503,45 @@ def test_network_access(folder_path):
         print(f"   Share: {share}")
         print(f"   Subfolder: {subfolder}")
         
-        # Test network connectivity
-        print(f"🏓 Testing connectivity to {server}...")
-        ping_result = subprocess.run(['ping', '-c', '1', '-W', '3', server], 
-                                   capture_output=True, text=True)
-        
-        if ping_result.returncode == 0:
-            print(f"✅ Server {server} is reachable")
+        # Test network connectivity (TCP connect, no ping)
+        reachable, port, from_cache = photo_probe.check_reachable(server)
+        cache_note = " (cached)" if from_cache else ""
+        if reachable:
+            print(f"✅ Server {server} accepts SMB connections on port {port}{cache_note}")
         else:
-            print(f"❌ Server {server} is not reachable")
+            print(f"❌ Server {server} is not reachable on ports {photo_probe.SMB_PORTS}{cache_note}")
             print("💡 Check network connection and server IP")
             return False
         
-        # Test SMB connection with smbclient
-        print(f"🔗 Testing SMB 1.0 connection...")
         username, password = load_smb_credentials()
         
-        smb_path = f"//{server}/{share}"
-        cmd = [
-            "smbclient", smb_path,
-            "--option=client min protocol=NT1",
-            "--option=client max protocol=NT1"
-        ]
-        
-        if username and password:
-            cmd.extend(["-U", f"{username}%{password}"])
-        else:
-            cmd.append("-N")
-        
-        cmd.extend(["-c", "ls"])
-        
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            if result.returncode == 0:
-                print(f"✅ SMB connection successful!")
-                if subfolder:
-                    # Test access to subfolder
-                    subfolder_cmd = cmd[:-2] + ["-c", f"cd \"{subfolder}\"; ls"]
-                    subfolder_result = subprocess.run(subfolder_cmd, capture_output=True, text=True, timeout=15)
-                    if subfolder_result.returncode == 0:
-                        print(f"✅ Subfolder '{subfolder}' accessible")
-                        lines = subfolder_result.stdout.strip().split('\n')
-                        file_count = sum(1 for line in lines if line.strip() and not line.startswith('  .') and 'blocks of size' not in line)
-                        print(f"   📁 Found {file_count} items in subfolder")
-                    else:
-                        print(f"⚠️ Subfolder '{subfolder}' not accessible or empty")
+        # The listing walks the CIFS mount when there is one: a healthy
+        # mount is the access check, no smbclient listing is spent on it
+        mount_point = ensure_mount(server, share, username, password, mount_deadline())
+        if mount_point:
+            local = os.path.join(mount_point, subfolder) if subfolder else mount_point
+            if os.path.isdir(local):
+                print(f"✅ Share mounted and readable: {local}")
                 return True
-            else:
-                print(f"❌ SMB connection failed: {result.stderr.strip()}")
-                return False
-        except subprocess.TimeoutExpired:
-            print("❌ SMB connection timeout")
-            return False
-        except Exception as e:
-            print(f"❌ SMB test error: {e}")
-            return False
+            print(f"⚠️ Subfolder not found on mounted share: {local}")
+        
+        # Otherwise test the login with the first listing the scan needs, so
+        # the listing phase starts from its output instead of repeating it
+        command = smb_list_command(subfolder, recursive=list_whole_share())
+        
+        def login():
+            output = run_smbclient(server, share, command, username, password)
+            if output is not None:
+                _smb_results[(server, share, command)] = output
+            return output is not None
+        
+        ok, from_cache = photo_probe.check_auth(server, share, username, password, login)
+        cache_note = " (cached)" if from_cache else ""
+        if ok:
+            print(f"✅ SMB login to //{server}/{share}/{subfolder} works{cache_note}")
+        else:
+            print(f"❌ SMB login or folder access failed{cache_note}")
+        return ok
             
     else:
         # Local path testing
@@ -706,6 +554,8 @@ def test_network_access(folder_path):
 
 def update_ha_simple_counter(total_photos, token):
     """Update only photo counter in Home Assistant"""
+    import requests
+    
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
@@ -738,36 +588,102 @@ def update_ha_simple_counter(total_photos, token):
 def save_photos_to_file(photos, folder_path):
     """Save photos list to JSON file for random selection"""
     try:
-        from datetime import datetime
-        import json
-        
         # Ensure directory exists
         os.makedirs(DEBUG_DIR, exist_ok=True)
         
         # Prepare data
-        photos_data = {
-            "files": photos,
-            "total_count": len(photos),
-            "last_updated": datetime.now().isoformat(),
-            "scan_folder": folder_path,
-            "version": "2.0"
-        }
+        photos_data = photo_catalog.build_catalog(photos, folder_path)
+        # Folders that could not be listed (permissions, #recycle, @eaDir)
+        photos_data["skipped_dirs"] = list(photo_shards.last_skipped)
         
-        # Save to file
-        with open("/config/tvphotoframe_photos.json", 'w', encoding='utf-8') as f:
-            json.dump(photos_data, f, indent=2, ensure_ascii=False)
+        # Atomic replace: get_next_photo.py may read the file during a scan
+        photo_catalog.save_catalog(photos_data, PHOTOS_FILE)
         
-        log_and_print(f"💾 Saved {len(photos)} photos to /config/tvphotoframe_photos.json")
+        log_and_print(f"💾 Saved {len(photos)} photos to {PHOTOS_FILE}")
         return True
         
     except Exception as e:
         print(f"❌ Error saving photos file: {e}")
         return False
 
+def update_photo_index(folder_path):
+    """Sync the query index (photo_index) with the saved catalog, EXIF dates if the folder is readable"""
+    try:
+        catalog = photo_catalog.read_catalog(PHOTOS_FILE)
+        summary = photo_index.update(catalog, mounted_path(folder_path), time_budget=phase_budget(
+            photo_index.EXIF_TIME_BUDGET, photo_bursts.HASH_TIME_BUDGET + FINISH_RESERVE))
+        log_and_print(f"🗂️ Index: +{summary['added']} -{summary['removed']}, "
+                      f"{summary['dated']} dated, {summary['undated']} left for the next scan")
+        return summary
+    except Exception as e:
+        log_and_print(f"⚠️ Could not update photo index: {e}", "WARNING")
+        return None
+
+def update_bursts(folder_path, summary):
+    """Collapse burst sequences (photo_bursts) and store the hidden frames in the catalog
+
+    The catalog is re-saved with the same generation, so show history and
+    the index stay valid; ids whose burst status changed are added to the
+    summary's probed_ids so playlists pick them up.
+    """
+    try:
+        catalog = photo_catalog.read_catalog(PHOTOS_FILE)
+        conn = photo_index.connect()
+        try:
+            result = photo_bursts.update(conn, mounted_path(folder_path), catalog.get("share_paths"),
+                                         phase_budget(photo_bursts.HASH_TIME_BUDGET))
+            hidden = photo_bursts.hidden_paths(conn)
+        finally:
+            conn.close()
+        if photo_bursts.apply_to_catalog(catalog, hidden):
+            photo_catalog.save_catalog(catalog, PHOTOS_FILE)
+        if summary is not None:
+            summary["probed_ids"] = list(summary.get("probed_ids", ())) + result["changed_ids"]
+        log_and_print(f"📸 Bursts: {result['clusters']} series, {result['hidden']} duplicate frames hidden, "
+                      f"{result['hashed']} hashed")
+        return result
+    except Exception as e:
+        log_and_print(f"⚠️ Could not thin bursts: {e}", "WARNING")
+        return None
+
+def update_playlists(summary, token):
+    """Apply index changes to the named playlists and offer them in input_select.tvphotoframe_playlist"""
+    import requests
+
+    try:
+        counts = photo_playlists.refresh(summary)
+    except Exception as e:
+        log_and_print(f"⚠️ Could not update playlists: {e}", "WARNING")
+        return None
+    for name, count in counts.items():
+        log_and_print(f"🎞️ Playlist '{name}': {count} photos")
+    try:
+        response = requests.post(
+            f"{HA_URL}/api/services/input_select/set_options",
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+            json={"entity_id": "input_select.tvphotoframe_playlist",
+                  "options": photo_playlists.options(counts)},
+            timeout=5
+        )
+        if response.status_code != 200:
+            print(f"❌ Playlist options update error: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Playlist options update error: {e}")
+    return counts
+
+def keep_last_good_catalog(error, retry_in=None):
+    """Scan failed: keep serving the previous catalog and schedule a retry"""
+    catalog = photo_catalog.mark_stale(error, PHOTOS_FILE, retry_in)
+    log_and_print(f"📦 Keeping last good catalog ({len(catalog['files'])} photos), "
+                  f"retry #{catalog['retry_count']} at {catalog['retry_at']}", "WARNING")
+    return catalog
+
 def update_ha_notification(message, title="TV Photo Frame", token=None):
     """Send notification to Home Assistant"""
     if not token:
         return
+    
+    import requests
         
     headers = {
         "Authorization": f"Bearer {token}",
@@ -798,22 +714,22 @@ def save_photo_list(photos, folder_path, filename="photo_list.json"):
         # Save to debug directory
         debug_file = os.path.join(DEBUG_DIR, filename)
         
-        from datetime import datetime
-        with open(debug_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "scan_time": datetime.now().isoformat(),
-                "total_photos": len(photos),
-                "folder_path": folder_path,
-                "ha_url": HA_URL,
-                "photos_sample": photos[:20],  # First 20 for example
-                "all_photos": photos,  # Full list
-                "full_count": len(photos)
-            }, f, indent=2, ensure_ascii=False)
+        photo_catalog.write_json_atomic(debug_file, {
+            "scan_time": datetime.now().isoformat(),
+            "total_photos": len(photos),
+            "folder_path": folder_path,
+            "ha_url": HA_URL,
+            "photos_sample": photos[:20],  # First 20 for example
+            "all_photos": photos,  # Full list
+            "full_count": len(photos)
+        })
         print(f"💾 List saved to {debug_file}")
     except Exception as e:
         print(f"❌ Save error: {e}")
 
 if __name__ == "__main__":
+    PROCESS_DEADLINE = STARTED + SHELL_COMMAND_LIMIT
+    
     # Setup logging first
     logger = setup_logging()
     log_and_print.logger = logger  # Attach logger to function
@@ -824,6 +740,7 @@ if __name__ == "__main__":
     
     # Send start notification
     log_and_print("📢 Sending start notification to HA...")
+    import requests
     try:
         requests.post(
             f"{HA_URL}/api/services/notify/persistent_notification",
@@ -847,6 +764,13 @@ if __name__ == "__main__":
     
     log_and_print("✅ Token loaded successfully")
     
+    # Live progress sensor, updated from inside the walker
+    try:
+        previous_count = (photo_catalog.read_catalog(PHOTOS_FILE) or {}).get("total_count", 0)
+    except ValueError:
+        previous_count = 0
+    photo_progress.begin(photo_progress.ha_publisher(HA_URL, ha_token), expected_files=previous_count)
+    
     # Send progress notification
     update_ha_notification("🔍 Getting folder path from HA...", token=ha_token)
     
@@ -856,6 +780,7 @@ if __name__ == "__main__":
     if not photo_folder:
         log_and_print("❌ Could not get folder path from Home Assistant", "ERROR")
         update_ha_notification("❌ Error: could not get folder path", token=ha_token)
+        photo_progress.finish("failed", photo_metrics.get_spans())
         exit(1)
     
     log_and_print(f"📁 Folder path: {photo_folder}")
@@ -867,45 +792,100 @@ if __name__ == "__main__":
     log_and_print("🧪 Testing folder access...")
     update_ha_notification("🧪 Testing folder access...", token=ha_token)
     
-    if not test_network_access(photo_folder):
+    photo_progress.phase("probe")
+    with span("probe"):
+        access_ok = test_network_access(photo_folder)
+    
+    if not access_ok:
         log_and_print("❌ Network access test failed!", "ERROR")
         log_and_print("💡 Troubleshooting steps:")
         log_and_print("   1. Check server IP and network connectivity")
         log_and_print("   2. Verify SMB credentials in secrets.yaml")
         log_and_print("   3. Ensure SMB share permissions allow access")
         log_and_print("   4. Try mounting manually: mount -t cifs //server/share /mnt/test")
-        update_ha_notification(f"❌ Network access failed: {photo_folder}", token=ha_token)
+        catalog = keep_last_good_catalog(f"network access failed: {photo_folder}")
+        update_ha_notification(f"❌ Network access failed: {photo_folder}. Still showing the last scan ({len(catalog['files'])} photos), retrying at {catalog['retry_at'][11:16]}.", token=ha_token)
+        photo_progress.finish("failed", photo_metrics.get_spans())
         exit(1)
     
     log_and_print("✅ Folder access OK")
     update_ha_notification("✅ Folder access OK, scanning photos...", token=ha_token)
     
     # Scan photos with SMB support
-    photos = get_photo_list(photo_folder)
-    
-    if photos:
+    photo_progress.phase("list")
+    with span("list"):
+        try:
+            photos = get_photo_list(photo_folder)
+        except photo_shards.ScanIncomplete as e:
+            # Keep the current catalog; the retry continues from the checkpoint
+            log_and_print(f"⏸️ {e}", "WARNING")
+            keep_last_good_catalog(e, retry_in=0)
+            update_ha_notification(f"⏸️ Scan paused: {e.done} folders done, {e.pending} left. It continues automatically.", "TV Photo Frame - Scan", token=ha_token)
+            photos = False
+    
+    scan_status = "done"
+    if photos is None:
+        scan_status = "failed"
+        catalog = keep_last_good_catalog(f"listing failed: {photo_folder}")
+        update_ha_notification(f"❌ Could not list {photo_folder}. Still showing the last scan ({len(catalog['files'])} photos), retrying at {catalog['retry_at'][11:16]}.", "TV Photo Frame - Error", token=ha_token)
+    elif photos is False:
+        scan_status = "paused"  # already reported
+    elif photos:
         log_and_print(f"📷 Found {len(photos)} photos")
+        if photo_shards.last_skipped:
+            log_and_print(f"⏭️ Skipped {len(photo_shards.last_skipped)} unreadable folders: "
+                          f"{', '.join(photo_shards.last_skipped[:5])}", "WARNING")
         
         # Save photos to file instead of HA
         log_and_print("💾 Saving photos list to file...")
-        if save_photos_to_file(photos, photo_folder):
+        photo_progress.phase("save")
+        with span("save"):
+            saved = save_photos_to_file(photos, photo_folder)
+        
+        if saved:
             
             # Update only the counter in HA
             log_and_print("📡 Updating Home Assistant counter...")
             update_ha_notification(f"📡 Updating HA counter: {len(photos)} photos...", token=ha_token)
             
-            update_ha_simple_counter(len(photos), ha_token)
+            photo_progress.phase("ha_update")
+            with span("ha_update"):
+                update_ha_simple_counter(len(photos), ha_token)
+            
+            # Query index for playlists (folder / date / name filters)
+            photo_progress.phase("index")
+            with span("index"):
+                summary = update_photo_index(photo_folder)
+            
+            # One representative per burst of near-identical shots
+            photo_progress.phase("bursts")
+            with span("bursts"):
+                update_bursts(photo_folder, summary)
+            
+            # Named playlists: only the changed ids are matched again
+            photo_progress.phase("playlists")
+            with span("playlists"):
+                update_playlists(summary, ha_token)
             
             # Success completion
             update_ha_notification(f"✅ SUCCESS: Found {len(photos)} photos! Use 'Next Photo' to start.", "TV Photo Frame - Complete", token=ha_token)
             log_and_print(f"🎉 SUCCESS: Saved {len(photos)} photos to file!")
         else:
+            scan_status = "failed"
             update_ha_notification("❌ Error saving photos file", "TV Photo Frame - Error", token=ha_token)
         
     else:
+        scan_status = "failed"
         log_and_print("❌ No photos found!", "ERROR")
         update_ha_notification(f"❌ No photos found in folder: {photo_folder}", "TV Photo Frame - Error", token=ha_token)
     
+    # Export phase timings
+    for name, seconds in photo_metrics.get_spans().items():
+        log_and_print(f"⏱️ {name}: {seconds * 1000:.0f} ms")
+    photo_progress.finish(scan_status, photo_metrics.get_spans())
+    photo_metrics.write_prometheus("scan")
+    photo_metrics.publish_to_ha("scan", HA_URL, ha_token)
+    
     log_and_print("=" * 60)
     log_and_print("✅ Script completed!")
     log_and_print("=" * 60)
\ No newline at end of file
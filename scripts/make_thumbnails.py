@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# scripts/make_thumbnails.py
+# Batch thumbnails and per-folder contact sheets for the photo catalog
+#
+# Usage: python3 scripts/make_thumbnails.py [--workers 4] [--size 512] [--no-sheets] [folder]
+#
+# Thumbnails use the layout Home Assistant uses for uploaded images
+# (image/<id>/512x512), with id = md5 of the catalog path, under
+# /config/www/tvphotoframe/thumbs so a dashboard can load
+# /local/tvphotoframe/thumbs/<id>/512x512. JPEGs are downscaled in the DCT
+# domain while decoding (Image.draft: 1/2, 1/4 or 1/8 scale), so a 4000 px
+# original is never decoded at full size; Image.thumbnail() then finishes
+# with reduce() + a small resample. Work is spread over a process pool and
+# unchanged photos (thumbnail newer than the source) are skipped.
+#
+# Contact sheets: contact/<folder id>.jpg tiles up to SHEET_MAX_TILES
+# thumbnails of one folder; contact/index.json maps folders to sheets.
+#
+# Requires Pillow (part of every Home Assistant install).
+
+import hashlib
+import os
+import sys
+import time
+
+import photo_catalog
+import photo_paths
+from photo_metrics import span
+
+THUMBS_DIR = "/config/www/tvphotoframe/thumbs"
+CONTACT_DIR = "/config/www/tvphotoframe/contact"
+THUMB_SIZE = 512
+THUMB_QUALITY = 85
+SHEET_TILE = 128
+SHEET_COLUMNS = 10
+SHEET_MAX_TILES = 100
+SHEET_BACKGROUND = (16, 16, 16)
+
+def photo_id(rel_path):
+    """Stable thumbnail id for a catalog path"""
+    return hashlib.md5(rel_path.encode('utf-8')).hexdigest()
+
+def thumbnail_path(rel_path, size=THUMB_SIZE, thumbs_dir=None):
+    return os.path.join(thumbs_dir or THUMBS_DIR, photo_id(rel_path), f"{size}x{size}")
+
+def make_thumbnail(src, dst, size=THUMB_SIZE, quality=THUMB_QUALITY):
+    """Write a thumbnail that fits size x size, returns its (width, height)
+
+    Transparent sources stay PNG (as HA does), everything else is JPEG.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as im:
+        # JPEG: let libjpeg decode at the smallest 1/n scale still >= size
+        im.draft("RGB", (size, size))
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((size, size), Image.Resampling.BICUBIC, reducing_gap=2.0)
+        transparent = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.tmp"
+        if transparent:
+            im.save(tmp, "PNG", compress_level=1)
+        else:
+            im.convert("RGB").save(tmp, "JPEG", quality=quality, optimize=True)
+        os.replace(tmp, dst)
+        return im.size
+
+def _thumbnail_job(job):
+    """Process pool worker: (rel, src, dst, size) -> (rel, status, detail)"""
+    rel, src, dst, size = job
+    try:
+        if os.stat(dst).st_mtime >= os.stat(src).st_mtime:
+            return rel, "skipped", None
+    except OSError:
+        pass
+    try:
+        return rel, "made", make_thumbnail(src, dst, size)
+    except Exception as e:
+        return rel, "failed", str(e)
+
+def make_contact_sheet(thumbs, dst, tile=SHEET_TILE, columns=SHEET_COLUMNS):
+    """Tile thumbnail files into one JPEG, returns the number of tiles"""
+    from PIL import Image
+
+    thumbs = thumbs[:SHEET_MAX_TILES]
+    if not thumbs:
+        return 0
+    columns = min(columns, len(thumbs))
+    rows = (len(thumbs) + columns - 1) // columns
+    sheet = Image.new("RGB", (columns * tile, rows * tile), SHEET_BACKGROUND)
+    placed = 0
+    for i, path in enumerate(thumbs):
+        try:
+            with Image.open(path) as im:
+                im.draft("RGB", (tile, tile))
+                im.thumbnail((tile, tile), Image.Resampling.BILINEAR)
+                x = (i % columns) * tile + (tile - im.width) // 2
+                y = (i // columns) * tile + (tile - im.height) // 2
+                sheet.paste(im.convert("RGB"), (x, y))
+                placed += 1
+        except OSError:
+            continue
+
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.tmp"
+    sheet.save(tmp, "JPEG", quality=80, optimize=True, progressive=True)
+    os.replace(tmp, dst)
+    return placed
+
+def _contact_sheet_job(job):
+    folder, thumbs, dst = job
+    try:
+        return folder, make_contact_sheet(thumbs, dst), None
+    except Exception as e:
+        return folder, 0, str(e)
+
+def generate(photos, root, size=THUMB_SIZE, workers=None, sheets=True, thumbs_dir=None, contact_dir=None,
+             catalog=None):
+    """Thumbnails (and contact sheets) for catalog paths under root, returns counters
+
+    Catalog paths are NFC; catalog["share_paths"] gives the exact on-share
+    names to open (photo_paths). Thumbnail ids stay keyed by catalog path.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    thumbs_dir = thumbs_dir or THUMBS_DIR
+    contact_dir = contact_dir or CONTACT_DIR
+    workers = workers or os.cpu_count() or 1
+    catalog = catalog or {}
+    jobs = [(rel, os.path.join(root, photo_paths.share_path(catalog, rel)), thumbnail_path(rel, size, thumbs_dir), size)
+            for rel in photos]
+    counts = {"made": 0, "skipped": 0, "failed": 0}
+    folders = {}
+    changed = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        with span("thumbnails"):
+            for rel, status, detail in pool.map(_thumbnail_job, jobs, chunksize=16):
+                counts[status] += 1
+                if status == "failed":
+                    print(f"⚠️ {rel}: {detail}")
+                else:
+                    folder = rel.rpartition('/')[0]
+                    folders.setdefault(folder, []).append(rel)
+                    if status == "made":
+                        changed.add(folder)
+
+        if sheets and folders:
+            with span("contact_sheets"):
+                # Only folders with new thumbnails get a new sheet
+                sheet_jobs = []
+                results = []
+                for folder, rels in sorted(folders.items()):
+                    rels.sort()
+                    sheet = os.path.join(contact_dir, f"{photo_id(folder or '/')}.jpg")
+                    if folder in changed or not os.path.exists(sheet):
+                        sheet_jobs.append((folder, [thumbnail_path(r, size, thumbs_dir) for r in rels], sheet))
+                    else:
+                        results.append((folder, min(len(rels), SHEET_MAX_TILES), None))
+                results.extend(pool.map(_contact_sheet_job, sheet_jobs))
+                index = {}
+                for folder, tiles, error in sorted(results):
+                    if error:
+                        print(f"⚠️ Contact sheet for '{folder}': {error}")
+                        continue
+                    index[folder] = {
+                        "sheet": f"{photo_id(folder or '/')}.jpg",
+                        "tiles": tiles,
+                        "photos": len(folders[folder]),
+                    }
+                photo_catalog.write_json_atomic(os.path.join(contact_dir, "index.json"), index)
+                counts["sheets"] = len(index)
+    return counts
+
+def main():
+    import argparse
+
+    import photo_mount
+
+    parser = argparse.ArgumentParser(description="Generate thumbnails and contact sheets")
+    parser.add_argument("folder", nargs="?", help="photo folder (default: catalog scan_folder)")
+    parser.add_argument("--size", type=int, default=THUMB_SIZE)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--no-sheets", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("❌ Pillow is not installed (pip install pillow)")
+        sys.exit(1)
+
+    catalog = photo_catalog.read_catalog()
+    if not catalog or not catalog.get("files"):
+        print("❌ No catalog, run the photo scan first")
+        sys.exit(1)
+    folder = args.folder or catalog.get("scan_folder")
+    credentials = (None, None)
+    if folder and photo_mount.parse_network_path(folder)[0]:
+        from load_photos import load_smb_credentials
+        credentials = load_smb_credentials()
+    root = photo_mount.resolve_local_path(folder, *credentials) if folder else None
+    if not root:
+        print(f"❌ Photo folder not available locally: {folder}")
+        sys.exit(1)
+
+    photos = catalog["files"]
+    print(f"🖼️ Thumbnails for {len(photos)} photos from {root}")
+    start = time.perf_counter()
+    counts = generate(photos, root, args.size, args.workers or None, not args.no_sheets, catalog=catalog)
+    elapsed = time.perf_counter() - start
+    rate = counts["made"] / elapsed if elapsed else 0
+    print(f"✅ made {counts['made']}, unchanged {counts['skipped']}, failed {counts['failed']}, "
+          f"contact sheets {counts.get('sheets', 0)} in {elapsed:.1f}s ({rate:.1f} thumbnails/s)")
+
+    import photo_metrics
+    photo_metrics.write_prometheus("thumbs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# scripts/photo_bursts.py
+# Burst thinning: one representative per series of near-identical shots
+#
+# Usage: python3 scripts/photo_bursts.py [--list]
+#
+# Runs at scan time on the index (photo_index). Two passes, no all-pairs
+# comparison:
+#   1. Sweep: photos with a trusted capture time (file name or EXIF, not
+#      mtime) come out of the (taken, path) index already sorted; a photo
+#      taken within BURST_GAP_SECONDS of the previous one in the same
+#      folder continues that folder's run. Runs of one photo are done.
+#   2. Split: only photos inside runs get a perceptual hash (dHash, 64 bit,
+#      JPEG decoded at 1/8 scale, time-budgeted and kept in the index).
+#      A photo joins a cluster when its hash is within DHASH_MAX_DISTANCE
+#      bits of the cluster's last frame; without hashes only shots
+#      TIME_ONLY_GAP_SECONDS apart are merged.
+#
+# The largest frame of a cluster (earliest on a tie) stays; the others get
+# photos.burst_of = representative id. The catalog lists their positions
+# in "burst_hidden" (the file list itself is unchanged, so history and
+# index ids stay valid): photo_select gives them weight 0, playlists and
+# the app skip them.
+
+import os
+import zlib
+from datetime import datetime
+
+BURST_GAP_SECONDS = 120     # Same folder, this close: candidate for one burst
+TIME_ONLY_GAP_SECONDS = 10  # Without hashes only this close counts as the same burst
+DHASH_MAX_DISTANCE = 10     # Differing bits (of 64) for near-identical frames
+HASH_TIME_BUDGET = 10.0     # Seconds of hashing per scan, the scan runs under a 60 s limit
+
+_EPOCH = datetime(1970, 1, 1)
+
+def dhash(file_path):
+    """64-bit difference hash as a signed int (SQLite INTEGER)"""
+    from PIL import Image
+
+    with Image.open(file_path) as im:
+        im.draft("L", (72, 64))  # JPEG: decode at 1/8 scale
+        pixels = im.convert("L").resize((9, 8), Image.Resampling.BILINEAR).tobytes()
+    bits = 0
+    for row in range(0, 72, 9):
+        for col in range(row, row + 8):
+            bits = (bits << 1) | (pixels[col] > pixels[col + 1])
+    return bits - (1 << 64) if bits >= 1 << 63 else bits
+
+def hamming(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+def candidate_runs(rows, gap=None):
+    """Sweep rows (id, path, taken, ...) sorted by taken into per-folder runs of 2+ photos"""
+    gap = BURST_GAP_SECONDS if gap is None else gap
+    open_runs = {}  # folder -> (last timestamp, run)
+    runs = []
+    for row in rows:
+        try:
+            ts = (datetime.fromisoformat(row[2]) - _EPOCH).total_seconds()
+        except ValueError:
+            continue
+        folder = row[1].rpartition('/')[0]
+        current = open_runs.get(folder)
+        if current is not None and ts - current[0] <= gap:
+            run = current[1]
+        else:
+            run = []
+            runs.append(run)
+        run.append((ts, row))
+        open_runs[folder] = (ts, run)
+    return [run for run in runs if len(run) > 1]
+
+def split_run(run, hashes):
+    """Clusters (lists of rows) of 2+ near-identical frames in one run"""
+    clusters = []
+    for ts, row in run:
+        digest = hashes.get(row[0])
+        for cluster in reversed(clusters):
+            last_ts, last = cluster[-1]
+            last_digest = hashes.get(last[0])
+            if digest is not None and last_digest is not None:
+                same = hamming(digest, last_digest) <= DHASH_MAX_DISTANCE
+            else:
+                same = ts - last_ts <= TIME_ONLY_GAP_SECONDS
+            if same:
+                cluster.append((ts, row))
+                break
+        else:
+            clusters.append([(ts, row)])
+    return [[row for _, row in cluster] for cluster in clusters if len(cluster) > 1]
+
+def _hash_runs(conn, runs, root, share_paths, time_budget):
+    """dHash for run members that have none yet, returns {id: hash} and how many were computed"""
+    import time
+    import photo_paths
+
+    hashes = {row[0]: row[3] for run in runs for _, row in run if row[3] is not None}
+    if not root or not os.path.isdir(root) or not time_budget:
+        return hashes, 0
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("⚠️ Pillow is not installed, bursts are detected by capture time only")
+        return hashes, 0
+
+    started = time.monotonic()
+    updates = []
+    for run in runs:
+        for _, row in run:
+            if row[0] in hashes:
+                continue
+            if time.monotonic() - started > time_budget:
+                break
+            encoded = share_paths.get(row[1]) if share_paths else None
+            try:
+                digest = dhash(os.path.join(root, photo_paths.decode_exact(encoded) if encoded else row[1]))
+            except Exception:
+                continue
+            hashes[row[0]] = digest
+            updates.append((digest, row[0]))
+    if updates:
+        with conn:
+            conn.executemany("UPDATE photos SET dhash = ? WHERE id = ?", updates)
+    return hashes, len(updates)
+
+def update(conn, root=None, share_paths=None, time_budget=None):
+    """Recluster bursts in the index, returns a summary with the ids whose burst_of changed"""
+    time_budget = HASH_TIME_BUDGET if time_budget is None else time_budget
+    rows = conn.execute(
+        "SELECT id, path, taken, dhash, width, height FROM photos "
+        "WHERE taken IS NOT NULL AND taken_source IN ('name', 'exif') ORDER BY taken").fetchall()
+    runs = candidate_runs(rows)
+    hashes, hashed = _hash_runs(conn, runs, root, share_paths, time_budget)
+
+    burst_of = {}
+    clusters = 0
+    for run in runs:
+        for cluster in split_run(run, hashes):
+            clusters += 1
+            # Largest frame first, then the earliest (rows come in capture order)
+            keep = max(cluster, key=lambda r: ((r[4] or 0) * (r[5] or 0), -cluster.index(r)))
+            for row in cluster:
+                if row is not keep:
+                    burst_of[row[0]] = keep[0]
+
+    current = dict(conn.execute("SELECT id, burst_of FROM photos WHERE burst_of IS NOT NULL"))
+    changed = [i for i in current if i not in burst_of]
+    changed += [i for i, rep in burst_of.items() if current.get(i) != rep]
+    if changed:
+        with conn:
+            conn.executemany("UPDATE photos SET burst_of = ? WHERE id = ?",
+                             [(burst_of.get(i), i) for i in changed])
+    return {"clusters": clusters, "hidden": len(burst_of), "hashed": hashed, "changed_ids": changed}
+
+def hidden_paths(conn):
+    """Catalog paths of the frames that are not their burst's representative"""
+    return {path for (path,) in conn.execute("SELECT path FROM photos WHERE burst_of IS NOT NULL")}
+
+def apply_to_catalog(catalog, hidden):
+    """Store hidden positions in the catalog, returns True if they changed"""
+    positions = [i for i, path in enumerate(catalog.get("files", [])) if path in hidden]
+    if positions == catalog.get("burst_hidden", []):
+        return False
+    catalog["burst_hidden"] = positions
+    catalog["burst_signature"] = zlib.crc32(repr(positions).encode('ascii'))
+    return True
+
+def catalog_hidden(catalog):
+    """Hidden catalog paths (set)"""
+    files = catalog.get("files", [])
+    return {files[i] for i in catalog.get("burst_hidden", []) if i < len(files)}
+
+def main():
+    import sys
+    import photo_catalog
+    import photo_index
+
+    conn = photo_index.connect_readonly()
+    if conn is None:
+        print("❌ No index, run the photo scan first")
+        sys.exit(1)
+    try:
+        rows = conn.execute(
+            "SELECT p.path, r.path FROM photos p JOIN photos r ON r.id = p.burst_of ORDER BY r.path, p.path"
+        ).fetchall()
+    finally:
+        conn.close()
+    if "--list" in sys.argv:
+        for path, representative in rows:
+            print(f"{path} -> {representative}")
+    catalog = photo_catalog.read_catalog() or {}
+    print(f"📸 {len(rows)} burst frames hidden behind {len({r for _, r in rows})} representatives "
+          f"({len(catalog.get('burst_hidden', []))} in the catalog)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# scripts/photo_catalog.py
+# Photo catalog file (tvphotoframe_photos.json): crash-safe writes, non-blocking reads
+#
+# Writers build the new catalog in a temp file next to the target, fsync it
+# and rename it over the old one. rename() is atomic on the same filesystem,
+# so a reader that opens the catalog sees either the previous or the new
+# complete file - never a truncated one - and never has to wait or retry.
+#
+# The catalog is also the last-known-good photo list: a failed scan never
+# replaces it, mark_stale() only records the failure and when to retry
+# (exponential backoff), and the slideshow keeps running on the old list.
+#
+# "files" holds NFC-normalized relative paths; "share_paths" maps the few
+# whose exact on-share name differs (see photo_paths).
+
+import json
+import os
+import time
+from datetime import datetime
+
+import photo_paths
+
+PHOTOS_FILE = "/config/tvphotoframe_photos.json"
+CATALOG_VERSION = "2.0"
+RETRY_BASE_SECONDS = 60     # First retry after a failed scan
+RETRY_MAX_SECONDS = 3600    # Backoff cap
+
+def write_json_atomic(path, data, indent=2):
+    """Write JSON to path via temp file + fsync + rename"""
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files as 0600
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # Persist the rename itself (best effort, not supported everywhere)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+def build_catalog(photos, folder_path):
+    """Build catalog document for a photo list (paths as listed on the share)"""
+    files, share_paths = photo_paths.index_paths(photos)
+    return {
+        "files": files,
+        "share_paths": share_paths,
+        "total_count": len(files),
+        "last_updated": datetime.now().isoformat(),
+        "scan_folder": folder_path,
+        "version": CATALOG_VERSION,
+        "generation": time.time_ns(),
+        "stale": False,
+        "retry_count": 0
+    }
+
+def catalog_generation(catalog):
+    """Integer that changes with every scan (older catalogs: derived from last_updated)"""
+    generation = catalog.get("generation")
+    if isinstance(generation, int):
+        return generation
+    import zlib
+    return zlib.crc32(str(catalog.get("last_updated")).encode('utf-8'))
+
+def save_catalog(catalog, path=None):
+    """Atomically replace the catalog file"""
+    write_json_atomic(path or PHOTOS_FILE, catalog)
+
+def read_catalog(path=None):
+    """Read catalog, returns dict or None if there is no catalog yet
+
+    Never sees a partially written file (see module comment). Raises
+    ValueError only if the file was corrupted outside of these writers.
+    """
+    try:
+        with open(path or PHOTOS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def mark_stale(error, path=None, retry_in=None):
+    """Record a failed scan on the last good catalog, returns the updated catalog
+
+    Files and generation stay untouched. The retry delay doubles with every
+    consecutive failure unless retry_in (seconds) is given.
+    """
+    try:
+        catalog = read_catalog(path)
+    except ValueError:
+        catalog = None
+    if catalog is None:
+        catalog = build_catalog([], None)
+        catalog["generation"] = 0
+
+    now = datetime.now()
+    retry_count = int(catalog.get("retry_count") or 0) + 1
+    if retry_in is None:
+        retry_in = min(RETRY_BASE_SECONDS * 2 ** (retry_count - 1), RETRY_MAX_SECONDS)
+    if not catalog.get("stale"):
+        catalog["stale_since"] = now.isoformat()
+    catalog.update({
+        "stale": True,
+        "last_error": str(error),
+        "last_attempt": now.isoformat(),
+        "retry_count": retry_count,
+        "retry_at": datetime.fromtimestamp(now.timestamp() + retry_in).isoformat(),
+    })
+    save_catalog(catalog, path)
+    return catalog
+
+def retry_due(catalog, now=None):
+    """True if the catalog is stale and its retry time has passed"""
+    if not catalog or not catalog.get("stale") or not catalog.get("retry_at"):
+        return False
+    try:
+        retry_at = datetime.fromisoformat(catalog["retry_at"])
+    except (TypeError, ValueError):
+        return True
+    return (now or datetime.now()) >= retry_at
+
+def staleness(catalog):
+    """Catalog freshness attributes for HA sensors"""
+    return {
+        "catalog_stale": bool(catalog.get("stale")),
+        "catalog_updated": catalog.get("last_updated"),
+        "catalog_retry_at": catalog.get("retry_at") if catalog.get("stale") else None,
+    }
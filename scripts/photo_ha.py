@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# scripts/photo_ha.py
+# Lightweight HA REST client and cached token lookup for the per-tick script
+#
+# Uses http.client instead of requests and a JSON token cache instead of
+# parsing secrets.yaml, so get_next_photo.py starts fast on every tick.
+# The cache holds the token itself, so it lives outside /config (which is
+# a git checkout and ends up in backups): $XDG_RUNTIME_DIR or /tmp, mode 0600.
+
+import json
+import os
+
+SECRETS_PATHS = ["/config/secrets.yaml", "./secrets.yaml", "../secrets.yaml"]
+TOKEN_KEYS = ['tvphotoframe_token', 'appdaemon_token', 'ha_token', 'home_assistant_token', 'api_token']
+TOKEN_CACHE_FILE = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or "/tmp",
+                                f"tvphotoframe_token_cache_{os.getuid()}.json")
+# Written by older versions inside the config directory, removed on sight
+LEGACY_TOKEN_CACHE_FILE = "/config/tvphotoframe_debug/token_cache.json"
+
+def find_secrets_file():
+    """Return first existing secrets.yaml path or None"""
+    for path in SECRETS_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+def _secrets_signature(path):
+    """Identify a secrets.yaml revision without reading it"""
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_mtime_ns, st.st_size]
+
+def load_token(secrets_path=None):
+    """Return (token, key) from cache, re-reading secrets.yaml only when it changed
+
+    Raises OSError if secrets.yaml is missing and ValueError if it is
+    invalid YAML; returns (None, None) if no known token key is present.
+    """
+    secrets_path = secrets_path or find_secrets_file()
+    if not secrets_path:
+        raise FileNotFoundError("secrets.yaml not found")
+
+    signature = _secrets_signature(secrets_path)
+    try:
+        with open(TOKEN_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get("signature") == signature:
+            return cached.get("token"), cached.get("key")
+    except (OSError, ValueError):
+        pass
+
+    # Cache miss: parse secrets.yaml (yaml is only imported here)
+    import yaml
+
+    with open(secrets_path, 'r', encoding='utf-8') as file:
+        try:
+            secrets = yaml.safe_load(file) or {}
+        except yaml.YAMLError as e:
+            # Callers need not import yaml just to catch this
+            raise ValueError(f"invalid YAML: {e}") from e
+
+    token, token_key = None, None
+    for key in TOKEN_KEYS:
+        if key in secrets:
+            token, token_key = secrets[key], key
+            break
+
+    _write_token_cache({"signature": signature, "token": token, "key": token_key})
+    return token, token_key
+
+def _write_token_cache(data):
+    """Store token cache readable by owner only"""
+    try:
+        os.unlink(LEGACY_TOKEN_CACHE_FILE)
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(TOKEN_CACHE_FILE), exist_ok=True)
+        tmp_path = f"{TOKEN_CACHE_FILE}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, TOKEN_CACHE_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not write token cache: {e}")
+
+def post(ha_url, path, token, data, timeout=10):
+    """POST JSON to HA REST API, return HTTP status code
+
+    Raises OSError (including timeouts) on connection problems.
+    """
+    import http.client
+    from urllib.parse import urlsplit
+
+    url = urlsplit(ha_url)
+    if url.scheme == "https":
+        conn = http.client.HTTPSConnection(url.hostname, url.port, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+
+    body = json.dumps(data).encode('utf-8')
+    try:
+        conn.request("POST", path, body=body, headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
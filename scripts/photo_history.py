@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# scripts/photo_history.py
+# Persisted show history: ring buffer of recent slides + last-shown index per photo
+#
+# "Was photo X shown in the last N slides / N seconds?" is answered in O(1)
+# from per-photo last_seq/last_time arrays; the ring keeps the most recent
+# HISTORY_CAPACITY shows (photo id + time) for stats and recency windows.
+# Photo ids passed in and out are catalog indices. Every photo also has a
+# stable key (64-bit hash of its path) stored next to it, so a new catalog
+# generation (every scan, every watcher change, every HA restart) remaps the
+# history by key instead of starting over: only photos that left the
+# catalog lose their entries.
+
+import struct
+import time
+
+import photo_state
+
+HISTORY_FILE = "/config/tvphotoframe_debug/show_history.bin"
+HISTORY_CAPACITY = 1000
+
+# magic, format version, dirty flag, photo count, catalog generation,
+# ring capacity, ring head, total shows (sequence number of the last show)
+_HEADER = struct.Struct('<8sIIQqQQQ')
+_MAGIC = b"TVPFHIS2"
+_FORMAT_VERSION = 2
+
+def photo_key(path):
+    """Stable 64-bit key of a catalog path (signed, fits the 'q' arrays)"""
+    import hashlib
+
+    return int.from_bytes(hashlib.blake2b(path.encode('utf-8', 'surrogateescape'), digest_size=8).digest(),
+                          'little', signed=True)
+
+class ShowHistory:
+    """Memory-mapped show history for one catalog generation"""
+
+    def __init__(self, path, mm):
+        self.path = path
+        self.mm = mm
+        (magic, version, self.dirty, self.n, self.generation,
+         self.capacity, self.head, self.seq) = _HEADER.unpack_from(mm, 0)
+        (self.ring_ids, self.ring_keys, self.ring_times, self.keys,
+         self.last_seq, self.last_time) = photo_state.map_sections(mm, self._layout(self.n, self.capacity))
+
+    @staticmethod
+    def _layout(n, capacity):
+        return [('q', capacity), ('q', capacity), ('d', capacity), ('q', n), ('q', n), ('d', n)]
+
+    @classmethod
+    def open(cls, photos, generation, path=None, capacity=None):
+        """Map history for this catalog (list of paths), remapping the one of another scan by key"""
+        path = path or HISTORY_FILE
+        capacity = capacity or HISTORY_CAPACITY
+        n = len(photos)
+        previous = None
+        mm = photo_state.open_mapped(path)
+        if mm is not None:
+            magic, version, dirty, old_n, old_generation, old_capacity, head, seq = _HEADER.unpack_from(mm, 0)
+            if (magic == _MAGIC and version == _FORMAT_VERSION and not dirty
+                    and len(mm) == photo_state.mapped_size(cls._layout(old_n, old_capacity))):
+                if old_n == n and old_generation == generation and old_capacity == capacity:
+                    return cls(path, mm)
+                previous = cls(path, mm)
+            else:
+                mm.close()
+        try:
+            return cls(path, photo_state.create_mapped(path, *cls._remapped(photos, generation, capacity, previous)))
+        finally:
+            if previous is not None:
+                previous.close()
+
+    @staticmethod
+    def _remapped(photos, generation, capacity, previous):
+        """Header and sections for a new catalog, carrying over shows of photos still in it"""
+        from array import array
+
+        n = len(photos)
+        keys = array('q', map(photo_key, photos))
+        last_seq = array('q', [-1]) * n
+        last_time = array('d', [0.0]) * n
+        ring_ids = array('q', [-1]) * capacity
+        ring_keys = array('q', [0]) * capacity
+        ring_times = array('d', [0.0]) * capacity
+        head = seq = 0
+        if previous is not None:
+            position = {key: i for i, key in enumerate(keys)}
+            for old, key in enumerate(previous.keys):
+                i = position.get(key)
+                if i is not None and previous.last_seq[old] >= 0:
+                    last_seq[i] = previous.last_seq[old]
+                    last_time[i] = previous.last_time[old]
+            # Newest shows slot for slot, oldest first, so seq and last_seq stay
+            # valid; shows of photos that left the catalog become unknown (-1)
+            for k in reversed(range(min(previous.capacity, previous.seq, capacity))):
+                slot = (previous.head - 1 - k) % previous.capacity
+                i = position.get(previous.ring_keys[slot])
+                ring_ids[head] = -1 if i is None else i
+                ring_keys[head] = 0 if i is None else keys[i]
+                ring_times[head] = previous.ring_times[slot]
+                head = (head + 1) % capacity
+            seq = previous.seq
+        header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, 0, n, generation, capacity, head, seq)
+        return header, [section.tobytes() for section in (ring_ids, ring_keys, ring_times, keys, last_seq, last_time)]
+
+    def _write_header(self, dirty):
+        _HEADER.pack_into(self.mm, 0, _MAGIC, _FORMAT_VERSION, dirty, self.n,
+                          self.generation, self.capacity, self.head, self.seq)
+
+    def record(self, photo_id, when=None):
+        """Append a show in O(1)"""
+        when = time.time() if when is None else when
+        with photo_state.locked(self.path):
+            # Another process may have recorded since this one mapped the file
+            (magic, version, dirty, n, generation,
+             capacity, self.head, self.seq) = _HEADER.unpack_from(self.mm, 0)
+            self._write_header(1)
+            self.seq += 1
+            known = 0 <= photo_id < self.n
+            self.ring_ids[self.head] = photo_id if known else -1
+            self.ring_keys[self.head] = self.keys[photo_id] if known else 0
+            self.ring_times[self.head] = when
+            self.head = (self.head + 1) % self.capacity
+            if known:
+                self.last_seq[photo_id] = self.seq
+                self.last_time[photo_id] = when
+            self._write_header(0)
+
+    def shown_within_slides(self, photo_id, slides):
+        """True if photo was one of the last `slides` shows"""
+        last = self.last_seq[photo_id]
+        return last >= 0 and self.seq - last < slides
+
+    def shown_within_seconds(self, photo_id, seconds, now=None):
+        """True if photo was shown in the last `seconds`"""
+        if self.last_seq[photo_id] < 0:
+            return False
+        now = time.time() if now is None else now
+        return now - self.last_time[photo_id] < seconds
+
+    def shown_ago(self, slides):
+        """Photo id shown `slides` shows before the latest one, -1 if unknown"""
+        if slides >= self.capacity or slides >= self.seq:
+            return -1
+        return self.ring_ids[(self.head - 1 - slides) % self.capacity]
+
+    def recent(self, count=10):
+        """Latest shows as [(photo_id, time)], newest first"""
+        count = min(count, self.capacity, self.seq)
+        items = []
+        for k in range(count):
+            slot = (self.head - 1 - k) % self.capacity
+            items.append((self.ring_ids[slot], self.ring_times[slot]))
+        return items
+
+    def stats(self, now=None):
+        """Summary for HA sensor attributes"""
+        now = time.time() if now is None else now
+        last_hour = 0
+        for photo_id, when in self.recent(self.capacity):
+            if now - when >= 3600:
+                break
+            last_hour += 1
+        return {
+            "shows_total": self.seq,
+            "shown_last_hour": last_hour,
+            "history_size": min(self.seq, self.capacity),
+        }
+
+    def close(self):
+        for section in (self.ring_ids, self.ring_keys, self.ring_times, self.keys, self.last_seq, self.last_time):
+            section.release()
+        self.mm.close()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# scripts/photo_index.py
+# Indexed catalog queries: folder prefix, capture date range, name glob
+#
+# Usage: python3 scripts/photo_index.py [--folder family] [--from 2018-07-01] [--to 2018-08-31]
+#                                       [--name 'img_2018*'] [--orientation portrait]
+#                                       [--count] [--limit 20] [--sync]
+#
+# The catalog JSON stays the source of truth; this is a SQLite index next
+# to it, synced by generation after every scan (load_photos.py) so the
+# slideshow can select "2018 holidays" or "only family/" without a rescan
+# and without loading the whole list.
+#
+#   photos(id, path TEXT UNIQUE, lname TEXT, taken TEXT, taken_source TEXT,
+#          width INT, height INT, probed INT, dhash INT, burst_of INT, position INT)
+#   ids are stable while a photo stays in the catalog (playlists store them);
+#   meta "epoch" changes whenever the tables are (re)created and ids restart
+#   position is the photo's index in catalog["files"] as of the synced
+#   generation, so a playlist pick finds its catalog slot without a search
+#   - folder prefix: range on the path index (path >= 'family/' AND path < 'family0')
+#   - date range: index on (taken, path) ('YYYY-MM-DDTHH:MM:SS', local time)
+#   - name glob: GLOB on lname (lowercased file name), index on (lname, path)
+#     is used for literal prefixes ('img_2018*'); '*.png' scans the index
+# Both secondary indexes cover path and burst_of, so date and name queries
+# never touch the table rows.
+#
+# Capture date, best source first: a date in the file name (IMG_20180609_...,
+# 2018-06-09 ...) is free and final; otherwise EXIF DateTimeOriginal; then a
+# year folder ('2018/') or the file mtime. EXIF and the displayed size (for
+# orientation filters) come from one header read per photo, done for
+# locally readable folders, time-budgeted and resumed on the next sync.
+#
+# dhash / burst_of belong to photo_bursts: frames that duplicate their
+# burst's representative (burst_of = its id) never match a filter, so
+# playlists and queries only see the representative.
+
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import photo_catalog
+import photo_paths
+
+INDEX_FILE = "/config/tvphotoframe_debug/photo_index.sqlite"
+INDEX_VERSION = 4
+EXIF_TIME_BUDGET = 10.0  # Seconds of EXIF reads per sync, the scan runs under a 60 s limit
+
+_NAME_DATE = re.compile(
+    r'(?<!\d)((?:19[89]|20[0-4])\d)[-_.]?(0[1-9]|1[0-2])[-_.]?(0[1-9]|[12]\d|3[01])'
+    r'(?:[-_ T.]?([01]\d|2[0-3])[-_.]?([0-5]\d)[-_.]?([0-5]\d))?(?!\d)')
+_YEAR_FOLDER = re.compile(r'(?:^|/)((?:19[89]|20[0-4])\d)(?:[ _-][^/]*)?/')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS photos (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    lname TEXT NOT NULL,
+    taken TEXT,
+    taken_source TEXT,
+    width INTEGER,
+    height INTEGER,
+    probed INTEGER NOT NULL DEFAULT 0,
+    dhash INTEGER,
+    burst_of INTEGER,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS photos_taken ON photos(taken, path, burst_of);
+CREATE INDEX IF NOT EXISTS photos_lname ON photos(lname, path, burst_of);
+CREATE INDEX IF NOT EXISTS photos_unprobed ON photos(id) WHERE probed = 0;
+"""
+
+def connect(path=None):
+    """Open (and create) the index database"""
+    path = path or INDEX_FILE
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5)
+    # WAL: readers (the slideshow) are not blocked while a sync writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    try:
+        version = _meta(conn, "version")
+    except sqlite3.OperationalError:
+        version = None  # new database
+    if version is not None and version != str(INDEX_VERSION):
+        # Older layout: rebuilt from the catalog on the next sync
+        conn.executescript("DROP TABLE IF EXISTS photos; DROP TABLE IF EXISTS meta;")
+    conn.executescript(_SCHEMA)
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)", (str(time.time_ns()),))
+    return conn
+
+def connect_readonly(path=None):
+    """Read-only connection for the per-tick script (no schema work), None if there is no index"""
+    path = path or INDEX_FILE
+    if not os.path.exists(path):
+        return None
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+
+def path_for(conn, photo_id):
+    """Catalog path of an index id, None if it is gone"""
+    row = conn.execute("SELECT path FROM photos WHERE id = ?", (photo_id,)).fetchone()
+    return row[0] if row else None
+
+def entry_for(conn, photo_id):
+    """(catalog path, catalog position) of an index id, None if it is gone"""
+    return conn.execute("SELECT path, position FROM photos WHERE id = ?", (photo_id,)).fetchone()
+
+def epoch(conn):
+    """Changes whenever the index is recreated (ids restart from 1), 0 if unknown"""
+    return int(_meta(conn, "epoch") or 0)
+
+def _meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def date_from_name(path):
+    """('YYYY-MM-DDTHH:MM:SS', source) guessed from the path, (None, None) if nothing fits"""
+    match = _NAME_DATE.search(path.rpartition('/')[2])
+    if match:
+        y, m, d, hh, mm, ss = match.groups()
+        return f"{y}-{m}-{d}T{hh or '00'}:{mm or '00'}:{ss or '00'}", "name"
+    match = _YEAR_FOLDER.search(path)
+    if match:
+        return f"{match.group(1)}-01-01T00:00:00", "folder"
+    return None, None
+
+def read_header(file_path):
+    """(capture date or None, width, height) from the image header
+
+    Date is EXIF DateTimeOriginal (or DateTime) as 'YYYY-MM-DDTHH:MM:SS';
+    the size is as displayed, i.e. swapped for EXIF-rotated photos.
+    """
+    from PIL import Image
+
+    with Image.open(file_path) as im:
+        width, height = im.size
+        exif = im.getexif()
+        value = exif.get_ifd(0x8769).get(36867) or exif.get(306)
+        if exif.get(274) in (5, 6, 7, 8):
+            width, height = height, width
+    return _exif_datetime(value), width, height
+
+def _exif_datetime(value):
+    if not isinstance(value, str) or len(value) < 19:
+        return None
+    date, _, clock = value.strip().partition(' ')
+    date = date.replace(':', '-')
+    if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', date) or date.startswith("0000"):
+        return None
+    return f"{date}T{clock[:8] or '00:00:00'}"
+
+def sync(catalog, db_path=None, conn=None):
+    """Bring the index in line with the catalog, returns (added, removed)
+
+    Does nothing when the index already has the catalog's generation.
+    """
+    added, removed = sync_changes(catalog, db_path, conn)
+    return len(added), len(removed)
+
+def sync_changes(catalog, db_path=None, conn=None):
+    """Like sync(), returns (new ids, removed ids) for incremental playlist updates"""
+    own = conn is None
+    conn = conn or connect(db_path)
+    try:
+        generation = str(photo_catalog.catalog_generation(catalog))
+        if _meta(conn, "generation") == generation and _meta(conn, "version") == str(INDEX_VERSION):
+            return [], []
+
+        files = catalog.get("files", [])
+        wanted = set(files)
+        existing = dict(conn.execute("SELECT path, id FROM photos"))
+        removed = [photo_id for path, photo_id in existing.items() if path not in wanted]
+        added = [path for path in files if path not in existing]
+
+        with conn:
+            conn.executemany("DELETE FROM photos WHERE id = ?", ((i,) for i in removed))
+            # New rows get ids above every existing one (rowid = max + 1)
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM photos").fetchone()[0]
+            rows = []
+            for path in added:
+                taken, source = date_from_name(path)
+                rows.append((path, path.rpartition('/')[2].lower(), taken, source))
+            conn.executemany(
+                "INSERT OR IGNORE INTO photos (path, lname, taken, taken_source) VALUES (?, ?, ?, ?)",
+                rows)
+            # Every new generation may reorder the list
+            conn.executemany("UPDATE photos SET position = ? WHERE path = ?", enumerate(files))
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("generation", generation),
+                ("version", str(INDEX_VERSION)),
+                ("scan_folder", catalog.get("scan_folder") or ""),
+            ])
+        # Planner statistics, so combined filters pick the narrower index
+        conn.execute("PRAGMA optimize" if existing else "ANALYZE")
+        new_ids = [i for (i,) in conn.execute("SELECT id FROM photos WHERE id > ?", (last_id,))]
+        return new_ids, removed
+    finally:
+        if own:
+            conn.close()
+
+def probe_headers(root, db_path=None, time_budget=None, conn=None, share_paths=None):
+    """Read image headers under root until the budget runs out, returns (probed ids, left)
+
+    Fills EXIF capture dates (file name dates are kept) and the displayed
+    size. time_budget 0 skips the header reads and settles every pending
+    photo from its name, folder or mtime. share_paths maps NFC catalog
+    paths to exact on-share names (photo_paths).
+    """
+    own = conn is None
+    conn = conn or connect(db_path)
+    budget = EXIF_TIME_BUDGET if time_budget is None else time_budget
+    started = time.monotonic()
+    probed = []
+    try:
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print("⚠️ Pillow is not installed, capture dates come from names and mtime only")
+            budget = 0
+
+        pending = conn.execute(
+            "SELECT id, path, taken, taken_source FROM photos WHERE probed = 0 ORDER BY id").fetchall()
+        updates = []
+        for row_id, path, taken, source in pending:
+            if budget and time.monotonic() - started > budget:
+                break
+            encoded = share_paths.get(path) if share_paths else None
+            file_path = os.path.join(root, photo_paths.decode_exact(encoded) if encoded else path)
+            date = width = height = None
+            if budget:
+                try:
+                    date, width, height = read_header(file_path)
+                except Exception:
+                    pass
+            if date and source != "name":
+                taken, source = date, "exif"
+            elif not taken:
+                try:
+                    taken = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.stat(file_path).st_mtime))
+                    source = "mtime"
+                except OSError:
+                    pass
+            updates.append((taken, source, width, height, row_id))
+            probed.append(row_id)
+            if len(updates) >= 500:
+                _save_probes(conn, updates)
+                updates = []
+        if updates:
+            _save_probes(conn, updates)
+        return probed, len(pending) - len(probed)
+    finally:
+        if own:
+            conn.close()
+
+def _save_probes(conn, updates):
+    with conn:
+        conn.executemany(
+            "UPDATE photos SET taken = ?, taken_source = ?, width = ?, height = ?, probed = 1 WHERE id = ?",
+            updates)
+
+def update(catalog, root=None, db_path=None, time_budget=None):
+    """Sync with the catalog, then read headers if root is readable; returns a summary dict
+
+    new_ids / removed_ids / probed_ids are what changed, for photo_playlists.
+    """
+    conn = connect(db_path)
+    try:
+        new_ids, removed_ids = sync_changes(catalog, conn=conn)
+        probed_ids, left = [], 0
+        if root and os.path.isdir(root):
+            probed_ids, left = probe_headers(root, time_budget=time_budget, conn=conn,
+                                             share_paths=catalog.get("share_paths"))
+        return {"added": len(new_ids), "removed": len(removed_ids), "dated": len(probed_ids), "undated": left,
+                "new_ids": new_ids, "removed_ids": removed_ids, "probed_ids": probed_ids}
+    finally:
+        conn.close()
+
+def _prefix_end(prefix):
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+ORIENTATIONS = {
+    "landscape": "width > height",
+    "portrait": "height > width",
+    "square": "width = height",
+}
+
+def build_query(folder=None, date_from=None, date_to=None, name=None, orientation=None):
+    """WHERE clause and parameters for the filters (all optional, combined with AND)
+
+    orientation (landscape/portrait/square) only matches photos whose
+    header has been read, see probe_headers().
+    """
+    where, params = ["burst_of IS NULL"], []
+    if folder:
+        # Paths are stored NFC-normalized (photo_paths), so are the filters
+        prefix = photo_paths.normalize(folder) + '/'
+        where.append("path >= ? AND path < ?")
+        params += [prefix, _prefix_end(prefix)]
+    if date_from:
+        where.append("taken >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("taken <= ?")
+        # A date alone includes the whole day
+        params.append(f"{date_to}T23:59:59" if len(date_to) == 10 else date_to)
+    if name:
+        where.append("lname GLOB ?")
+        params.append(photo_paths.normalize(name).lower())
+    if orientation:
+        if orientation not in ORIENTATIONS:
+            raise ValueError(f"unknown orientation {orientation!r}, expected one of {', '.join(ORIENTATIONS)}")
+        where.append(ORIENTATIONS[orientation])
+    return " WHERE " + " AND ".join(where), params
+
+def query(folder=None, date_from=None, date_to=None, name=None, limit=None, db_path=None, conn=None,
+          orientation=None):
+    """Catalog paths matching the filters
+
+    Order is whatever index answered the query (callers shuffle anyway);
+    sorting would turn a LIMIT query into a full sort of the matches.
+    """
+    own = conn is None
+    conn = conn or connect(db_path)
+    try:
+        where, params = build_query(folder, date_from, date_to, name, orientation)
+        sql = f"SELECT path FROM photos{where}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [path for (path,) in conn.execute(sql, params)]
+    finally:
+        if own:
+            conn.close()
+
+def count(folder=None, date_from=None, date_to=None, name=None, db_path=None, conn=None, orientation=None):
+    """Number of catalog photos matching the filters"""
+    own = conn is None
+    conn = conn or connect(db_path)
+    try:
+        where, params = build_query(folder, date_from, date_to, name, orientation)
+        return conn.execute(f"SELECT COUNT(*) FROM photos{where}", params).fetchone()[0]
+    finally:
+        if own:
+            conn.close()
+
+def match_ids(conn, filters, ids=None):
+    """Index ids matching filters (dict of build_query arguments), restricted to ids if given"""
+    where, params = build_query(**filters)
+    sql = f"SELECT id FROM photos{where}"
+    if ids is None:
+        return [i for (i,) in conn.execute(sql, params)]
+    ids = list(ids)
+    matched = []
+    # Stay well below SQLite's bound parameter limit
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        chunk_sql = f"{sql} AND id IN ({','.join('?' * len(chunk))})"
+        matched.extend(i for (i,) in conn.execute(chunk_sql, params + chunk))
+    return matched
+
+def paths_for(conn, ids):
+    """Catalog paths of index ids, in the order of ids (ids that are gone are skipped)"""
+    ids = list(ids)
+    found = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        found.update(conn.execute(f"SELECT id, path FROM photos WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+    return [found[i] for i in ids if i in found]
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the photo catalog index")
+    parser.add_argument("--folder", help="folder prefix, relative to the scan folder")
+    parser.add_argument("--from", dest="date_from", help="capture date from (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="capture date to, inclusive (YYYY-MM-DD)")
+    parser.add_argument("--name", help="file name glob, case-insensitive (img_2018*)")
+    parser.add_argument("--orientation", choices=sorted(ORIENTATIONS))
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--count", action="store_true", help="print only the number of matches")
+    parser.add_argument("--sync", action="store_true", help="sync with the catalog first")
+    args = parser.parse_args()
+
+    if args.sync:
+        catalog = photo_catalog.read_catalog()
+        if not catalog:
+            print("❌ No catalog, run the photo scan first")
+            raise SystemExit(1)
+        print(f"🗂️ Index: {sync(catalog)}")
+
+    start = time.perf_counter()
+    if args.count:
+        result = count(args.folder, args.date_from, args.date_to, args.name, orientation=args.orientation)
+        print(result)
+    else:
+        result = query(args.folder, args.date_from, args.date_to, args.name, args.limit, orientation=args.orientation)
+        for path in result:
+            print(path)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"⏱️ {elapsed:.2f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
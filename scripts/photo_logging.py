@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# scripts/photo_logging.py
+# Background, size-rotated log writer for the photo frame scripts
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_DIR = "/config/tvphotoframe_debug"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_MAX_BYTES = 1024 * 1024  # Rotate after 1 MB
+LOG_BACKUP_COUNT = 3         # Keep scan_photos.log.1 .. .3
+
+# Level per log file; override with TVPHOTOFRAME_LOG_LEVEL_<NAME>=DEBUG
+# (e.g. TVPHOTOFRAME_LOG_LEVEL_GET_NEXT_PHOTO) or TVPHOTOFRAME_LOG_LEVEL for all
+LOG_LEVELS = {
+    "scan_photos": "INFO",
+    "get_next_photo": "WARNING",  # Runs every few seconds, keep only problems
+}
+DEFAULT_LOG_LEVEL = "INFO"
+
+_listeners = {}
+
+def get_log_level(name):
+    """Resolve log level for a log file name"""
+    level = (os.environ.get(f"TVPHOTOFRAME_LOG_LEVEL_{name.upper()}")
+             or os.environ.get("TVPHOTOFRAME_LOG_LEVEL")
+             or LOG_LEVELS.get(name, DEFAULT_LOG_LEVEL))
+    return getattr(logging, level.upper(), logging.INFO)
+
+def setup_logging(name, log_dir=None):
+    """Return logger writing to <log_dir>/<name>.log through a background thread
+
+    Records are put on a queue by the caller and written by a QueueListener,
+    so a slow disk never blocks the script. The file is rotated by size.
+    """
+    logger = logging.getLogger(f"tvphotoframe.{name}")
+    if name in _listeners:
+        return logger
+
+    log_dir = log_dir or LOG_DIR
+    level = get_log_level(name)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, f"{name}.log"),
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding='utf-8'
+        )
+    except OSError as e:
+        print(f"⚠️ File logging disabled: {e}")
+        logger.addHandler(logging.NullHandler())
+        return logger
+
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler.setLevel(level)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    # Flush pending records on exit (including exit(1) paths)
+    atexit.register(stop_logging, name)
+    return logger
+
+def stop_logging(name):
+    """Stop background writer and flush queued records"""
+    listener = _listeners.pop(name, None)
+    if listener:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
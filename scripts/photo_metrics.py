@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# scripts/photo_metrics.py
+# Timing spans for photo frame scripts, exported as HA sensors and Prometheus text
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Served by Home Assistant as /local/tvphotoframe/metrics.prom
+METRICS_DIR = "/config/www/tvphotoframe"
+
+# span name -> [total seconds, count]
+_spans = {}
+
+@contextmanager
+def span(name):
+    """Time a block of code and record it under name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def record(name, seconds):
+    """Add one measurement to a span"""
+    entry = _spans.get(name)
+    if entry is None:
+        _spans[name] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+def get_spans():
+    """Return {span: seconds} for everything recorded in this process"""
+    return {name: entry[0] for name, entry in _spans.items()}
+
+def reset():
+    """Forget all recorded spans"""
+    _spans.clear()
+
+# metric name -> (type, help)
+PROMETHEUS_METRICS = {
+    "tvphotoframe_span_seconds": ("gauge", "Time spent in a photo frame phase during the last run"),
+    "tvphotoframe_span_count": ("gauge", "Number of measurements in a phase during the last run"),
+    "tvphotoframe_last_run_timestamp_seconds": ("gauge", "Unix time of the last exported run"),
+}
+
+def format_samples(scope):
+    """Format recorded spans as Prometheus sample lines (no headers)"""
+    lines = []
+    for name, (seconds, count) in sorted(_spans.items()):
+        lines.append(f'tvphotoframe_span_seconds{{scope="{scope}",span="{name}"}} {seconds:.6f}')
+        lines.append(f'tvphotoframe_span_count{{scope="{scope}",span="{name}"}} {count}')
+    lines.append(f'tvphotoframe_last_run_timestamp_seconds{{scope="{scope}"}} {time.time():.3f}')
+    return "\n".join(lines) + "\n"
+
+def format_prometheus(sample_lines):
+    """Group sample lines by metric and add HELP/TYPE headers"""
+    families = {}
+    for line in sample_lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            families.setdefault(line.split('{', 1)[0].split(' ', 1)[0], []).append(line)
+
+    out = []
+    for metric in sorted(families):
+        metric_type, help_text = PROMETHEUS_METRICS.get(metric, ("untyped", metric))
+        out.append(f"# HELP {metric} {help_text}")
+        out.append(f"# TYPE {metric} {metric_type}")
+        out.extend(families[metric])
+    return "\n".join(out) + "\n"
+
+def write_prometheus(scope, metrics_dir=None):
+    """Write samples_<scope>.prom and rebuild the combined metrics.prom"""
+    metrics_dir = metrics_dir or METRICS_DIR
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        _write_text(os.path.join(metrics_dir, f"samples_{scope}.prom"), format_samples(scope))
+
+        # Combined file is what a scraper reads
+        sample_lines = []
+        for name in sorted(os.listdir(metrics_dir)):
+            if name.startswith("samples_") and name.endswith(".prom"):
+                with open(os.path.join(metrics_dir, name), 'r', encoding='utf-8') as f:
+                    sample_lines.extend(f)
+        _write_text(os.path.join(metrics_dir, "metrics.prom"), format_prometheus(sample_lines))
+        return True
+    except OSError as e:
+        print(f"⚠️ Could not write metrics: {e}")
+        return False
+
+def ha_sensor_payload(scope):
+    """Build HA state payload with one attribute per span in milliseconds"""
+    spans = get_spans()
+    attributes = {f"{name}_ms": round(seconds * 1000, 1) for name, seconds in spans.items()}
+    attributes.update({
+        "unit_of_measurement": "ms",
+        "friendly_name": f"TV Photo Frame {scope} timing",
+        "last_updated": datetime.now().isoformat(),
+    })
+    return {
+        "state": round(sum(spans.values()) * 1000, 1),
+        "attributes": attributes
+    }
+
+def publish_to_ha(scope, ha_url, token, timeout=5):
+    """Export spans as sensor.tvphotoframe_<scope>_timing"""
+    import photo_ha
+
+    try:
+        status = photo_ha.post(ha_url, f"/api/states/sensor.tvphotoframe_{scope}_timing",
+                               token, ha_sensor_payload(scope), timeout=timeout)
+        return status in [200, 201]
+    except Exception as e:
+        print(f"⚠️ Could not publish {scope} timing: {e}")
+        return False
+
+def _write_text(path, text):
+    """Replace file contents without exposing a half-written file"""
+    # Per-process temp name: a scan and a slide tick may write at the same time
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# scripts/photo_mount.py
+# Persistent read-only CIFS mounts for network photo folders
+#
+# A share is mounted once under MOUNT_BASE and left mounted between runs, so
+# the local scandir walker, EXIF reads and thumbnails work on SMB folders
+# without an smbclient process per operation. Every use health-checks the
+# mount (statvfs + listdir with a timeout) and remounts a stale one. The
+# mount option that worked last time is remembered in MOUNT_STATE_FILE and
+# tried first, so a remount does not walk the whole fallback list again.
+# When mounting is impossible (no CAP_SYS_ADMIN in the container, no cifs
+# module) that is remembered too, and callers fall back to smbclient.
+#
+# Testing without a NAS: point TVPHOTOFRAME_MOUNT_BASE at a scratch folder
+# and mount anything at <base>/<server>_<share> yourself (a tmpfs with a few
+# photos, or a loopback share: mount -t cifs //127.0.0.1/photos ...). An
+# existing healthy mount is reused as is.
+
+import json
+import os
+import threading
+import time
+
+import photo_catalog
+
+MOUNT_BASE = os.environ.get("TVPHOTOFRAME_MOUNT_BASE", "/tmp/smb_mounts")
+MOUNT_STATE_FILE = "/config/tvphotoframe_debug/mount_state.json"
+HEALTH_TIMEOUT = 5.0   # Seconds before a hanging mount counts as stale
+MOUNT_TIMEOUT = 15    # Per option, capped by the caller's deadline (the scan runs under a 60 s limit)
+MOUNT_RETRY_SECONDS = 3600  # After every option failed, don't try mounting again for this long
+
+# SMB 1.0 specific options, in order of preference. Every one of them is
+# read-only: the mount stays up between runs and we only need to read photos
+GUEST_OPTIONS = [
+    # Read-only mount
+    "guest,vers=1.0,ro,uid=root,gid=root,iocharset=utf8,noperm",
+    # Read-only with different security
+    "guest,vers=1.0,ro,sec=ntlm,uid=root,gid=root,iocharset=utf8",
+    # Read-only basic
+    "guest,vers=1.0,ro,uid=root,gid=root",
+    # Legacy read-only
+    "guest,ro,sec=ntlm,uid=root,gid=root,iocharset=utf8",
+    # Read-only without version
+    "guest,ro,uid=root,gid=root,iocharset=utf8",
+    # Read-only with explicit file modes
+    "guest,vers=1.0,ro,uid=root,gid=root,iocharset=utf8,file_mode=0444,dir_mode=0555",
+    # Minimal options
+    "guest,ro,uid=root,gid=root"
+]
+
+AUTH_OPTIONS = [
+    "username={username},password={password},vers=1.0,ro,uid=root,gid=root,iocharset=utf8",
+    "username={username},password={password},vers=1.0,ro,sec=ntlm,uid=root,gid=root",
+    "username={username},password={password},ro,sec=ntlm,uid=root,gid=root,iocharset=utf8",
+    "username={username},password={password},vers=1.0,ro,uid=root,gid=root,file_mode=0444"
+]
+
+def parse_network_path(path):
+    """Parse Windows network path to get server and share"""
+    # Convert \\server\share\folder to //server/share and /folder
+    if path.startswith('\\\\'):
+        # Windows UNC path
+        path_clean = path.replace('\\\\', '').replace('\\', '/')
+        parts = path_clean.split('/')
+        if len(parts) >= 2:
+            server = parts[0]
+            share = parts[1]
+            subfolder = '/'.join(parts[2:]) if len(parts) > 2 else ''
+            return server, share, subfolder
+    elif path.startswith('//'):
+        # Unix SMB path
+        path_clean = path[2:]  # Remove //
+        parts = path_clean.split('/')
+        if len(parts) >= 2:
+            server = parts[0]
+            share = parts[1]
+            subfolder = '/'.join(parts[2:]) if len(parts) > 2 else ''
+            return server, share, subfolder
+
+    return None, None, None
+
+def mount_point_for(server, share):
+    return os.path.join(MOUNT_BASE, f"{server}_{share}")
+
+def mount_options(username=None, password=None):
+    """Option strings to try, authenticated ones first when credentials are set"""
+    options = list(GUEST_OPTIONS)
+    if username and password:
+        options = [o.format(username=username, password=password) for o in AUTH_OPTIONS] + options
+    return options
+
+def _load_state():
+    try:
+        with open(MOUNT_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _remember(key, **entry):
+    state = _load_state()
+    if state.get(key) == entry:
+        return
+    state[key] = entry
+    try:
+        photo_catalog.write_json_atomic(MOUNT_STATE_FILE, state)
+    except OSError as e:
+        print(f"⚠️ Could not save mount state: {e}")
+
+def _in_thread(check, timeout, name):
+    """Run check(result) in a daemon thread, False if it is still hanging after timeout"""
+    result = {}
+
+    def run():
+        try:
+            check(result)
+        except OSError as e:
+            result["error"] = e
+
+    worker = threading.Thread(target=run, name=name, daemon=True)
+    worker.start()
+    worker.join(timeout or HEALTH_TIMEOUT)
+    return not worker.is_alive(), result
+
+def _is_mount(mount_point, timeout=None):
+    """os.path.ismount with a timeout (it stats the share root), None if it hangs"""
+    def check(result):
+        result["mounted"] = os.path.ismount(mount_point)
+
+    answered, result = _in_thread(check, timeout, "mount-probe")
+    if not answered:
+        print(f"⚠️ Mount {mount_point} not answering after {timeout or HEALTH_TIMEOUT:.0f}s")
+        return None
+    return result.get("mounted", False)
+
+def is_healthy(mount_point, timeout=None):
+    """statvfs + listdir in a helper thread: a dead server makes CIFS calls hang"""
+    def check(result):
+        os.statvfs(mount_point)
+        os.listdir(mount_point)
+        result["ok"] = True
+
+    answered, result = _in_thread(check, timeout, "mount-health")
+    if not answered:
+        print(f"⚠️ Mount {mount_point} not answering after {timeout or HEALTH_TIMEOUT:.0f}s")
+        return False
+    if "error" in result:
+        print(f"⚠️ Mount {mount_point} unhealthy: {result['error']}")
+    return result.get("ok", False)
+
+def is_read_only(mount_point):
+    """True if the mount is read-only (call after is_healthy, statvfs can hang on a dead server)"""
+    try:
+        return bool(os.statvfs(mount_point).f_flag & os.ST_RDONLY)
+    except OSError:
+        return False
+
+def unmount(mount_point, lazy=False):
+    """Unmount, lazy detaches a hanging mount without waiting for the server"""
+    import subprocess
+
+    try:
+        mounted = _is_mount(mount_point)
+        # A hanging mount can only be detached lazily
+        if mounted or (mounted is None and lazy):
+            cmd = ["umount", "-l", mount_point] if lazy else ["umount", mount_point]
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+            if result.returncode == 0:
+                print(f"🔓 Unmounted: {mount_point}")
+            else:
+                print(f"⚠️ Unmount warning: {result.stderr}")
+    except Exception as e:
+        print(f"⚠️ Unmount error: {e}")
+
+def ensure_mount(server, share, username=None, password=None, deadline=None):
+    """Mount point of a healthy read-only mount of //server/share, None if it can't be mounted
+
+    deadline: time.monotonic() value after which no further mount option
+    is tried (each attempt is cut to the time left).
+    """
+    import subprocess
+
+    mount_point = mount_point_for(server, share)
+    mounted = _is_mount(mount_point)
+    if mounted is None:
+        print(f"🔄 Remounting stale share: {mount_point}")
+        unmount(mount_point, lazy=True)
+    elif mounted:
+        if is_healthy(mount_point):
+            if is_read_only(mount_point):
+                print(f"✅ SMB share already mounted: {mount_point}")
+                return mount_point
+            # Left read-write by an older option list
+            print(f"🔄 Remounting read-write share read-only: {mount_point}")
+            unmount(mount_point, lazy=True)
+        else:
+            print(f"🔄 Remounting stale share: {mount_point}")
+            unmount(mount_point, lazy=True)
+
+    try:
+        os.makedirs(mount_point, exist_ok=True)
+    except OSError as e:
+        print(f"❌ Cannot create mount point {mount_point}: {e}")
+        return None
+
+    smb_path = f"//{server}/{share}"
+    key = f"{server}/{share}"
+    remembered = _load_state().get(key, {})
+    if time.time() - remembered.get("failed_at", 0) < MOUNT_RETRY_SECONDS:
+        print(f"ℹ️ Mounting {smb_path} failed recently, not retrying yet")
+        return None
+
+    options = mount_options(username, password)
+    order = list(range(len(options)))
+    remembered = remembered.get("option")
+    if isinstance(remembered, int) and 0 <= remembered < len(options):
+        order.remove(remembered)
+        order.insert(0, remembered)
+
+    print(f"🔧 Mounting SMB share (read-only): {smb_path} -> {mount_point}")
+    for tried, i in enumerate(order):
+        timeout = MOUNT_TIMEOUT
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout < 1:
+                print(f"⏱️ Mount time budget used up, {len(order) - tried} option(s) not tried")
+                break
+        access_type = "authenticated" if username and password and i < len(AUTH_OPTIONS) else "guest"
+        print(f"🔄 Trying {access_type} mount (option {i + 1})...")
+        try:
+            result = subprocess.run(["mount", "-t", "cifs", smb_path, mount_point, "-o", options[i]],
+                                    capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"   ❌ Timeout ({timeout:.0f}s) - server may be slow")
+            continue
+        except Exception as e:
+            print(f"   ❌ Error: {e}")
+            continue
+
+        if result.returncode != 0:
+            error = result.stderr.strip()
+            print(f"   ❌ Failed: {error}")
+            if "only root" in error or "Operation not permitted" in error or "unknown filesystem type" in error:
+                break  # no option can help
+            continue
+        if not is_healthy(mount_point):
+            unmount(mount_point, lazy=True)
+            continue
+
+        print(f"✅ Mounted with option {i + 1}: {mount_point}")
+        _remember(key, option=i)
+        return mount_point
+
+    print(f"❌ All mount attempts failed for {smb_path}")
+    _remember(key, option=remembered, failed_at=time.time())
+    return None
+
+def mounted_path(path):
+    """Local path of a share path if the share is mounted already (no mounting, no health check)"""
+    server, share, rel = parse_network_path(path)
+    if not (server and share):
+        return path
+    mount_point = mount_point_for(server, share)
+    if not _is_mount(mount_point):
+        return None
+    return os.path.join(mount_point, rel) if rel else mount_point
+
+def resolve_local_path(folder_path, username=None, password=None):
+    """Local directory for a photo folder: itself, or inside the share mount; None if unavailable"""
+    server, share, subfolder = parse_network_path(folder_path)
+    if not (server and share):
+        return folder_path if os.path.isdir(folder_path) else None
+
+    mount_point = ensure_mount(server, share, username, password)
+    if not mount_point:
+        return None
+    local = os.path.join(mount_point, subfolder) if subfolder else mount_point
+    return local if os.path.isdir(local) else None
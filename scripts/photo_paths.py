@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# scripts/photo_paths.py
+# Normalized photo paths: NFC keys, exact on-share names, media URLs
+#
+# The same photo can reach us as different strings: macOS clients store
+# NFD names ("Изображение" with combining marks), old Windows shares hold
+# cp1251 bytes that Python sees as surrogate escapes, smbclient and the
+# local mount may disagree. The catalog therefore keys every photo by its
+# NFC relative path (history, favorites, index and playlists all use it)
+# and keeps the exact on-share byte form only where it differs, in
+# catalog["share_paths"] as percent-encoded bytes (JSON-safe, reversible).
+# A catalog of ordinary names carries no extra data.
+#
+# Per tick a photo costs one dict lookup for its exact form and one
+# quote() for the media_content_id URL.
+
+import os
+import unicodedata
+from urllib.parse import quote, unquote_to_bytes
+
+# Tried in order for names that are not valid UTF-8
+FALLBACK_ENCODINGS = ("utf-8", "cp1251", "latin-1")
+
+def normalize(path):
+    """NFC relative path with '/' separators; undecodable bytes are decoded by FALLBACK_ENCODINGS"""
+    path = path.replace('\\', '/').strip('/')
+    try:
+        path.encode('utf-8')
+    except UnicodeEncodeError:
+        raw = os.fsencode(path)
+        for encoding in FALLBACK_ENCODINGS:
+            try:
+                path = raw.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+    if path.isascii():
+        return path
+    return unicodedata.normalize('NFC', path)
+
+def encode_exact(path):
+    """Percent-encoded bytes of the on-share form"""
+    return quote(os.fsencode(path), safe="/")
+
+def decode_exact(encoded):
+    """On-share form (str for os.* calls) from encode_exact()"""
+    return os.fsdecode(unquote_to_bytes(encoded))
+
+def index_paths(paths):
+    """Returns (NFC paths, {NFC path: encoded exact form}) for a raw path list
+
+    Names that only differ in normalization are the same photo for the
+    slideshow; the first one listed is kept.
+    """
+    files, share_paths, seen = [], {}, set()
+    for raw in paths:
+        key = normalize(raw)
+        if key in seen:
+            continue
+        seen.add(key)
+        files.append(key)
+        if key != raw:
+            share_paths[key] = encode_exact(raw.replace('\\', '/').strip('/'))
+    return files, share_paths
+
+def share_path(catalog, rel):
+    """Exact on-share relative path of a catalog entry"""
+    encoded = (catalog.get("share_paths") or {}).get(rel)
+    return decode_exact(encoded) if encoded else rel
+
+def join(folder, rel):
+    """folder + '/' + rel without doubled or missing separators"""
+    if not folder:
+        return rel
+    return f"{folder.rstrip('/')}/{rel.lstrip('/')}"
+
+def media_url(path):
+    """URL-encoded form of a path for media_content_id (bytes as they are on the share)"""
+    return quote(os.fsencode(path), safe="/:")
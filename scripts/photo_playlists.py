@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# scripts/photo_playlists.py
+# Named playlists materialized at scan time, with their own shuffle cursor
+#
+# Playlists are defined in /config/tvphotoframe_playlists.json:
+# {
+#   "2018 holidays": {"folder": "2018 holidays"},
+#   "Summer 2019":   {"from": "2019-06-01", "to": "2019-08-31"},
+#   "Family":        {"folder": "0001photoframe/family", "orientation": "landscape"},
+#   "2016":          {"year": 2016, "name": "img_*"}
+# }
+# Filters are the photo_index ones (folder prefix, capture date range, name
+# glob, orientation). After every scan or catalog change refresh() turns
+# each playlist into a state file (photo_state layout) holding the shuffled
+# photo_index ids and a cursor. Changes are applied incrementally: removed
+# photos drop out, new or re-probed photos are matched against the filters
+# and inserted into the part that has not been shown yet. Only a changed
+# definition or a recreated index (new epoch, ids restarted) rebuilds a
+# playlist from scratch.
+#
+# The per-tick path (get_next_photo.py --playlist NAME) maps the file,
+# takes the id under the cursor and looks its path and catalog position up
+# by primary key, so no filter is evaluated and the catalog list is not
+# searched while the slideshow runs. The playlist is picked
+# with input_select.tvphotoframe_playlist; refresh() returns the option list.
+
+import json
+import os
+import random
+import re
+import struct
+import zlib
+
+import photo_state
+
+PLAYLISTS_CONFIG = "/config/tvphotoframe_playlists.json"
+PLAYLISTS_DIR = "/config/tvphotoframe_debug/playlists"
+ALL_PHOTOS = "All photos"
+
+# magic, format version, dirty flag, photo count, definition signature, cursor, completed rounds
+_HEADER = struct.Struct('<8sIIQqQQ')
+_MAGIC = b"TVPFPLS1"
+_FORMAT_VERSION = 1
+
+def load_config(path=None):
+    """Playlist definitions {name: filters}, {} if there is no config"""
+    try:
+        with open(path or PLAYLISTS_CONFIG, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read playlists config: {e}")
+        return {}
+    return {name: spec for name, spec in config.items() if isinstance(spec, dict) and name != ALL_PHOTOS}
+
+def index_filters(spec):
+    """photo_index.build_query arguments for a playlist definition"""
+    date_from, date_to = spec.get("from"), spec.get("to")
+    if spec.get("year"):
+        date_from = date_from or f"{int(spec['year'])}-01-01"
+        date_to = date_to or f"{int(spec['year'])}-12-31"
+    return {
+        "folder": spec.get("folder"),
+        "date_from": date_from,
+        "date_to": date_to,
+        "name": spec.get("name"),
+        "orientation": spec.get("orientation"),
+    }
+
+def signature(spec, epoch=0):
+    """Changes whenever the definition or the index epoch (photo_index.epoch) changes"""
+    return zlib.crc32(json.dumps(spec, sort_keys=True).encode('utf-8')) ^ epoch
+
+def playlist_path(name, playlists_dir=None):
+    slug = re.sub(r'[^0-9A-Za-z]+', '_', name).strip('_').lower()[:40] or "playlist"
+    return os.path.join(playlists_dir or PLAYLISTS_DIR, f"{slug}_{zlib.crc32(name.encode('utf-8')):08x}.bin")
+
+class Playlist:
+    """Memory-mapped shuffled id array + cursor of one playlist"""
+
+    def __init__(self, path, mm):
+        self.path = path
+        self.mm = mm
+        (magic, version, self.dirty, self.n, self.signature,
+         self.cursor, self.rounds) = _HEADER.unpack_from(mm, 0)
+        (self.ids,) = photo_state.map_sections(mm, [('q', self.n)])
+
+    @classmethod
+    def open(cls, name, playlists_dir=None):
+        """Map an existing playlist, None if it was never materialized"""
+        path = playlist_path(name, playlists_dir)
+        mm = photo_state.open_mapped(path)
+        if mm is None:
+            return None
+        magic, version, dirty, n, sig, cursor, rounds = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION or len(mm) != photo_state.mapped_size([('q', n)]):
+            mm.close()
+            return None
+        return cls(path, mm)
+
+    @classmethod
+    def write(cls, path, ids, sig, cursor=0, rounds=0):
+        """Create the playlist file atomically and map it"""
+        from array import array
+
+        ids = array('q', ids)
+        cursor = min(cursor, len(ids)) if ids else 0
+        header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, 0, len(ids), sig, cursor, rounds)
+        return cls(path, photo_state.create_mapped(path, header, [ids.tobytes()]))
+
+    def _write_header(self, dirty):
+        _HEADER.pack_into(self.mm, 0, _MAGIC, _FORMAT_VERSION, dirty, self.n,
+                          self.signature, self.cursor, self.rounds)
+
+    def next_id(self, rng=random):
+        """Id under the cursor, advances it; reshuffles in place after a full round"""
+        if not self.n:
+            return None
+        with photo_state.locked(self.path):
+            self._write_header(1)
+            if self.cursor >= self.n:
+                self.cursor = 0
+            photo_id = self.ids[self.cursor]
+            self.cursor += 1
+            if self.cursor >= self.n:
+                ids = self.ids
+                for i in range(self.n - 1, 0, -1):
+                    j = rng.randrange(i + 1)
+                    ids[i], ids[j] = ids[j], ids[i]
+                self.cursor = 0
+                self.rounds += 1
+            self._write_header(0)
+        return photo_id
+
+    def close(self):
+        self.ids.release()
+        self.mm.close()
+
+def materialize(conn, name, spec, playlists_dir=None, rng=random):
+    """Build a playlist from scratch, returns its size"""
+    import photo_index
+
+    ids = photo_index.match_ids(conn, index_filters(spec))
+    rng.shuffle(ids)
+    Playlist.write(playlist_path(name, playlists_dir), ids, signature(spec, photo_index.epoch(conn))).close()
+    return len(ids)
+
+def apply_changes(conn, playlist, spec, new_ids, removed_ids, probed_ids, rng=random):
+    """Patch one playlist, returns the new id list and cursor or None if nothing changed"""
+    import photo_index
+
+    current = list(playlist.ids)
+    candidates = set(new_ids) | set(probed_ids)
+    matching = set(photo_index.match_ids(conn, index_filters(spec), candidates)) if candidates else set()
+    drop = set(removed_ids) | (candidates - matching)
+
+    kept, cursor = [], playlist.cursor
+    for position, photo_id in enumerate(current):
+        if photo_id in drop:
+            if position < playlist.cursor:
+                cursor -= 1
+            continue
+        kept.append(photo_id)
+    added = sorted(matching - set(kept))
+    if len(kept) == len(current) and not added:
+        return None
+    for photo_id in added:
+        # Not shown yet in this round: anywhere after the cursor
+        kept.insert(rng.randint(cursor, len(kept)), photo_id)
+    return kept, cursor
+
+def refresh(summary=None, db_path=None, config_path=None, playlists_dir=None):
+    """Bring every playlist up to date with the index, returns {name: photo count}
+
+    summary is the result of photo_index.update() (new/removed/probed ids);
+    without it every playlist is rebuilt.
+    """
+    import photo_index
+
+    playlists_dir = playlists_dir or PLAYLISTS_DIR
+    config = load_config(config_path)
+    counts = {}
+    conn = photo_index.connect(db_path)
+    try:
+        # Stored ids are only valid for the index epoch they were taken from
+        epoch = photo_index.epoch(conn)
+        for name, spec in config.items():
+            try:
+                playlist = Playlist.open(name, playlists_dir)
+                if (summary is None or playlist is None or playlist.dirty
+                        or playlist.signature != signature(spec, epoch)):
+                    if playlist:
+                        playlist.close()
+                    counts[name] = materialize(conn, name, spec, playlists_dir)
+                    continue
+                try:
+                    changed = apply_changes(conn, playlist, spec, summary.get("new_ids", ()),
+                                            summary.get("removed_ids", ()), summary.get("probed_ids", ()))
+                    counts[name] = playlist.n
+                    if changed is not None:
+                        ids, cursor = changed
+                        Playlist.write(playlist.path, ids, playlist.signature, cursor, playlist.rounds).close()
+                        counts[name] = len(ids)
+                finally:
+                    playlist.close()
+            except (ValueError, OSError) as e:
+                print(f"⚠️ Playlist '{name}' skipped: {e}")
+
+        # Files of playlists that are no longer defined
+        keep = {os.path.basename(playlist_path(name, playlists_dir)) for name in counts}
+        try:
+            for entry in os.listdir(playlists_dir):
+                if entry.endswith(".bin") and entry not in keep:
+                    os.unlink(os.path.join(playlists_dir, entry))
+        except OSError:
+            pass
+    finally:
+        conn.close()
+    return counts
+
+def options(counts):
+    """input_select options: all photos first, then the playlists"""
+    return [ALL_PHOTOS] + sorted(counts)
+
+def next_entry(name, playlists_dir=None, db_path=None):
+    """Next (catalog path, catalog position) of a playlist (per-tick), None if the playlist is unusable
+
+    The position belongs to the catalog generation the index was last
+    synced with; callers check it against their list.
+    """
+    import photo_index
+
+    playlist = Playlist.open(name, playlists_dir)
+    if playlist is None:
+        return None
+    conn = photo_index.connect_readonly(db_path)
+    try:
+        if conn is None:
+            return None
+        # Ids of photos deleted since the last refresh are skipped
+        for _ in range(min(playlist.n, 16)):
+            entry = photo_index.entry_for(conn, playlist.next_id())
+            if entry:
+                return entry
+        return None
+    finally:
+        playlist.close()
+        if conn is not None:
+            conn.close()
+
+def next_path(name, playlists_dir=None, db_path=None):
+    """Next catalog path of a playlist, None if the playlist is unusable"""
+    entry = next_entry(name, playlists_dir, db_path)
+    return entry[0] if entry else None
+
+def paths(name, playlists_dir=None, db_path=None):
+    """All catalog paths of a playlist (for the app's own cursors), None if unusable"""
+    import photo_index
+
+    playlist = Playlist.open(name, playlists_dir)
+    if playlist is None:
+        return None
+    try:
+        ids = list(playlist.ids)
+    finally:
+        playlist.close()
+    conn = photo_index.connect_readonly(db_path)
+    if conn is None:
+        return None
+    try:
+        return photo_index.paths_for(conn, ids)
+    finally:
+        conn.close()
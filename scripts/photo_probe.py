@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# scripts/photo_probe.py
+# Cached connectivity checks for the photo share
+#
+# Reachability is a TCP connect to the SMB ports (no ping, no smbclient),
+# and results are cached in PROBE_CACHE_FILE with a TTL per kind:
+#   reach:<server>                    -> port that accepted the connection
+#   auth:<user>@<server>/<share>#crc  -> credentials were accepted
+# Failures are cached only briefly so a NAS coming back is noticed soon.
+# The listing phase calls invalidate() when the share stops answering.
+
+import json
+import socket
+import time
+import zlib
+
+import photo_catalog
+
+PROBE_CACHE_FILE = "/config/tvphotoframe_debug/probe_cache.json"
+SMB_PORTS = (445, 139)
+CONNECT_TIMEOUT = 2.0
+REACH_TTL = 300        # Seconds a successful connect is trusted
+AUTH_TTL = 3600        # Seconds accepted credentials are trusted
+FAILURE_TTL = 30       # Seconds a failure is remembered
+
+def _load(path=None):
+    try:
+        with open(path or PROBE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save(cache, path=None):
+    try:
+        photo_catalog.write_json_atomic(path or PROBE_CACHE_FILE, cache)
+    except OSError as e:
+        print(f"⚠️ Could not save probe cache: {e}")
+
+def auth_key(server, share, username=None, password=None):
+    """Cache key for a login; changes when the credentials change"""
+    secret = zlib.crc32(f"{username or ''}\0{password or ''}".encode('utf-8'))
+    return f"auth:{username or 'guest'}@{server}/{share}#{secret:08x}"
+
+def cached(key, ttl, path=None, now=None):
+    """Cached entry for key if still fresh, else None"""
+    entry = _load(path).get(key)
+    if not entry:
+        return None
+    age = (now or time.time()) - entry.get("time", 0)
+    if age < 0 or age >= (ttl if entry.get("ok") else FAILURE_TTL):
+        return None
+    return entry
+
+def remember(key, ok, detail=None, path=None):
+    cache = _load(path)
+    now = time.time()
+    # Drop entries nobody could still use
+    cache = {k: v for k, v in cache.items() if now - v.get("time", 0) < max(REACH_TTL, AUTH_TTL)}
+    cache[key] = {"ok": bool(ok), "time": now, "detail": detail}
+    _save(cache, path)
+
+def invalidate(server, path=None):
+    """Forget everything about server (listing failed after a cached success)"""
+    cache = _load(path)
+    kept = {k: v for k, v in cache.items() if k != f"reach:{server}" and f"@{server}/" not in k}
+    if len(kept) != len(cache):
+        _save(kept, path)
+
+def tcp_connect(server, ports=None, timeout=None):
+    """First port that accepts a TCP connection, None if none does"""
+    for port in ports or SMB_PORTS:
+        try:
+            with socket.create_connection((server, port), timeout=timeout or CONNECT_TIMEOUT):
+                return port
+        except OSError:
+            continue
+    return None
+
+def check_reachable(server, path=None):
+    """Returns (reachable, port, from_cache)"""
+    key = f"reach:{server}"
+    entry = cached(key, REACH_TTL, path)
+    if entry is not None:
+        return entry["ok"], entry.get("detail"), True
+    port = tcp_connect(server)
+    remember(key, port is not None, port, path)
+    return port is not None, port, False
+
+def check_auth(server, share, username, password, login, path=None):
+    """Returns (ok, from_cache); login() performs the real check and returns bool"""
+    key = auth_key(server, share, username, password)
+    entry = cached(key, AUTH_TTL, path)
+    if entry is not None:
+        return entry["ok"], True
+    ok = bool(login())
+    remember(key, ok, None, path)
+    return ok, False
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# scripts/photo_progress.py
+# Live scan progress as sensor.tvphotoframe_scan_progress
+#
+# The walker (photo_shards.scan_sharded) reports every finished directory
+# here; the sensor is pushed at most once per PROGRESS_INTERVAL so a fast
+# local scan does not turn into a stream of HA requests. Like photo_metrics
+# the state is module level: begin() once per scan, finish() at the end
+# with the per-phase timings from photo_metrics. Nothing is published
+# until begin() has been called, so other users of the walker are not
+# affected.
+#
+# State: scanning / done / paused / failed. Attributes: phase,
+# dirs_visited, dirs_pending, files, files_per_sec, bytes_listed (size of
+# the photos listed), eta_seconds (from the previous scan's photo count,
+# else from the pending directories) and <phase>_ms when finished.
+
+import threading
+import time
+from datetime import datetime
+
+SENSOR = "sensor.tvphotoframe_scan_progress"
+PROGRESS_INTERVAL = 2.0  # Seconds between sensor updates
+PUBLISH_TIMEOUT = 2
+
+_lock = threading.Lock()
+_state = {}
+_publish = None
+
+def begin(publish, expected_files=0):
+    """Start tracking a scan; publish(payload) delivers a sensor payload"""
+    global _publish
+    with _lock:
+        _publish = publish
+        _state.clear()
+        _state.update({
+            "phase": "start",
+            "dirs_visited": 0,
+            "dirs_pending": 0,
+            "files": 0,
+            "bytes_listed": 0,
+            "expected_files": expected_files or 0,
+            "started": time.monotonic(),
+            "published": 0.0,
+        })
+    _push("scanning", force=True)
+
+def active():
+    return _publish is not None
+
+def phase(name):
+    """Switch the reported phase (probe, list, save, ...)"""
+    if _publish is None:
+        return
+    with _lock:
+        _state["phase"] = name
+    _push("scanning", force=True)
+
+def shard_done(files, nbytes=0, pending=0, dirs=1):
+    """One listing finished: files photos of nbytes, pending directories left"""
+    if _publish is None:
+        return
+    with _lock:
+        _state["dirs_visited"] += dirs
+        _state["files"] += files
+        _state["bytes_listed"] += nbytes
+        _state["dirs_pending"] = pending
+    _push("scanning")
+
+def finish(status, spans=None):
+    """Final update with the per-phase breakdown, stops tracking"""
+    global _publish
+    if _publish is None:
+        return
+    _push(status, force=True, spans=spans)
+    _publish = None
+
+def payload(status, spans=None):
+    """Sensor payload for the current progress"""
+    with _lock:
+        s = dict(_state)
+    elapsed = max(time.monotonic() - s["started"], 1e-6)
+    rate = s["files"] / elapsed
+    eta = None
+    if status == "scanning":
+        if s["expected_files"] > s["files"] and rate > 0:
+            eta = (s["expected_files"] - s["files"]) / rate
+        elif s["dirs_pending"] and s["dirs_visited"]:
+            eta = s["dirs_pending"] * elapsed / s["dirs_visited"]
+    attributes = {
+        "phase": s["phase"],
+        "dirs_visited": s["dirs_visited"],
+        "dirs_pending": s["dirs_pending"],
+        "files": s["files"],
+        "files_per_sec": round(rate, 1),
+        "bytes_listed": s["bytes_listed"],
+        "elapsed_seconds": round(elapsed, 1),
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+        "friendly_name": "TV Photo Frame scan progress",
+        "icon": "mdi:folder-search",
+        "last_updated": datetime.now().isoformat(),
+    }
+    if s["expected_files"]:
+        attributes["percent"] = min(100, round(100 * s["files"] / s["expected_files"]))
+    for name, seconds in (spans or {}).items():
+        attributes[f"{name}_ms"] = round(seconds * 1000, 1)
+    return {"state": status, "attributes": attributes}
+
+def _push(status, force=False, spans=None):
+    publish = _publish
+    now = time.monotonic()
+    with _lock:
+        if not force and now - _state.get("published", 0) < PROGRESS_INTERVAL:
+            return
+        _state["published"] = now
+    try:
+        publish(payload(status, spans))
+    except Exception as e:
+        print(f"⚠️ Could not publish scan progress: {e}")
+
+def ha_publisher(ha_url, token, timeout=None):
+    """publish() that posts the payload to SENSOR"""
+    import photo_ha
+
+    def publish(data):
+        photo_ha.post(ha_url, f"/api/states/{SENSOR}", token, data, timeout=timeout or PUBLISH_TIMEOUT)
+    return publish
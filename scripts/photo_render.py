@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# scripts/photo_render.py
+# Slide rendering with bounded memory: originals -> TV-sized JPEGs
+#
+# Usage: python3 scripts/photo_render.py [--size 1920x1080] [--max-mb 64] src dst [src dst ...]
+#
+# A decoded photo costs width * height * 4 bytes in Pillow (RGB is stored
+# as 32-bit pixels), so a 4010x2252 original is ~36 MB and a panorama can
+# be hundreds. The renderer plans every decode against a memory ceiling:
+#   - JPEGs are decoded at 1/2, 1/4 or 1/8 scale (Image.draft, DCT domain),
+#     as small as the output quality allows and smaller if the ceiling
+#     demands it; the full-size RGB buffer is never allocated
+#   - other formats can't be scaled while decoding and are refused when
+#     their full decode would not fit (RenderTooLarge) instead of
+#     letting the process grow
+#   - one output canvas is allocated per renderer and reused for every slide
+# Ceiling: TVPHOTOFRAME_RENDER_MAX_MB (default 64) or --max-mb.
+
+import os
+
+RENDER_SIZE = (1920, 1080)
+RENDER_MAX_MB = float(os.environ.get("TVPHOTOFRAME_RENDER_MAX_MB", 64))
+RENDER_QUALITY = 88
+RENDER_BACKGROUND = (0, 0, 0)
+DRAFT_SCALES = (1, 2, 4, 8)  # What libjpeg can do while decoding
+
+# Bytes per pixel of Pillow's in-memory image modes
+_MODE_BYTES = {"1": 1, "L": 1, "P": 1, "LA": 4, "RGB": 4, "RGBA": 4, "RGBX": 4,
+               "CMYK": 4, "YCbCr": 4, "I": 4, "F": 4, "I;16": 2}
+
+class RenderTooLarge(Exception):
+    """Decoding this image would exceed the memory ceiling"""
+
+def image_bytes(width, height, mode="RGB"):
+    """Memory Pillow needs for a decoded image"""
+    return width * height * _MODE_BYTES.get(mode, 4)
+
+def fit_size(width, height, box):
+    """Largest size with the image's aspect ratio that fits box"""
+    scale = min(box[0] / width, box[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def plan_draft_scale(width, height, box, budget, mode="RGB"):
+    """JPEG decode scale: as small as quality allows, smaller if budget requires
+
+    Returns the divisor (1, 2, 4 or 8). Raises RenderTooLarge if even 1/8
+    does not fit the budget.
+    """
+    fit_w, fit_h = fit_size(width, height, box)
+    # Quality: largest reduction that still decodes at least the output size
+    quality_scale = max(s for s in DRAFT_SCALES if s == 1 or (width // s >= fit_w and height // s >= fit_h))
+    for scale in DRAFT_SCALES:
+        if scale < quality_scale:
+            continue
+        if image_bytes(-(-width // scale), -(-height // scale), mode) <= budget:
+            return scale
+    raise RenderTooLarge(f"{width}x{height} needs more than {budget / 2**20:.0f} MB even at 1/8 scale")
+
+class SlideRenderer:
+    """Render photos onto a reused, letterboxed canvas of the TV resolution"""
+
+    def __init__(self, size=RENDER_SIZE, max_mb=None, background=RENDER_BACKGROUND, quality=RENDER_QUALITY):
+        self.size = tuple(size)
+        self.max_bytes = int((max_mb or RENDER_MAX_MB) * 2**20)
+        self.background = background
+        self.quality = quality
+        self.canvas = None
+
+    def decode_budget(self):
+        """Ceiling minus the canvas and the resized copy that exist next to the decode"""
+        return self.max_bytes - 2 * image_bytes(*self.size)
+
+    def load(self, src):
+        """Open and decode src within the budget, returns an RGB image of at most canvas size"""
+        from PIL import Image, ImageOps
+
+        budget = self.decode_budget()
+        im = Image.open(src)
+        try:
+            width, height = im.size
+            if im.format == "JPEG":
+                scale = plan_draft_scale(width, height, self.size, budget)
+                if scale > 1:
+                    im.draft("RGB", (-(-width // scale), -(-height // scale)))
+            elif image_bytes(width, height, im.mode) > budget:
+                raise RenderTooLarge(f"{im.format} {width}x{height} does not fit "
+                                     f"{budget / 2**20:.0f} MB and can't be decoded scaled")
+
+            im.load()
+            # Rotation is cheap here, the image is already reduced
+            rotated = ImageOps.exif_transpose(im)
+            if rotated is not im:
+                im.close()
+                im = rotated
+            if im.mode not in ("RGB", "RGBA"):
+                converted = im.convert("RGBA" if "transparency" in im.info or im.mode == "LA" else "RGB")
+                im.close()
+                im = converted
+            target = fit_size(im.width, im.height, self.size)
+            if target != im.size:
+                resized = im.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+                im.close()
+                im = resized
+            return im
+        except BaseException:
+            im.close()
+            raise
+
+    def render(self, src, dst, fmt="JPEG"):
+        """Render src to dst (progressive JPEG by default), returns the photo size on the canvas"""
+        from PIL import Image
+
+        photo = self.load(src)
+        try:
+            if self.canvas is None:
+                self.canvas = Image.new("RGB", self.size, self.background)
+            else:
+                self.canvas.paste(self.background, (0, 0) + self.size)
+            x = (self.size[0] - photo.width) // 2
+            y = (self.size[1] - photo.height) // 2
+            self.canvas.paste(photo, (x, y), photo if photo.mode == "RGBA" else None)
+            placed = photo.size
+        finally:
+            photo.close()
+
+        os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+        tmp = f"{dst}.tmp"
+        self.canvas.save(tmp, fmt, quality=self.quality, optimize=True, progressive=True)
+        os.replace(tmp, dst)
+        return placed
+
+    def close(self):
+        if self.canvas is not None:
+            self.canvas.close()
+            self.canvas = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB
+
+    VmHWM is reset by exec(); ru_maxrss would include the parent's memory
+    when started from a big process.
+    """
+    try:
+        with open("/proc/self/status", 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Render photos to TV-sized JPEGs")
+    parser.add_argument("files", nargs="+", help="src dst pairs")
+    parser.add_argument("--size", default=f"{RENDER_SIZE[0]}x{RENDER_SIZE[1]}")
+    parser.add_argument("--max-mb", type=float, default=None)
+    args = parser.parse_args()
+    if len(args.files) % 2:
+        parser.error("expected src dst pairs")
+
+    size = tuple(int(v) for v in args.size.lower().split('x'))
+    renderer = SlideRenderer(size, args.max_mb)
+    start = time.perf_counter()
+    for src, dst in zip(args.files[::2], args.files[1::2]):
+        try:
+            print(f"🖼️ {src} -> {dst} {renderer.render(src, dst)}")
+        except (RenderTooLarge, OSError) as e:
+            print(f"⚠️ {src}: {e}")
+    renderer.close()
+    print(f"⏱️ {time.perf_counter() - start:.2f}s, peak RSS {peak_rss_mb():.1f} MB "
+          f"(ceiling {renderer.max_bytes / 2**20:.0f} MB for image buffers)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# scripts/photo_scan.py
+# Fast directory scan core shared by the scan script and the AppDaemon app
+
+import os
+
+SUPPORTED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.JPG', '.JPEG', '.PNG']
+
+# Lowercased once, str.endswith() accepts the whole tuple in one call
+PHOTO_SUFFIXES = tuple(sorted({ext.lower() for ext in SUPPORTED_EXTENSIONS}))
+
+def is_photo_name(name):
+    """Check file name against supported extensions (case-insensitive)"""
+    return name.lower().endswith(PHOTO_SUFFIXES)
+
+def scan_photo_tree(scan_path, prefix=""):
+    """Recursive os.scandir walk, returns photo paths relative to scan_path
+
+    Paths are built by prefix concatenation instead of os.path.relpath and
+    always use '/' as separator. Pass prefix to get absolute paths instead.
+    Unreadable directories are skipped, symlinked directories are not followed
+    (same as os.walk defaults).
+    """
+    photos = []
+    append = photos.append
+    suffixes = PHOTO_SUFFIXES
+    stack = [(scan_path, prefix)]
+    pop = stack.pop
+    push = stack.append
+
+    while stack:
+        path, rel_prefix = pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        push((entry.path, f"{rel_prefix}{name}/"))
+                    elif name.lower().endswith(suffixes):
+                        append(rel_prefix + name)
+        except OSError:
+            continue
+
+    return photos
+
+def list_photo_dir(path, with_bytes=False):
+    """One directory level: returns (photo names, subdirectory names)
+
+    with_bytes adds the total size of the photos as a third item (one
+    stat() per photo, only for progress reporting).
+    """
+    photos = []
+    subdirs = []
+    nbytes = 0
+    suffixes = PHOTO_SUFFIXES
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(name)
+            elif name.lower().endswith(suffixes):
+                photos.append(name)
+                if with_bytes:
+                    try:
+                        nbytes += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        pass
+    if with_bytes:
+        return photos, subdirs, nbytes
+    return photos, subdirs
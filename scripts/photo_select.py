@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# scripts/photo_select.py
+# Weighted photo selection: folder quotas, favorites and recently-shown penalty
+#
+# Weights live in a Fenwick (binary indexed) tree, so a draw and a weight
+# update are O(log n). The tree is kept in a memory-mapped state file: a
+# tick maps it, draws, and patches the few changed slots in place instead
+# of rebuilding the distribution. The file is rebuilt only when the catalog
+# generation, the selection config or the set of hidden burst frames
+# (photo_bursts.py, weight 0) changes. Which photos are "recent" comes from
+# the show history (photo_history.py).
+#
+# Optional config /config/tvphotoframe_selection.json:
+# {
+#   "folder_quotas": {"family": 2.0, "burst_folder": 0.5},  # share per folder (default 1.0)
+#   "favorites": ["family/IMG_0001.jpg", "2018 holidays/"],  # files or folder prefixes
+#   "favorite_weight": 4.0,
+#   "recent_penalty": 0.02,   # weight multiplier while recently shown
+#   "recent_window": 50       # slides a photo stays penalized
+# }
+
+import json
+import os
+import random
+import struct
+
+import photo_state
+
+SELECTION_CONFIG = "/config/tvphotoframe_selection.json"
+SELECTION_STATE = "/config/tvphotoframe_debug/selection_state.bin"
+
+DEFAULT_CONFIG = {
+    "folder_quotas": {},
+    "favorites": [],
+    "favorite_weight": 4.0,
+    "recent_penalty": 0.02,
+    "recent_window": 50,
+}
+
+# magic, format version, dirty flag, photo count, catalog generation, config signature
+_HEADER = struct.Struct('<8sIIQqq')
+_MAGIC = b"TVPFSEL2"
+_FORMAT_VERSION = 2
+
+class FenwickSampler:
+    """Weighted sampler over n items backed by flat arrays of doubles
+
+    weights[i] is the current weight of item i, tree is the Fenwick tree of
+    weights stored 0-based (tree[i - 1] holds node i).
+    """
+
+    def __init__(self, weights, tree):
+        self.weights = weights
+        self.tree = tree
+        self.n = len(weights)
+        self.top = 1 << (self.n.bit_length() - 1) if self.n else 0
+
+    @staticmethod
+    def build_tree(weights, tree):
+        """Fill tree from weights in O(n)"""
+        n = len(weights)
+        for i in range(n):
+            tree[i] = weights[i]
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent - 1] += tree[i - 1]
+
+    def total(self):
+        """Sum of all weights"""
+        total = 0.0
+        i = self.n
+        tree = self.tree
+        while i > 0:
+            total += tree[i - 1]
+            i -= i & -i
+        return total
+
+    def find(self, target):
+        """Index of the item whose cumulative weight range contains target"""
+        pos = 0
+        step = self.top
+        tree = self.tree
+        n = self.n
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt - 1] <= target:
+                pos = nxt
+                target -= tree[nxt - 1]
+            step >>= 1
+        return min(pos, n - 1)
+
+    def sample(self, rng=random):
+        """Draw one index proportionally to weight, None if all weights are zero"""
+        total = self.total()
+        if self.n == 0 or total <= 0:
+            return None
+        return self.find(rng.random() * total)
+
+    def set_weight(self, index, weight):
+        """Change one weight in O(log n)"""
+        delta = weight - self.weights[index]
+        if not delta:
+            return
+        self.weights[index] = weight
+        i = index + 1
+        tree = self.tree
+        n = self.n
+        while i <= n:
+            tree[i - 1] += delta
+            i += i & -i
+
+def load_selection_config(path=None):
+    """Return (config, signature); signature changes when the file changes"""
+    path = path or SELECTION_CONFIG
+    config = dict(DEFAULT_CONFIG)
+    try:
+        st = os.stat(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+        return config, st.st_mtime_ns
+    except FileNotFoundError:
+        return config, 0
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Invalid selection config {path}, using defaults: {e}")
+        return config, 0
+
+def compute_base_weights(photos, config, hidden=None):
+    """Base weight per photo: folder quota spread over its photos, times favorite boost
+
+    hidden is a set of photo indices (duplicate burst frames) that get
+    weight 0 and do not dilute their folder's quota.
+    """
+    hidden = hidden or ()
+    quotas = config.get("folder_quotas") or {}
+    favorite_files = set()
+    favorite_prefixes = []
+    for entry in config.get("favorites") or []:
+        if entry.endswith('/'):
+            favorite_prefixes.append(entry)
+        else:
+            favorite_files.add(entry)
+    favorite_prefixes = tuple(favorite_prefixes)
+    favorite_weight = float(config.get("favorite_weight", 1.0))
+
+    folders = [photo.rpartition('/')[0] for photo in photos]
+    counts = {}
+    for index, folder in enumerate(folders):
+        if index not in hidden:
+            counts[folder] = counts.get(folder, 0) + 1
+
+    # Longest configured prefix wins: "family" also covers "family/2018"
+    folder_share = {}
+    for folder, count in counts.items():
+        quota = 1.0
+        best = -1
+        for key, value in quotas.items():
+            key = key.strip('/')
+            if (not key or folder == key or folder.startswith(f"{key}/")) and len(key) > best:
+                quota, best = float(value), len(key)
+        folder_share[folder] = quota / count
+
+    weights = []
+    for index, (photo, folder) in enumerate(zip(photos, folders)):
+        if index in hidden:
+            weights.append(0.0)
+            continue
+        weight = folder_share[folder]
+        if photo in favorite_files or (favorite_prefixes and photo.startswith(favorite_prefixes)):
+            weight *= favorite_weight
+        weights.append(weight)
+    return weights
+
+class SelectionState:
+    """Memory-mapped selection state: base weights and Fenwick sampler"""
+
+    def __init__(self, path, mm):
+        self.path = path
+        self.mm = mm
+        (magic, version, self.dirty, self.n,
+         self.generation, self.config_sig) = _HEADER.unpack_from(mm, 0)
+        self.base, weights, tree = photo_state.map_sections(mm, self._layout(self.n))
+        self.sampler = FenwickSampler(weights, tree)
+
+    @staticmethod
+    def _layout(n):
+        return [('d', n), ('d', n), ('d', n)]
+
+    @classmethod
+    def create(cls, path, base_weights, generation, config_sig):
+        """Write a fresh state file atomically and map it"""
+        from array import array
+
+        base = array('d', base_weights)
+        tree = array('d', bytes(8 * len(base)))
+        FenwickSampler.build_tree(base, tree)
+        header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, 0, len(base), generation, config_sig)
+        # Current weights start equal to base weights
+        mm = photo_state.create_mapped(path, header, [base, base, tree])
+        return cls(path, mm)
+
+    @classmethod
+    def open(cls, path):
+        """Map an existing state file, None if missing or not a valid state"""
+        mm = photo_state.open_mapped(path)
+        if mm is None:
+            return None
+        magic, version, dirty, n, generation, config_sig = _HEADER.unpack_from(mm, 0)
+        if (magic != _MAGIC or version != _FORMAT_VERSION
+                or len(mm) != photo_state.mapped_size(cls._layout(n))):
+            mm.close()
+            return None
+        return cls(path, mm)
+
+    def matches(self, n, generation, config_sig):
+        """True if state was built for this catalog and config and is consistent"""
+        return (not self.dirty and self.n == n and self.generation == generation
+                and self.config_sig == config_sig)
+
+    def _write_header(self, dirty):
+        _HEADER.pack_into(self.mm, 0, _MAGIC, _FORMAT_VERSION, dirty, self.n,
+                          self.generation, self.config_sig)
+
+    def mark_shown(self, index, penalty, history=None, window=0):
+        """Penalize index and restore the photo that just left the recent window
+
+        history must already contain the show of index. Without history (or
+        with an empty window) nothing could lift the penalty again, so the
+        weights stay at their base values.
+        """
+        if history is None or window <= 0:
+            return
+        with photo_state.locked(self.path):
+            # Dirty flag: an interrupted update forces a rebuild next tick
+            self._write_header(1)
+            evicted = history.shown_ago(window)
+            if 0 <= evicted < self.n and not history.shown_within_slides(evicted, window):
+                self.sampler.set_weight(evicted, self.base[evicted])
+            self.sampler.set_weight(index, self.base[index] * penalty)
+            self._write_header(0)
+
+    def close(self):
+        self.base.release()
+        self.sampler.weights.release()
+        self.sampler.tree.release()
+        self.mm.close()
+
+def recent_window(config, photos, history=None):
+    """Number of latest shows that stay penalized"""
+    window = max(0, min(int(config.get("recent_window", 0)), len(photos) - 1))
+    if history is not None:
+        window = min(window, history.capacity - 1)
+    return window
+
+def open_selection_state(photos, generation, state_path=None, config_path=None, hidden=None, hidden_sig=0,
+                         history=None):
+    """Map the selection state for this catalog, rebuilding it if stale
+
+    hidden / hidden_sig: catalog["burst_hidden"] and its signature. A
+    rebuild penalizes again the photos history shows as recently shown.
+    """
+    state_path = state_path or SELECTION_STATE
+    config, config_sig = load_selection_config(config_path)
+    config_sig ^= int(hidden_sig or 0)
+    generation = int(generation or 0)
+
+    state = SelectionState.open(state_path)
+    if state is not None and state.matches(len(photos), generation, config_sig):
+        return state, config
+    if state is not None:
+        state.close()
+
+    print(f"🔄 Building selection weights for {len(photos)} photos")
+    base_weights = compute_base_weights(photos, config, set(hidden or ()))
+    state = SelectionState.create(state_path, base_weights, generation, config_sig)
+    if history is not None:
+        penalty = float(config.get("recent_penalty", 1.0))
+        with photo_state.locked(state_path):
+            state._write_header(1)
+            for index, _ in history.recent(recent_window(config, photos, history)):
+                if 0 <= index < state.n:
+                    state.sampler.set_weight(index, state.base[index] * penalty)
+            state._write_header(0)
+    return state, config
+
+def select_weighted_index(photos, generation, history=None, state_path=None, config_path=None, rng=random,
+                          hidden=None, hidden_sig=0):
+    """Draw a photo index by weight, record it in history and penalize it"""
+    state, config = open_selection_state(photos, generation, state_path, config_path, hidden, hidden_sig, history)
+    try:
+        index = state.sampler.sample(rng)
+        if index is None:
+            index = rng.randrange(len(photos))
+        if history is not None:
+            history.record(index)
+        window = recent_window(config, photos, history)
+        state.mark_shown(index, float(config.get("recent_penalty", 1.0)), history, window)
+        return index
+    finally:
+        state.close()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# scripts/photo_shards.py
+# Sharded, resumable directory scan with on-disk checkpoints
+#
+# A scan is split into one shard per directory. Shards run on a small thread
+# pool (listing a directory is I/O: scandir on a mount or one smbclient call),
+# and every shard that finishes adds its subdirectories as new shards.
+# Finished directories are reported to photo_progress (live HA sensor).
+# Progress is checkpointed to CHECKPOINT_FILE, so a timeout, a failed shard
+# or the shell_command time limit only costs the unfinished directories:
+# the next run with the same source resumes from the checkpoint.
+#
+# Checkpoint (tvphotoframe_debug/scan_checkpoint.json):
+# {
+#   "source": "//192.168.1.10/photos/frame",
+#   "pending": ["2019/summer", ...],            # directories not listed yet
+#   "done": {"": ["IMG_1.jpg"], "2019": [...]}, # directory -> photo names
+#   "attempts": {"2020": 2},                    # failed listings per directory
+#   "skipped": ["@eaDir"]                       # given up on in this scan
+# }
+#
+# A directory that still fails after SHARD_RETRIES extra attempts
+# (permission denied, #recycle, @eaDir on a NAS) is skipped the way os.walk
+# skips unreadable folders: the scan finishes without it and the skipped
+# directories are left in last_skipped (load_photos stores them in the
+# catalog). Only running out of time leaves a scan incomplete.
+
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+import photo_catalog
+import photo_progress
+
+CHECKPOINT_FILE = "/config/tvphotoframe_debug/scan_checkpoint.json"
+CHECKPOINT_VERSION = 1
+SHARD_WORKERS = 4
+SHARD_RETRIES = 2          # Extra attempts per directory within one run
+CHECKPOINT_INTERVAL = 5.0  # Seconds between checkpoint writes
+SCAN_TIME_BUDGET = float(os.environ.get("TVPHOTOFRAME_SCAN_BUDGET", 35))  # shell_command limit is 60 s
+
+# Directories skipped by the last completed scan_sharded() call
+last_skipped = []
+
+class ScanIncomplete(Exception):
+    """Scan stopped with directories left; progress is in the checkpoint"""
+
+    def __init__(self, source, done, pending):
+        super().__init__(f"scan of {source} paused: {done} folders done, {pending} pending")
+        self.source = source
+        self.done = done
+        self.pending = pending
+
+def _join(rel, name):
+    return f"{rel}/{name}" if rel else name
+
+def load_checkpoint(source, path=None):
+    """Return (pending, done, attempts, skipped) to resume a scan of source, None if there is nothing to resume"""
+    import json
+
+    try:
+        with open(path or CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CHECKPOINT_VERSION or data.get("source") != source:
+        return None
+    return (list(data.get("pending", [])), dict(data.get("done", {})), dict(data.get("attempts", {})),
+            list(data.get("skipped", [])))
+
+def save_checkpoint(source, pending, done, attempts, path=None, skipped=()):
+    photo_catalog.write_json_atomic(path or CHECKPOINT_FILE, {
+        "version": CHECKPOINT_VERSION,
+        "source": source,
+        "updated": datetime.now().isoformat(),
+        "pending": list(pending),
+        "done": done,
+        "attempts": attempts,
+        "skipped": list(skipped),
+    }, indent=None)
+
+def clear_checkpoint(path=None):
+    try:
+        os.unlink(path or CHECKPOINT_FILE)
+    except FileNotFoundError:
+        pass
+
+def scan_sharded(source, list_shard, workers=None, checkpoint_path=None, time_budget=None, retries=SHARD_RETRIES,
+                 deadline=None):
+    """Scan a tree directory by directory, returns photo paths relative to the root
+
+    list_shard(rel) lists one directory ("" is the root) and returns
+    (photo names, subdirectory names) or (photo names, subdirectory names,
+    bytes of the photos); it may raise on failure. Directories that keep
+    failing are skipped (see last_skipped), a root that keeps failing
+    raises OSError. Raises ScanIncomplete after checkpointing if time runs
+    out: at deadline (a time.monotonic() value the caller fixed at process
+    start), otherwise time_budget seconds from now; 0 means no limit.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    workers = workers or SHARD_WORKERS
+    time_budget = SCAN_TIME_BUDGET if time_budget is None else time_budget
+    last_skipped.clear()
+    resumed = load_checkpoint(source, checkpoint_path)
+    if resumed:
+        pending, done, attempts, skipped = resumed
+        print(f"⏯️ Resuming scan: {len(done)} folders done, {len(pending)} pending")
+        photo_progress.shard_done(sum(len(names) for names in done.values()), 0, len(pending), len(done))
+    else:
+        pending, done, attempts, skipped = [""], {}, {}, []
+    queue = deque(rel for rel in pending if rel not in done)
+    in_flight = {}  # future -> rel
+
+    started = time.monotonic()
+    if deadline is None and time_budget:
+        deadline = started + time_budget
+    last_checkpoint = started
+    out_of_time = False
+
+    def remaining():
+        return [in_flight[f] for f in in_flight] + list(queue)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+        while queue or in_flight:
+            if not out_of_time and deadline is not None and time.monotonic() > deadline:
+                out_of_time = True
+                # Listings that have not started yet go back to the checkpoint
+                for future in list(in_flight):
+                    if future.cancel():
+                        queue.appendleft(in_flight.pop(future))
+            # Keep every worker busy; stop handing out work once the time is up
+            while queue and len(in_flight) < workers * 2 and not out_of_time:
+                rel = queue.popleft()
+                in_flight[pool.submit(list_shard, rel)] = rel
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rel = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    attempts[rel] = attempts.get(rel, 0) + 1
+                    print(f"⚠️ Listing '{rel or '/'}' failed ({attempts[rel]}x): {e}")
+                    if attempts[rel] <= retries:
+                        queue.append(rel)
+                    else:
+                        print(f"⏭️ Skipping '{rel or '/'}' after {attempts[rel]} failed listings")
+                        attempts.pop(rel)
+                        skipped.append(rel)
+                    continue
+                names, subdirs = result[0], result[1]
+                done[rel] = list(names)
+                attempts.pop(rel, None)
+                queue.extend(child for child in (_join(rel, d) for d in subdirs) if child not in done)
+                photo_progress.shard_done(len(names), result[2] if len(result) > 2 else 0,
+                                          len(queue) + len(in_flight))
+
+            now = time.monotonic()
+            if now - last_checkpoint >= CHECKPOINT_INTERVAL:
+                save_checkpoint(source, remaining(), done, attempts, checkpoint_path, skipped)
+                last_checkpoint = now
+                print(f"💾 Scan checkpoint: {len(done)} folders done, {len(queue) + len(in_flight)} pending")
+
+    left = remaining()
+    if left:
+        save_checkpoint(source, left, done, attempts, checkpoint_path, skipped)
+        raise ScanIncomplete(source, len(done), len(left))
+
+    clear_checkpoint(checkpoint_path)
+    if "" in skipped:
+        # Nothing could be listed: a failed scan, not an empty share
+        raise OSError(f"listing failed: {source or '/'}")
+    last_skipped[:] = skipped
+    photos = []
+    for rel, names in done.items():
+        prefix = f"{rel}/" if rel else ""
+        photos.extend(prefix + name for name in names)
+    return photos
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# scripts/photo_state.py
+# Memory-mapped binary state files shared by selection and show history
+#
+# A state file is a fixed 64-byte header followed by flat arrays. It is
+# created atomically (temp file + rename) and afterwards patched in place
+# through mmap, so a tick touches only the few slots it changes.
+
+import mmap
+import os
+from contextlib import contextmanager
+
+HEADER_SIZE = 64
+
+def create_mapped(path, header, sections):
+    """Write header + sections (bytes-like) to path atomically, return mmap or None"""
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(bytes(header).ljust(HEADER_SIZE, b"\0"))
+            for section in sections:
+                f.write(section)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return open_mapped(path)
+
+def open_mapped(path):
+    """Map an existing state file read-write, None if missing or too small"""
+    try:
+        with open(path, 'r+b') as f:
+            if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+                return None
+            return mmap.mmap(f.fileno(), 0)
+    except (OSError, ValueError):
+        return None
+
+def map_sections(mm, layout):
+    """Cast consecutive regions after the header: layout is [(typecode, count), ...]"""
+    view = memoryview(mm)
+    offset = HEADER_SIZE
+    sections = []
+    for typecode, count in layout:
+        size = 8 * count  # 'd' and 'q' are both 8 bytes
+        sections.append(view[offset:offset + size].cast(typecode))
+        offset += size
+    view.release()
+    return sections
+
+def mapped_size(layout):
+    """Expected file size for a layout"""
+    return HEADER_SIZE + sum(8 * count for _, count in layout)
+
+@contextmanager
+def locked(path):
+    """Exclusive advisory lock while patching a state file"""
+    import fcntl
+
+    with open(path, 'rb') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
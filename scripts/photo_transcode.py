@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# scripts/photo_transcode.py
+# Media preparation for the TV: pick what to send and with which MIME type
+#
+# Small JPEGs go to the TV as they are. Everything else - PNG, GIF, BMP and
+# JPEGs over PASSTHROUGH_MAX_BYTES - is rendered once by photo_render into a
+# TV-sized progressive JPEG in RENDER_DIR and the cached file is sent
+# instead, so every slide transfer is a few hundred KB. A cached slide is
+# reused while it is newer than its source. The cache is keyed by source
+# path and resolution and pruned to RENDER_CACHE_MAX_MB, oldest first.
+# RENDER_DIR is under /config/www, so the TV fetches cached slides from HA
+# as RENDER_URL/<file> (public_path), not by their file system path.
+#
+# Network folders (//server/share/...) are read through the persistent
+# share mount (photo_mount) when it exists; without one the original is
+# passed through with the MIME type of its extension.
+
+import hashlib
+import os
+
+RENDER_DIR = "/config/www/tvphotoframe/render"
+RENDER_URL = "/local/tvphotoframe/render"  # RENDER_DIR as HA serves it
+PASSTHROUGH_MAX_BYTES = 3 * 1024 * 1024  # JPEGs up to this size are sent as is
+RENDER_CACHE_MAX_MB = 512
+
+MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+}
+
+def mime_type(path):
+    """MIME type from the file extension, image/jpeg when unknown"""
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), "image/jpeg")
+
+def local_source(path):
+    """Readable local file for a photo path, None if it is on an unmounted share"""
+    if not path.startswith(('//', '\\\\')):
+        return path
+    from photo_mount import mounted_path
+
+    return mounted_path(path)
+
+def render_path(path, size, render_dir=None):
+    """Cache file for path rendered at size (width, height)"""
+    key = hashlib.md5(path.encode('utf-8')).hexdigest()
+    return os.path.join(render_dir or RENDER_DIR, f"{key}_{size[0]}x{size[1]}.jpg")
+
+def public_path(path, render_dir=None):
+    """What the TV is given for a media path: cached slides by their /local URL, anything else as is"""
+    if os.path.dirname(path) == (render_dir or RENDER_DIR):
+        return f"{RENDER_URL}/{os.path.basename(path)}"
+    return path
+
+def needs_transcode(path, st_size):
+    """Non-JPEGs and large JPEGs are rendered, small JPEGs are sent as is"""
+    return mime_type(path) != "image/jpeg" or st_size > PASSTHROUGH_MAX_BYTES
+
+def prune(render_dir=None, max_mb=None, keep=None):
+    """Delete the oldest cached slides until the cache fits max_mb, returns files removed"""
+    render_dir = render_dir or RENDER_DIR
+    limit = (max_mb or RENDER_CACHE_MAX_MB) * 2**20
+    try:
+        with os.scandir(render_dir) as entries:
+            files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries
+                     if e.is_file() and e.name.endswith(".jpg")]
+    except OSError:
+        return 0
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+def prepare(path, renderer=None, render_dir=None):
+    """Returns (media path, MIME type, transcoded) for the TV
+
+    renderer is a photo_render.SlideRenderer to reuse between calls (its
+    canvas); one is created when needed. Falls back to the original with
+    its own MIME type whenever rendering is impossible.
+    """
+    source = local_source(path)
+    try:
+        st = os.stat(source) if source else None
+    except OSError:
+        st = None
+    if st is None or not needs_transcode(path, st.st_size):
+        return path, mime_type(path), False
+
+    import photo_render
+
+    size = renderer.size if renderer else photo_render.RENDER_SIZE
+    target = render_path(path, size, render_dir)
+    try:
+        if os.stat(target).st_mtime >= st.st_mtime:
+            return target, "image/jpeg", True
+    except OSError:
+        pass
+
+    own_renderer = renderer is None
+    try:
+        if own_renderer:
+            renderer = photo_render.SlideRenderer(size)
+        renderer.render(source, target)
+    except ImportError:
+        print("⚠️ Pillow is not installed, sending the original")
+        return path, mime_type(path), False
+    except (photo_render.RenderTooLarge, OSError) as e:
+        print(f"⚠️ Could not transcode {path}: {e}")
+        return path, mime_type(path), False
+    finally:
+        if own_renderer and renderer is not None:
+            renderer.close()
+
+    prune(render_dir, keep=target)
+    return target, "image/jpeg", True
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# scripts/photo_watch.py
+# Incremental catalog updates from filesystem changes (inotify, polling fallback)
+#
+# Usage: python3 scripts/photo_watch.py [/media/photo/0001photoframe]
+# (the AppDaemon app runs the same watcher from a timer)
+#
+# Watchers return events instead of a new full list:
+#   ("add", "family/IMG_1.jpg")     photo created / moved in
+#   ("remove", "family/IMG_1.jpg")  photo deleted / moved out
+#   ("remove_dir", "family")        directory deleted / moved out
+#   ("resync", "")                  events were lost, a full scan is needed
+# ChangeBatcher debounces bursts (copying 500 photos = one catalog write) and
+# apply_changes() patches the catalog file.
+
+import os
+import struct
+import time
+
+import photo_bursts
+import photo_catalog
+import photo_paths
+from photo_scan import PHOTO_SUFFIXES, scan_photo_tree
+
+DEBOUNCE_SECONDS = 5       # Apply after this long without new events
+MAX_BATCH_DELAY = 60       # ... but never hold changes longer than this
+POLL_INTERVAL = 60         # Directory mtime check interval for network shares
+NETWORK_FS_TYPES = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "fuse.sshfs", "9p"}
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct('iIII')
+
+def is_photo(name):
+    return name.lower().endswith(PHOTO_SUFFIXES)
+
+def filesystem_type(path):
+    """Filesystem type of the mount containing path (from /proc/mounts)"""
+    path = os.path.realpath(path)
+    best, fstype = "", None
+    try:
+        with open("/proc/mounts", 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace("\\040", " ")
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) >= len(best):
+                    best, fstype = mount_point, parts[2]
+    except OSError:
+        pass
+    return fstype
+
+class InotifyWatcher:
+    """Recursive inotify watch on a local tree"""
+
+    def __init__(self, root):
+        import ctypes
+        import ctypes.util
+
+        self.root = root.rstrip('/') or '/'
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}  # watch descriptor -> directory relative to root ("" = root)
+        self._watch_tree("")
+
+    def _abs(self, rel):
+        return f"{self.root}/{rel}" if rel else self.root
+
+    def _add_watch(self, rel):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(self._abs(rel)), WATCH_MASK)
+        if wd >= 0:
+            self.dirs[wd] = rel
+        return wd
+
+    def _watch_tree(self, rel):
+        """Watch rel and all subdirectories"""
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            if self._add_watch(current) < 0:
+                continue
+            try:
+                with os.scandir(self._abs(current)) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(f"{current}/{entry.name}" if current else entry.name)
+            except OSError:
+                continue
+
+    def _added_dir(self, rel):
+        """New directory: watch it and report photos already inside"""
+        self._watch_tree(rel)
+        return [("add", path) for path in scan_photo_tree(self._abs(rel), prefix=f"{rel}/")]
+
+    def poll(self):
+        """Read pending events without blocking"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+                offset += _EVENT.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    events.append(("resync", ""))
+                    continue
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                parent = self.dirs.get(wd)
+                if parent is None or not name:
+                    continue
+                rel = f"{parent}/{name}" if parent else name
+
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        events.extend(self._added_dir(rel))
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        events.append(("remove_dir", rel))
+                elif is_photo(name):
+                    if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        events.append(("add", rel))
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        events.append(("remove", rel))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """Fallback for CIFS/NFS: re-list only directories whose mtime changed"""
+
+    def __init__(self, root, interval=POLL_INTERVAL):
+        self.root = root.rstrip('/') or '/'
+        self.interval = interval
+        self.last_poll = 0.0
+        self.dirs = {}  # rel dir -> (mtime_ns, photo names, subdir names)
+        self._snapshot_tree("")
+        self.last_poll = time.monotonic()
+
+    def _abs(self, rel):
+        return f"{self.root}/{rel}" if rel else self.root
+
+    def _list_dir(self, rel):
+        path = self._abs(rel)
+        mtime = os.stat(path).st_mtime_ns
+        photos, subdirs = set(), set()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.add(entry.name)
+                elif is_photo(entry.name):
+                    photos.add(entry.name)
+        return mtime, photos, subdirs
+
+    def _snapshot_tree(self, rel, events=None):
+        """Record rel and everything below it, optionally reporting photos as added"""
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            try:
+                mtime, photos, subdirs = self._list_dir(current)
+            except OSError:
+                continue
+            self.dirs[current] = (mtime, photos, subdirs)
+            prefix = f"{current}/" if current else ""
+            if events is not None:
+                events.extend(("add", prefix + name) for name in photos)
+            stack.extend(prefix + name for name in subdirs)
+
+    def _forget_tree(self, rel):
+        prefix = f"{rel}/"
+        for key in [k for k in self.dirs if k == rel or k.startswith(prefix)]:
+            del self.dirs[key]
+
+    def poll(self):
+        """Stat known directories (at most every interval seconds) and diff changed ones"""
+        now = time.monotonic()
+        if now - self.last_poll < self.interval:
+            return []
+        self.last_poll = now
+
+        events = []
+        for rel in list(self.dirs):
+            if rel not in self.dirs:
+                continue  # removed while iterating
+            old_mtime, old_photos, old_subdirs = self.dirs[rel]
+            try:
+                if os.stat(self._abs(rel)).st_mtime_ns == old_mtime:
+                    continue
+                mtime, photos, subdirs = self._list_dir(rel)
+            except OSError:
+                if rel:
+                    events.append(("remove_dir", rel))
+                    self._forget_tree(rel)
+                continue
+
+            prefix = f"{rel}/" if rel else ""
+            events.extend(("add", prefix + name) for name in photos - old_photos)
+            events.extend(("remove", prefix + name) for name in old_photos - photos)
+            for name in old_subdirs - subdirs:
+                events.append(("remove_dir", prefix + name))
+                self._forget_tree(prefix + name)
+            self.dirs[rel] = (mtime, photos, subdirs)
+            for name in subdirs - old_subdirs:
+                self._snapshot_tree(prefix + name, events)
+        return events
+
+    def close(self):
+        self.dirs.clear()
+
+def create_watcher(root):
+    """inotify for local trees, mtime polling for network filesystems"""
+    fstype = filesystem_type(root)
+    if fstype not in NETWORK_FS_TYPES:
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify unavailable ({e}), using polling")
+    return PollingWatcher(root)
+
+class ChangeBatcher:
+    """Collect events and release them once the tree has been quiet for a while"""
+
+    def __init__(self, debounce=DEBOUNCE_SECONDS, max_delay=MAX_BATCH_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.pending = {}       # path -> "add" / "remove" (last event wins)
+        self.removed_dirs = set()
+        self.resync = False
+        self.first_event = None
+        self.last_event = None
+
+    def add(self, events, now=None):
+        if not events:
+            return
+        now = time.monotonic() if now is None else now
+        for kind, path in events:
+            if kind == "resync":
+                self.resync = True
+            elif kind == "remove_dir":
+                self.removed_dirs.add(path)
+                prefix = f"{path}/"
+                for key in [k for k in self.pending if k.startswith(prefix)]:
+                    del self.pending[key]
+            else:
+                self.pending[path] = kind
+        self.first_event = self.first_event or now
+        self.last_event = now
+
+    def ready(self, now=None):
+        if self.last_event is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self.last_event >= self.debounce or now - self.first_event >= self.max_delay
+
+    def take(self):
+        """Return (added, removed, removed_dirs, resync) and reset"""
+        added = [path for path, kind in self.pending.items() if kind == "add"]
+        removed = [path for path, kind in self.pending.items() if kind == "remove"]
+        result = (added, removed, sorted(self.removed_dirs), self.resync)
+        self.pending = {}
+        self.removed_dirs = set()
+        self.resync = False
+        self.first_event = self.last_event = None
+        return result
+
+def apply_changes(added, removed, removed_dirs=(), catalog_path=None):
+    """Patch catalog files list, returns new catalog or None if nothing changed"""
+    catalog = photo_catalog.read_catalog(catalog_path)
+    if catalog is None:
+        return None
+
+    # Events carry on-share names, the catalog is keyed by NFC paths
+    files = catalog.get("files", [])
+    drop = {photo_paths.normalize(f) for f in removed}
+    dir_prefixes = tuple(f"{photo_paths.normalize(d)}/" for d in removed_dirs)
+    kept = [f for f in files if f not in drop and not (dir_prefixes and f.startswith(dir_prefixes))]
+    known = set(kept)
+    new = [f for f in added if photo_paths.normalize(f) not in known]
+    if len(kept) == len(files) and not new:
+        return None
+
+    kept = [photo_paths.share_path(catalog, f) for f in kept]
+    updated = photo_catalog.build_catalog(kept + new, catalog.get("scan_folder"))
+    for key, value in catalog.items():
+        updated.setdefault(key, value)
+    # Hidden burst frames are positions in the old list; new files stay visible until the next scan
+    if catalog.get("burst_hidden"):
+        photo_bursts.apply_to_catalog(updated, photo_bursts.catalog_hidden(catalog))
+    # A file event is not a successful scan: keep any pending retry
+    updated["stale"] = catalog.get("stale", False)
+    updated["retry_count"] = catalog.get("retry_count", 0)
+    photo_catalog.save_catalog(updated, catalog_path)
+    print(f"📝 Catalog updated: +{len(new)} -{len(files) - len(kept)} ({len(updated['files'])} photos)")
+    return updated
+
+def main():
+    import sys
+
+    catalog = photo_catalog.read_catalog()
+    root = sys.argv[1] if len(sys.argv) > 1 else (catalog or {}).get("scan_folder")
+    if not root or not os.path.isdir(root):
+        print(f"❌ Not a local folder: {root}")
+        sys.exit(1)
+
+    watcher = create_watcher(root)
+    batcher = ChangeBatcher()
+    print(f"👀 Watching {root} with {type(watcher).__name__}")
+    try:
+        while True:
+            batcher.add(watcher.poll())
+            if batcher.ready():
+                added, removed, removed_dirs, resync = batcher.take()
+                if resync:
+                    print("⚠️ Events lost, rebuilding catalog from a full scan")
+                    photo_catalog.save_catalog(photo_catalog.build_catalog(scan_photo_tree(root), root))
+                else:
+                    apply_changes(added, removed, removed_dirs)
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+if __name__ == "__main__":
+    main()
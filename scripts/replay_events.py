@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+# scripts/replay_events.py
+# Shadow-mode replay of recorded HA events through the AppDaemon app
+#
+# Usage: python3 scripts/replay_events.py trace.jsonl [--json replay.json]
+#        python3 scripts/replay_events.py history.json --echo-state playing
+#        python3 scripts/replay_events.py --synthetic 48 --seed 1
+#
+# TvPhotoFrameManager (apps/tvphotoframe.py) runs against a stub HA on a
+# simulated clock: recorded media_player state/attribute changes are fed
+# to its listen_state callbacks, its run_at/run_every/run_in timers fire
+# on simulated time and every service call is recorded instead of sent.
+# Days of TV usage replay in seconds, so scheduler and debounce changes
+# can be compared offline.
+#
+# Traces:
+#   - JSON lines, one state per line:
+#       {"time": "2024-05-01T20:00:00", "entity_id": "media_player.tv",
+#        "state": "playing", "attributes": {"media_title": "News"}}
+#     ("time" may also be seconds from the start, "t": 12.5);
+#   - HA websocket state_changed events ({"event_type": "state_changed",
+#     "time_fired": ..., "data": {"entity_id": ..., "new_state": {...}}});
+#   - the JSON of /api/history/period (a list of per-entity state lists);
+#   - service calls to the app: {"t": 60, "service": "tvphotoframe/toggle"}.
+#
+# Like AppDaemon, callbacks run one at a time and state changes made by a
+# callback (set_state, service side effects) are dispatched after it
+# returns. --echo-state makes the TV report a state after each play_media,
+# the way a real TV does; without it the TV does not react (pure shadow).
+#
+# Reported: callbacks per handler with their wall time, slides shown,
+# starts (time since the last recorded TV change), stops (time from the
+# recorded change or service call that caused them; stops without one
+# are counted as spurious) and service calls per simulated hour.
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+APPS_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), "apps")
+for path in (SCRIPTS_DIR, APPS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+DEFAULT_TV_ENTITY = "media_player.lg_webos_tv_ur80006lj_2"
+DEFAULT_PHOTOS = 200
+DEFAULT_TAIL = 3600  # Simulated seconds replayed after the last event
+DEFAULT_STATES = {
+    "input_boolean.tvphotoframe_enabled": "on",
+    "input_boolean.tvphotoframe_active": "off",
+    "input_number.tv_inactive_timeout": "15",
+    "input_number.tvphotoframe_interval": "5",
+}
+
+class TraceEvent:
+    """One recorded item: a state of entity_id or a call of service"""
+
+    def __init__(self, offset, entity_id=None, state=None, attributes=None, service=None, data=None):
+        self.offset = offset  # Seconds from the start of the trace
+        self.entity_id = entity_id
+        self.state = state
+        self.attributes = attributes
+        self.service = service
+        self.data = data or {}
+
+def _parse_time(value):
+    """Seconds (offset) or an ISO timestamp as naive UTC datetime"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    when = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+def _trace_items(raw):
+    """(time, fields) pairs from any supported trace format"""
+    for item in raw:
+        if isinstance(item, list):
+            # /api/history/period: one list of states per entity
+            yield from _trace_items(item)
+        elif item.get("event_type") == "state_changed":
+            data = item.get("data", {})
+            new = data.get("new_state") or {}
+            yield (item.get("time_fired") or new.get("last_updated"),
+                   {"entity_id": data.get("entity_id"), "state": new.get("state"),
+                    "attributes": new.get("attributes")})
+        elif "event_type" in item:
+            continue
+        elif "service" in item:
+            yield item.get("time", item.get("t", 0)), {"service": item["service"], "data": item.get("data")}
+        else:
+            when = item.get("time", item.get("t", item.get("last_updated", item.get("last_changed", 0))))
+            yield when, {"entity_id": item["entity_id"], "state": item.get("state"),
+                         "attributes": item.get("attributes")}
+
+def load_trace(path):
+    """Returns (start datetime, events sorted by offset)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        raw = json.loads(text)
+    else:
+        raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    items = [(_parse_time(when), fields) for when, fields in _trace_items(raw)]
+    stamps = [when for when, _ in items if isinstance(when, datetime)]
+    start = min(stamps) if stamps else datetime(2024, 1, 1, 18, 0, 0)
+    events = []
+    for when, fields in items:
+        offset = (when - start).total_seconds() if isinstance(when, datetime) else when
+        events.append(TraceEvent(offset, **fields))
+    events.sort(key=lambda e: e.offset)
+    return start, events
+
+def synthetic_trace(hours, seed=None, entity_id=DEFAULT_TV_ENTITY):
+    """Evenings of TV use: watching with remote presses, idle breaks, nights off"""
+    rng = random.Random(seed)
+    events, t = [], 0.0
+    end = hours * 3600
+    events.append(TraceEvent(0.0, entity_id, "on", {"source": "Live TV", "volume_level": 0.2}))
+    while t < end:
+        # Watching: new titles, volume and source changes every few minutes
+        session_end = t + rng.uniform(20, 120) * 60
+        while t < session_end:
+            t += rng.uniform(30, 600)
+            attributes = {"source": rng.choice(["Live TV", "HDMI 1", "Netflix"]),
+                          "volume_level": round(rng.uniform(0.1, 0.4), 2),
+                          "media_title": f"Show {rng.randrange(100)}"}
+            events.append(TraceEvent(t, entity_id, "playing", attributes))
+        # Break with the TV on and nothing playing
+        events.append(TraceEvent(t, entity_id, "on", {"source": "Live TV", "volume_level": 0.2}))
+        t += rng.uniform(10, 90) * 60
+        if rng.random() < 0.3:
+            events.append(TraceEvent(t, entity_id, "off", {}))
+            t += rng.uniform(2, 10) * 3600
+            events.append(TraceEvent(t, entity_id, "on", {"source": "Live TV", "volume_level": 0.2}))
+    return datetime(2024, 1, 1, 18, 0, 0), [e for e in events if e.offset <= end]
+
+class StubHA:
+    """States, listeners, timers and service calls of one replay, on simulated time"""
+
+    def __init__(self, start, echo_state=None, echo_delay=1.0):
+        self.now = start
+        self.start = start
+        self.echo_state = echo_state
+        self.echo_delay = echo_delay
+        self.states = {}
+        self.listeners = {}
+        self.timers = []
+        self.timer_info = {}
+        self.queue = deque()
+        self.services = {}
+        self.calls = []
+        self.events = []
+        self.handles = itertools.count(1)
+        self.callback_counts = Counter()
+        self.callback_seconds = Counter()
+        self.errors = []
+        self.log_lines = []
+        self.verbose = False
+
+    # State machine
+
+    def set(self, entity_id, state=None, attributes=None, merge=True):
+        """Change a state like HA does and queue the matching listen_state callbacks"""
+        old = self.states.get(entity_id)
+        new_attributes = dict(old["attributes"]) if old and merge else {}
+        new_attributes.update(attributes or {})
+        if state is None:
+            state = old["state"] if old else "unknown"
+        state = str(state)
+        stamp = self.now.isoformat()
+        changed = old is None or old["state"] != state
+        new = {"entity_id": entity_id, "state": state, "attributes": new_attributes,
+               "last_changed": stamp if changed else old["last_changed"], "last_updated": stamp}
+        self.states[entity_id] = new
+        for callback, attribute, kwargs in list(self.listeners.values()):
+            if callback.entity_id != entity_id:
+                continue
+            if attribute is None:
+                if changed:
+                    self.queue.append((callback, (entity_id, "state", old and old["state"], state, kwargs)))
+            elif attribute == "all":
+                self.queue.append((callback, (entity_id, "all", old, new, kwargs)))
+            else:
+                before = (old or {}).get("attributes", {}).get(attribute)
+                if before != new_attributes.get(attribute):
+                    self.queue.append((callback, (entity_id, attribute, before,
+                                                  new_attributes.get(attribute), kwargs)))
+        return new
+
+    def get(self, entity_id, attribute=None, default=None):
+        state = self.states.get(entity_id)
+        if state is None:
+            return default
+        if attribute is None:
+            return state["state"]
+        if attribute == "all":
+            return json.loads(json.dumps(state))
+        return state["attributes"].get(attribute, default)
+
+    # Scheduler
+
+    def schedule(self, callback, when, kwargs, interval=None):
+        handle = next(self.handles)
+        self.timer_info[handle] = (callback, kwargs, interval)
+        heapq.heappush(self.timers, (when, handle))
+        return handle
+
+    def cancel(self, handle):
+        self.timer_info.pop(handle, None)
+
+    def invoke(self, callback, args):
+        """Run one callback; exceptions are logged and the replay goes on, as in AppDaemon"""
+        name = getattr(callback, "__name__", repr(callback))
+        started = time.perf_counter()
+        try:
+            callback(*args)
+        except Exception as e:
+            self.errors.append(f"{self.now.isoformat()} {name}: {e!r}")
+        self.callback_counts[name] += 1
+        self.callback_seconds[name] += time.perf_counter() - started
+
+    def drain(self):
+        while self.queue:
+            callback, args = self.queue.popleft()
+            self.invoke(callback, args)
+
+    def run_until(self, when):
+        """Fire every timer due up to when, then move the clock there"""
+        self.drain()
+        while self.timers and self.timers[0][0] <= when:
+            due, handle = heapq.heappop(self.timers)
+            info = self.timer_info.get(handle)
+            if info is None:
+                continue
+            callback, kwargs, interval = info
+            self.now = max(self.now, due)
+            if interval:
+                heapq.heappush(self.timers, (due + timedelta(seconds=interval), handle))
+            else:
+                del self.timer_info[handle]
+            self.invoke(callback, (dict(kwargs),))
+            self.drain()
+        self.now = max(self.now, when)
+
+    # Services
+
+    def call_service(self, service, data):
+        self.calls.append((self.now, service, data))
+        domain, _, action = service.partition("/")
+        entity_id = data.get("entity_id")
+        if domain == "input_boolean" and action in ("turn_on", "turn_off"):
+            self.set(entity_id, "on" if action == "turn_on" else "off")
+        elif domain == "input_number" and action == "set_value":
+            self.set(entity_id, data.get("value"))
+        elif domain == "input_select" and action == "set_options":
+            self.set(entity_id, attributes={"options": data.get("options")})
+        elif domain == "media_player" and self.echo_state:
+            # The TV reports what it plays (or that it stopped) a moment later
+            if action == "play_media":
+                attributes = {"media_content_id": data.get("media_content_id"),
+                              "media_title": os.path.basename(str(data.get("media_content_id")))}
+                state = self.echo_state
+            elif action == "media_stop":
+                attributes, state = {"media_content_id": None, "media_title": None}, "on"
+            else:
+                return None
+            self.schedule(lambda kwargs: self.set(entity_id, state, attributes),
+                          self.now + timedelta(seconds=self.echo_delay), {})
+        return None
+
+class StubHass:
+    """appdaemon.plugins.hass.hassapi.Hass on top of a StubHA"""
+
+    def __init__(self, hub, args):
+        self._hub = hub
+        self.args = args
+
+    def log(self, message, level="INFO"):
+        line = f"{self._hub.now.isoformat(timespec='seconds')} {level} {message}"
+        self._hub.log_lines.append(line)
+        if self._hub.verbose:
+            print(line)
+
+    def get_state(self, entity_id=None, attribute=None, default=None, **kwargs):
+        return self._hub.get(entity_id, attribute, default)
+
+    def set_state(self, entity_id, state=None, attributes=None, **kwargs):
+        return self._hub.set(entity_id, state, attributes)
+
+    def listen_state(self, callback, entity_id, attribute=None, **kwargs):
+        handle = next(self._hub.handles)
+        bound = _Bound(callback, entity_id)
+        self._hub.listeners[handle] = (bound, attribute, kwargs)
+        return handle
+
+    def cancel_listen_state(self, handle):
+        self._hub.listeners.pop(handle, None)
+
+    def run_every(self, callback, start, interval, **kwargs):
+        when = self._hub.now if start == "now" else start
+        return self._hub.schedule(callback, when, kwargs, interval)
+
+    def run_in(self, callback, delay, **kwargs):
+        return self._hub.schedule(callback, self._hub.now + timedelta(seconds=delay), kwargs)
+
+    def run_at(self, callback, when, **kwargs):
+        return self._hub.schedule(callback, when, kwargs)
+
+    def cancel_timer(self, handle):
+        self._hub.cancel(handle)
+
+    def call_service(self, service, **data):
+        return self._hub.call_service(service, data)
+
+    def fire_event(self, event, **data):
+        self._hub.events.append((self._hub.now, event, data))
+
+    def register_service(self, service, callback, **kwargs):
+        self._hub.services[service] = callback
+
+class _Bound:
+    """listen_state callback with its entity (and the handler name for the report)"""
+
+    def __init__(self, callback, entity_id):
+        self.callback = callback
+        self.entity_id = entity_id
+        self.__name__ = getattr(callback, "__name__", repr(callback))
+
+    def __call__(self, *args):
+        return self.callback(*args)
+
+def install_stub_hassapi():
+    """Make `import appdaemon.plugins.hass.hassapi as hass` resolve to the stub"""
+    names = ["appdaemon", "appdaemon.plugins", "appdaemon.plugins.hass", "appdaemon.plugins.hass.hassapi"]
+    modules = [types.ModuleType(name) for name in names]
+    for parent, child, name in zip(modules, modules[1:], names[1:]):
+        setattr(parent, name.rsplit(".", 1)[1], child)
+    modules[-1].Hass = StubHass
+    sys.modules.update(zip(names, modules))
+
+def load_app(hub, workdir):
+    """Import apps/tvphotoframe.py on the simulated clock, with its files in workdir"""
+    install_stub_hassapi()
+    sys.modules.pop("tvphotoframe", None)
+    import photo_metrics
+    import tvphotoframe
+
+    class SimDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return hub.now
+
+    tvphotoframe.datetime = SimDatetime
+    tvphotoframe.HISTORY_FILE = os.path.join(workdir, "app_show_history.bin")
+    photo_metrics.METRICS_DIR = workdir
+    return tvphotoframe
+
+def make_photo_folder(workdir, count):
+    """Empty JPEG files: the app only lists, stats and reads them"""
+    folder = os.path.join(workdir, "photos")
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        open(os.path.join(folder, f"IMG_{i:05d}.jpg"), 'wb').close()
+    return folder
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _latency(values):
+    return {"count": len(values),
+            "mean_s": round(sum(values) / len(values), 1) if values else None,
+            "p95_s": _percentile(values, 0.95),
+            "max_s": max(values) if values else None}
+
+def replay(start, events, app_args=None, photos=DEFAULT_PHOTOS, tail=DEFAULT_TAIL,
+           echo_state=None, echo_delay=1.0, verbose=False):
+    """Run the app through the events, returns the report dict"""
+    workdir = tempfile.mkdtemp(prefix="tvphotoframe_replay_")
+    try:
+        hub = StubHA(start, echo_state, echo_delay)
+        hub.verbose = verbose
+        tvphotoframe = load_app(hub, workdir)
+
+        tvs = sorted({e.entity_id for e in events if e.entity_id and e.entity_id.startswith("media_player.")})
+        args = {"watch_catalog": False, "retry_failed_scans": False,
+                "photo_folder": make_photo_folder(workdir, photos)}
+        if tvs:
+            args["displays"] = tvs
+        args.update(app_args or {})
+        for entity_id, state in DEFAULT_STATES.items():
+            hub.set(entity_id, state)
+        hub.set("input_text.tvphotoframe_folder", args["photo_folder"])
+        for tv in tvs or [args.get("tv_entity", DEFAULT_TV_ENTITY)]:
+            hub.set(tv, "on")
+
+        app = tvphotoframe.TvPhotoFrameManager(hub, args)
+        wall_started = time.perf_counter()
+        hub.invoke(app.initialize, ())
+        hub.drain()
+
+        # Latency bookkeeping: last recorded change per TV, TVs showing photos
+        recorded = {}
+        showing = {}
+        starts, stops, spurious = [], [], 0
+        seen_calls = 0
+
+        def account():
+            nonlocal seen_calls, spurious
+            for when, service, data in hub.calls[seen_calls:]:
+                entity_id = data.get("entity_id")
+                if service == "media_player/play_media" and entity_id not in showing:
+                    showing[entity_id] = when
+                    starts.append((when - recorded.get(entity_id, start)).total_seconds())
+                elif service == "media_player/media_stop" and entity_id in showing:
+                    began = showing.pop(entity_id)
+                    cause = recorded.get(entity_id)
+                    if cause is not None and cause >= began:
+                        stops.append((when - cause).total_seconds())
+                    else:
+                        spurious += 1
+            seen_calls = len(hub.calls)
+
+        for event in events:
+            hub.run_until(start + timedelta(seconds=event.offset))
+            account()
+            if event.service:
+                callback = hub.services.get(event.service)
+                if callback is not None:
+                    hub.invoke(callback, (dict(event.data),))
+                for entity_id in showing:
+                    recorded[entity_id] = hub.now
+            else:
+                hub.set(event.entity_id, event.state, event.attributes, merge=False)
+                recorded[event.entity_id] = hub.now
+            hub.drain()
+            account()
+        end = start + timedelta(seconds=(events[-1].offset if events else 0) + tail)
+        hub.run_until(end)
+        account()
+        hub.invoke(app.terminate, ())
+        hub.drain()
+        wall = time.perf_counter() - wall_started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    hours = max((end - start).total_seconds() / 3600, 1e-9)
+    services = Counter(service for _, service, _ in hub.calls)
+    return {
+        "simulated_hours": round(hours, 2),
+        "wall_seconds": round(wall, 3),
+        "events": len(events),
+        "displays": tvs or [args.get("tv_entity", DEFAULT_TV_ENTITY)],
+        "callbacks": {name: {"count": count, "wall_ms": round(hub.callback_seconds[name] * 1000, 1)}
+                      for name, count in hub.callback_counts.most_common()},
+        "slides": services["media_player/play_media"],
+        "starts_after_idle": _latency(starts),
+        "stop_latency": _latency(stops),
+        "spurious_stops": spurious,
+        "service_calls_per_hour": {service: round(count / hours, 1)
+                                   for service, count in services.most_common()},
+        "events_fired": Counter(event for _, event, _ in hub.events),
+        "errors": hub.errors,
+    }
+
+def format_report(report):
+    """Plain text summary of a replay"""
+    lines = [
+        "TV Photo Frame replay",
+        f"simulated: {report['simulated_hours']} h in {report['wall_seconds']} s, "
+        f"{report['events']} events, displays: {', '.join(report['displays'])}",
+        f"slides: {report['slides']}  spurious stops: {report['spurious_stops']}  errors: {len(report['errors'])}",
+        "",
+        f"{'latency':<24}{'count':>8}{'mean s':>10}{'p95 s':>10}{'max s':>10}",
+    ]
+    for name in ("starts_after_idle", "stop_latency"):
+        row = report[name]
+        lines.append(f"{name:<24}{row['count']:>8}" + "".join(
+            f"{'-' if row[key] is None else round(row[key], 1):>10}" for key in ("mean_s", "p95_s", "max_s")))
+    lines += ["", f"{'callback':<40}{'count':>8}{'wall ms':>10}"]
+    for name, row in report["callbacks"].items():
+        lines.append(f"{name:<40}{row['count']:>8}{row['wall_ms']:>10.1f}")
+    lines += ["", f"{'service':<40}{'per hour':>10}"]
+    for service, rate in report["service_calls_per_hour"].items():
+        lines.append(f"{service:<40}{rate:>10.1f}")
+    for error in report["errors"][:10]:
+        lines.append(f"❌ {error}")
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded HA events through the photo frame app")
+    parser.add_argument("trace", nargs="?", help="JSON lines / state_changed events / history JSON")
+    parser.add_argument("--synthetic", type=float, default=0,
+                        help="replay a generated trace of this many hours instead")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--photos", type=int, default=DEFAULT_PHOTOS, help="size of the generated photo folder")
+    parser.add_argument("--tail", type=float, default=DEFAULT_TAIL,
+                        help="simulated seconds to keep running after the last event")
+    parser.add_argument("--app-args", default="{}", help="JSON merged into the app arguments (apps.yaml)")
+    parser.add_argument("--echo-state", default=None,
+                        help="state the TV reports after play_media (e.g. playing); default: no reaction")
+    parser.add_argument("--echo-delay", type=float, default=1.0)
+    parser.add_argument("--json", default=None, help="also write the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="print the app log")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        start, events = synthetic_trace(args.synthetic, args.seed)
+    elif args.trace:
+        start, events = load_trace(args.trace)
+    else:
+        parser.error("a trace file or --synthetic HOURS is required")
+
+    print(f"▶️ Replaying {len(events)} events...")
+    report = replay(start, events, json.loads(args.app_args), args.photos, args.tail,
+                    args.echo_state, args.echo_delay, args.verbose)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Report saved to {args.json}")
+    if report["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()